@@ -0,0 +1,259 @@
+"""Circuit breaker for the Razorpay API.
+
+When Razorpay is down, waiting for every request to time out blocks
+quotation submits and checkouts for the full timeout. The circuit of a
+Razorpay account, shared by all workers through Redis, counts consecutive
+failed requests (connection errors, timeouts and 5xx responses). Once
+`circuit_failure_threshold` requests in a row have failed it opens, and
+requests fail fast with `RazorpayCircuitOpenError` instead of being sent.
+
+After `circuit_cooldown` seconds the circuit is half open: a single request
+is let through as a probe. If it succeeds the circuit closes, otherwise it
+opens for another cool-down.
+
+Work that must reach Razorpay eventually can be deferred with
+`defer_until_api_available`; it is enqueued once the circuit lets requests
+through again.
+"""
+
+import json
+from enum import StrEnum
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 30  # seconds
+# a probe that hasn't reported back by then is presumed lost
+PROBE_TIMEOUT = 60  # seconds
+# a circuit without failures for this long is forgotten
+CIRCUIT_TTL = 60 * 60  # seconds
+DEFERRED_CALLS_KEY = "razorpay_deferred_api_calls"
+
+
+class CircuitState(StrEnum):
+	Closed = "closed"
+	Open = "open"
+	HalfOpen = "half_open"
+
+
+class RazorpayCircuitOpenError(frappe.ValidationError):
+	pass
+
+
+# KEYS[1]: circuit hash; ARGV[1]: probe timeout (s)
+# Returns {state, value}: {"closed", failures}, {"open", seconds left} or
+# {"probe", 0} when this request may probe a half open circuit.
+CHECK_CIRCUIT_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+
+local circuit = redis.call('HMGET', KEYS[1], 'state', 'open_until', 'failures')
+local state = circuit[1] or 'closed'
+if state == 'closed' then
+	return {'closed', circuit[3] or '0'}
+end
+
+local open_until = tonumber(circuit[2]) or 0
+if now < open_until then
+	return {'open', tostring(open_until - now)}
+end
+
+-- cool-down over, or the last probe is lost: let this request probe
+redis.call(
+	'HSET', KEYS[1],
+	'state', 'half_open', 'open_until', tostring(now + tonumber(ARGV[1]))
+)
+return {'probe', '0'}
+"""
+
+# KEYS[1]: circuit hash; ARGV: failure threshold, cool-down (s), ttl (s)
+# Returns "1" when this failure opened the circuit.
+RECORD_FAILURE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+
+-- failures of requests sent before the circuit opened don't extend it
+if state == 'open' then
+	return '0'
+end
+if state == 'half_open' or failures >= tonumber(ARGV[1]) then
+	redis.call(
+		'HSET', KEYS[1],
+		'state', 'open',
+		'open_until', tostring(now + tonumber(ARGV[2])),
+		'opened_at', tostring(now)
+	)
+	return '1'
+end
+return '0'
+"""
+
+
+def get_circuit_key(account: str | None) -> str:
+	# shared across sites, like the rate limit: outages hit the account
+	return frappe.cache().make_key(
+		f"razorpay_api_circuit:{account or 'default'}", shared=True
+	)
+
+
+def get_circuit_settings() -> tuple[int, float]:
+	"""Consecutive failures that open the circuit and its cool-down (s)."""
+	settings = frappe.get_cached_doc("Razorpay Settings")
+	threshold = (
+		cint(getattr(settings, "circuit_failure_threshold", 0))
+		or DEFAULT_FAILURE_THRESHOLD
+	)
+	cooldown = flt(getattr(settings, "circuit_cooldown", 0)) or DEFAULT_COOLDOWN
+	return threshold, cooldown
+
+
+def check_circuit(account: str | None) -> bool:
+	"""Raise `RazorpayCircuitOpenError` when the account's circuit is open.
+
+	Returns True when the request's outcome has to be reported with
+	`record_success`, i.e. it probes the circuit or follows failures.
+	"""
+	state, value = (
+		frappe.safe_decode(part)
+		for part in frappe.cache().eval(
+			CHECK_CIRCUIT_SCRIPT, 1, get_circuit_key(account), PROBE_TIMEOUT
+		)
+	)
+	if state == "open":
+		raise RazorpayCircuitOpenError(
+			_(
+				"Razorpay is not responding. Please try again in {0} seconds."
+			).format(max(cint(flt(value)), 1))
+		)
+
+	return state == "probe" or bool(cint(value))
+
+
+def record_success(account: str | None):
+	"""Close the circuit: a request got through."""
+	frappe.cache().delete(get_circuit_key(account))
+
+
+def record_failure(account: str | None):
+	"""Count a failed request, opening the circuit once there are enough."""
+	threshold, cooldown = get_circuit_settings()
+	opened = cint(
+		frappe.cache().eval(
+			RECORD_FAILURE_SCRIPT,
+			1,
+			get_circuit_key(account),
+			threshold,
+			cooldown,
+			max(CIRCUIT_TTL, cooldown + PROBE_TIMEOUT),
+		)
+	)
+	if opened:
+		frappe.logger("razorpay").warning(
+			f"Razorpay API circuit of {account or 'default'} opened for "
+			f"{cooldown:g}s"
+		)
+
+
+def is_failure(status_code: int) -> bool:
+	"""Whether a response means Razorpay is unavailable. 4xx responses (and
+	429s, which the rate limiter handles) mean it is up."""
+	return status_code >= 500
+
+
+def get_circuit_status(account: str | None) -> dict:
+	cache = frappe.cache()
+	pipeline = cache.pipeline()
+	pipeline.hgetall(get_circuit_key(account))
+	pipeline.time()
+	circuit, (now, _microseconds) = pipeline.execute()
+	circuit = {
+		frappe.safe_decode(field): frappe.safe_decode(value)
+		for field, value in circuit.items()
+	}
+	state = circuit.get("state") or CircuitState.Closed
+	open_until = flt(circuit.get("open_until"))
+	if state == CircuitState.Open and now >= open_until:
+		# waiting for the next request to probe it
+		state = CircuitState.HalfOpen
+
+	return {
+		"state": state,
+		"failures": cint(circuit.get("failures")),
+		"open_for": max(open_until - now, 0)
+		if state == CircuitState.Open
+		else 0,
+		"opened_at": flt(circuit.get("opened_at")) or None,
+		"deferred_calls": cache.llen(DEFERRED_CALLS_KEY),
+	}
+
+
+def get_account() -> str | None:
+	# the account the current site's client sends requests as
+	from razorpay_frappe.utils import get_razorpay_client
+
+	return get_razorpay_client().auth[0]
+
+
+def is_api_available(account: str | None = None) -> bool:
+	"""False while the circuit is open and requests would fail fast."""
+	status = get_circuit_status(account or get_account())
+	return status["state"] != CircuitState.Open
+
+
+def defer_until_api_available(method: str, **kwargs):
+	"""Enqueue `method(**kwargs)` once the circuit lets requests through
+	again; see `run_deferred_api_calls`."""
+	frappe.cache().rpush(
+		DEFERRED_CALLS_KEY,
+		json.dumps({"method": method, "kwargs": kwargs}, default=str),
+	)
+
+
+def run_deferred_api_calls():
+	"""Enqueue the deferred calls when the API is reachable. Scheduled."""
+	cache = frappe.cache()
+	if not cache.llen(DEFERRED_CALLS_KEY):
+		return
+
+	account = get_account()
+	state = get_circuit_status(account)["state"]
+	if state == CircuitState.Open:
+		return
+	if state == CircuitState.HalfOpen:
+		# nothing may have called Razorpay since the cool-down: probe it
+		try:
+			probe_api()
+		except Exception:
+			return
+
+	while call := cache.lpop(DEFERRED_CALLS_KEY):
+		call = json.loads(call)
+		frappe.enqueue(call["method"], queue="long", **call["kwargs"])
+
+
+def probe_api():
+	"""Cheapest request there is, closing a half open circuit if it gets
+	through."""
+	from razorpay_frappe.utils import get_razorpay_client
+
+	get_razorpay_client().order.all({"count": 1})
+
+
+@frappe.whitelist()
+def get_api_circuit_status() -> dict:
+	frappe.only_for("System Manager")
+	return get_circuit_status(get_account())
+
+
+@frappe.whitelist(methods=["POST"])
+def reset_api_circuit():
+	"""Close the circuit by hand, e.g. once Razorpay confirmed a recovery."""
+	frappe.only_for("System Manager")
+	record_success(get_account())
+	run_deferred_api_calls()
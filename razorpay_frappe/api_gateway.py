@@ -0,0 +1,250 @@
+"""Rate-limit aware transport for Razorpay API calls.
+
+Every request a Razorpay client makes goes through `RazorpayGatewayAdapter`,
+which takes a token from a Redis token bucket shared by all workers using
+the same Razorpay account before sending it, and backs off on 429s.
+
+Requests run in a priority lane. Interactive calls (checkout) may use the
+whole bucket, while background calls (syncs, reconciliation) leave a
+reserve untouched so that checkout is never starved by a bulk job.
+
+Requests fail fast while the account's circuit breaker is open, see
+`razorpay_frappe.api_circuit`, and every request sent is recorded by
+`razorpay_frappe.api_telemetry`.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from enum import StrEnum
+
+import frappe
+from frappe.utils import cint, flt
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+from razorpay_frappe.api_circuit import (
+	check_circuit,
+	is_failure,
+	record_failure,
+	record_success,
+)
+from razorpay_frappe.api_telemetry import record_api_call
+
+DEFAULT_REQUESTS_PER_SECOND = 10
+DEFAULT_INTERACTIVE_RESERVE = 20  # percent of the bucket
+BURST_SECONDS = 2  # bucket capacity, in seconds worth of requests
+MAX_RATE_LIMIT_RETRIES = 3
+MAX_BACKOFF = 60  # seconds
+# (connect, read) seconds for requests sent without a timeout
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class ApiLane(StrEnum):
+	Interactive = "interactive"
+	Background = "background"
+
+
+# seconds to wait for a token before giving up
+LANE_MAX_WAIT = {ApiLane.Interactive: 10, ApiLane.Background: 300}
+
+
+class RazorpayRateLimitError(frappe.ValidationError):
+	pass
+
+
+# KEYS[1]: bucket hash; ARGV: capacity, refill rate (tokens/s), reserve
+# Returns "0" when a token was taken, else the seconds to wait.
+TAKE_TOKEN_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'paused_until')
+local paused_until = tonumber(state[3]) or 0
+if now < paused_until then
+	return tostring(paused_until - now)
+end
+
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local wait = 0
+if tokens - 1 >= reserve then
+	tokens = tokens - 1
+else
+	wait = (reserve + 1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+"""
+
+# KEYS[1]: bucket hash; ARGV[1]: seconds every lane has to wait
+PAUSE_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local paused_until = tonumber(redis.call('HGET', KEYS[1], 'paused_until')) or 0
+local until_ = math.max(paused_until, now + tonumber(ARGV[1]))
+redis.call('HSET', KEYS[1], 'paused_until', tostring(until_))
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[1])) + 60)
+return tostring(until_)
+"""
+
+
+@contextmanager
+def api_lane(lane: ApiLane):
+	"""Run the Razorpay calls made inside the block (or decorated function)
+	in `lane`."""
+	previous = getattr(frappe.local, "razorpay_api_lane", None)
+	frappe.local.razorpay_api_lane = lane
+	try:
+		yield
+	finally:
+		frappe.local.razorpay_api_lane = previous
+
+
+def get_api_lane() -> ApiLane:
+	"""The explicit lane if one is set, else interactive for web requests
+	and background for jobs and the scheduler."""
+	lane = getattr(frappe.local, "razorpay_api_lane", None)
+	if lane:
+		return lane
+
+	if getattr(frappe.local, "request", None):
+		return ApiLane.Interactive
+	return ApiLane.Background
+
+
+def get_bucket_key(account: str | None) -> str:
+	# shared across sites: the limit belongs to the Razorpay account
+	return frappe.cache().make_key(
+		f"razorpay_api_bucket:{account or 'default'}", shared=True
+	)
+
+
+def get_rate_limit() -> tuple[float, float]:
+	"""Refill rate (requests/second) and interactive reserve (tokens)."""
+	settings = frappe.get_cached_doc("Razorpay Settings")
+	rate = (
+		flt(getattr(settings, "api_requests_per_second", 0))
+		or DEFAULT_REQUESTS_PER_SECOND
+	)
+	reserve_percent = getattr(settings, "api_interactive_reserve", None)
+	if reserve_percent is None:
+		reserve_percent = DEFAULT_INTERACTIVE_RESERVE
+
+	capacity = rate * BURST_SECONDS
+	return rate, capacity * min(cint(reserve_percent), 100) / 100
+
+
+def acquire_api_token(account: str | None, lane: ApiLane | None = None):
+	"""Block until the account's bucket grants this lane a request."""
+	lane = lane or get_api_lane()
+	rate, reserve = get_rate_limit()
+	capacity = rate * BURST_SECONDS
+	if lane == ApiLane.Interactive:
+		reserve = 0
+
+	key = get_bucket_key(account)
+	deadline = time.monotonic() + LANE_MAX_WAIT[lane]
+
+	while True:
+		wait = flt(
+			frappe.cache().eval(
+				TAKE_TOKEN_SCRIPT, 1, key, capacity, rate, reserve
+			)
+		)
+		if not wait:
+			return
+
+		if time.monotonic() + wait > deadline:
+			raise RazorpayRateLimitError(
+				f"Razorpay API rate limit: no capacity for {lane} requests"
+			)
+		time.sleep(wait)
+
+
+def pause_api(account: str | None, seconds: float):
+	"""Hold back every lane of the account, e.g. after Razorpay sent 429."""
+	frappe.cache().eval(PAUSE_SCRIPT, 1, get_bucket_key(account), seconds)
+
+
+def get_backoff(response, attempt: int) -> float:
+	"""Seconds to wait after a 429: Retry-After when sent, else jittered
+	exponential backoff."""
+	retry_after = response.headers.get("Retry-After")
+	if retry_after:
+		if retry_after.isdigit():
+			return min(float(retry_after), MAX_BACKOFF)
+		try:
+			retry_at = parsedate_to_datetime(retry_after).timestamp()
+			return min(max(retry_at - time.time(), 0), MAX_BACKOFF)
+		except (TypeError, ValueError):
+			pass
+
+	delay = min(2**attempt, MAX_BACKOFF)
+	return delay / 2 + random.uniform(0, delay / 2)
+
+
+class RazorpayGatewayAdapter(HTTPAdapter):
+	"""HTTPAdapter that rate limits requests per Razorpay account and stops
+	sending them while its circuit is open."""
+
+	def __init__(self, account: str | None = None, **kwargs):
+		self.account = account
+		super().__init__(**kwargs)
+
+	def send(self, request, **kwargs):
+		if kwargs.get("timeout") is None:
+			# the SDK sets none, which waits forever on a hung connection
+			kwargs["timeout"] = DEFAULT_TIMEOUT
+
+		for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+			report_success = check_circuit(self.account)
+			acquire_api_token(self.account)
+			try:
+				response = self.send_recorded(request, **kwargs)
+			except RequestException:
+				record_failure(self.account)
+				raise
+
+			if is_failure(response.status_code):
+				record_failure(self.account)
+			elif report_success:
+				record_success(self.account)
+
+			if response.status_code != 429 or attempt == MAX_RATE_LIMIT_RETRIES:
+				return response
+
+			# a 429 was not processed by Razorpay, so resending is safe
+			pause_api(self.account, get_backoff(response, attempt))
+			response.close()
+
+		return response
+
+	def send_recorded(self, request, **kwargs):
+		started_at = time.monotonic()
+		status_code = None
+		try:
+			response = super().send(request, **kwargs)
+			status_code = response.status_code
+			return response
+		finally:
+			try:
+				record_api_call(
+					request.method,
+					request.url,
+					status_code,
+					time.monotonic() - started_at,
+				)
+			except Exception:
+				# telemetry must never fail an API call
+				frappe.logger("razorpay").exception(
+					"Failed to record Razorpay API call"
+				)
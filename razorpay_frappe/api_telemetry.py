@@ -0,0 +1,149 @@
+"""Telemetry of outbound Razorpay API calls.
+
+Every request a Razorpay client sends is recorded by
+`RazorpayGatewayAdapter`: per endpoint and calling function, the number of
+calls, errors and 429s and a latency histogram. Counters live in Redis in
+one hash per minute, kept for `TELEMETRY_RETENTION` seconds, and are read
+by the Razorpay API Calls report.
+"""
+
+import re
+import sys
+import time
+from urllib.parse import urlparse
+
+import frappe
+
+TELEMETRY_KEY = "razorpay_api_telemetry"
+TELEMETRY_BUCKET_SECONDS = 60
+TELEMETRY_RETENTION = 24 * 60 * 60  # seconds
+# upper bounds (ms) of the latency histogram buckets, plus an "inf" bucket
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+UNKNOWN_CALLER = "unknown"
+
+# Razorpay ids: `<prefix>_<14 alphanumerics>`, e.g. pay_29QQoUBi66xm2f
+ID_PATTERN = re.compile(r"^[a-z]+_[A-Za-z0-9]{14}$")
+
+# plumbing between a feature and the HTTP call; never reported as the caller
+INFRASTRUCTURE_MODULES = frozenset(
+	(
+		"razorpay_frappe.api_gateway",
+		"razorpay_frappe.api_telemetry",
+		"razorpay_frappe.bulk_fetch",
+		"razorpay_frappe.entity_cache",
+	)
+)
+
+
+def record_api_call(
+	method: str,
+	url: str,
+	status_code: int | None,
+	elapsed: float,
+	caller: str | None = None,
+):
+	"""Count one API call; `status_code` is None when no response arrived."""
+	endpoint = get_endpoint(method, url)
+	caller = caller or get_api_caller()
+	elapsed_ms = elapsed * 1000
+	field = f"{endpoint}\t{caller}"
+
+	cache = frappe.cache()
+	key = cache.make_key(f"{TELEMETRY_KEY}:{get_bucket(time.time())}")
+	pipeline = cache.pipeline()
+	pipeline.hincrby(key, f"{field}\tcalls", 1)
+	pipeline.hincrbyfloat(key, f"{field}\tms", elapsed_ms)
+	pipeline.hincrby(key, f"{field}\tle_{get_latency_bucket(elapsed_ms)}", 1)
+	if status_code == 429:
+		pipeline.hincrby(key, f"{field}\tthrottled", 1)
+	elif status_code is None or status_code >= 400:
+		pipeline.hincrby(key, f"{field}\terrors", 1)
+	pipeline.expire(key, TELEMETRY_RETENTION + TELEMETRY_BUCKET_SECONDS)
+	pipeline.execute()
+
+
+def get_api_calls(minutes: int = 60) -> tuple[dict, dict]:
+	"""Aggregated telemetry of the last `minutes`.
+
+	Returns `(stats, timeline)`: stats per (endpoint, caller) and the total
+	calls, errors and 429s per minute.
+	"""
+	cache = frappe.cache()
+	now = get_bucket(time.time())
+	buckets = [
+		now - i * TELEMETRY_BUCKET_SECONDS for i in reversed(range(minutes))
+	]
+
+	pipeline = cache.pipeline()
+	for bucket in buckets:
+		pipeline.hgetall(cache.make_key(f"{TELEMETRY_KEY}:{bucket}"))
+
+	stats, timeline = {}, {}
+	for bucket, values in zip(buckets, pipeline.execute(), strict=True):
+		minute = timeline.setdefault(
+			bucket, {"calls": 0, "errors": 0, "throttled": 0}
+		)
+		for field, value in values.items():
+			endpoint, caller, metric = frappe.safe_decode(field).split("\t")
+			value = float(value)
+
+			row = stats.setdefault(
+				(endpoint, caller),
+				{"calls": 0, "errors": 0, "throttled": 0, "ms": 0.0},
+			)
+			row[metric] = row.get(metric, 0) + value
+			if metric in minute:
+				minute[metric] += value
+
+	return stats, timeline
+
+
+def get_latency_percentile(row: dict, pct: float) -> float | None:
+	"""Upper bound (ms) of the histogram bucket holding the `pct`th
+	percentile; None when it falls in the open-ended bucket."""
+	if not row.get("calls"):
+		return None
+
+	rank = row["calls"] * pct / 100
+	seen = 0
+	for bound in LATENCY_BUCKETS:
+		seen += row.get(f"le_{bound}", 0)
+		if seen >= rank:
+			return bound
+
+
+def get_endpoint(method: str, url: str) -> str:
+	"""`GET /v1/payments/:id` for `GET https://.../v1/payments/pay_...`."""
+	path = "/".join(
+		":id" if ID_PATTERN.match(part) else part
+		for part in urlparse(url).path.split("/")
+	)
+	return f"{method} {path}"
+
+
+def get_api_caller() -> str:
+	"""Dotted path of the innermost app function outside the API plumbing
+	that led to the current call."""
+	frame = sys._getframe(1)
+	while frame:
+		module = frame.f_globals.get("__name__", "")
+		if (
+			module.startswith("razorpay_frappe.")
+			and module not in INFRASTRUCTURE_MODULES
+		):
+			return f"{module}.{frame.f_code.co_name}"
+		frame = frame.f_back
+
+	# e.g. bulk fetch threads, which record who started them
+	return getattr(frappe.local, "razorpay_api_caller", None) or UNKNOWN_CALLER
+
+
+def get_latency_bucket(elapsed_ms: float) -> int | str:
+	for bound in LATENCY_BUCKETS:
+		if elapsed_ms <= bound:
+			return bound
+	return "inf"
+
+
+def get_bucket(timestamp: float) -> int:
+	return int(timestamp // TELEMETRY_BUCKET_SECONDS) * TELEMETRY_BUCKET_SECONDS
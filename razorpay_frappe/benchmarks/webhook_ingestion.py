@@ -0,0 +1,487 @@
+"""Webhook ingestion benchmark.
+
+Drives correctly signed synthetic Razorpay events through both webhook
+endpoints and reports latency percentiles, DB queries per event and
+Razorpay API calls per event. Razorpay calls are answered by a local
+`razorpay_frappe.fake_razorpay.FakeRazorpay` and chat notifications are
+suppressed, so nothing leaves the machine.
+
+	bench --site <site> execute razorpay_frappe.benchmarks.webhook_ingestion.run \\
+		--kwargs "{'events': 1000}"
+
+Every fixture and log the run creates carries the run id and is deleted
+afterwards (pass `cleanup=0` to keep them for inspection).
+"""
+
+import hashlib
+import hmac
+import itertools
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import frappe
+from frappe.utils import set_request
+
+from razorpay_frappe.fake_razorpay import FakeRazorpay
+from razorpay_frappe.fake_razorpay import running as run_fake_razorpay
+from razorpay_frappe.rzp_renderer import (
+	BASE_API_PATH,
+	Endpoints,
+	RazorpayEndpointHandler,
+)
+from razorpay_frappe.utils import get_webhook_secret
+from razorpay_frappe.webhook_dedup import EVENT_ID_HEADER
+from razorpay_frappe.webhook_handler import razorpay_webhook
+from razorpay_frappe.webhook_processor import (
+	RazorpayPaymentLinkWebhookEvents,
+	RazorpayPaymentWebhookEvents,
+	RazorpaySubscriptionWebhookEvents,
+)
+
+# endpoint name -> driver, see `call_endpoint`
+WEBHOOK_ENDPOINTS = ("webhook_handler", "renderer")
+
+BENCHMARK_EVENTS = (
+	*RazorpayPaymentWebhookEvents,
+	*RazorpaySubscriptionWebhookEvents,
+	*RazorpayPaymentLinkWebhookEvents,
+)
+
+DEFAULT_EVENT_COUNT = 200
+AMOUNT = 50000  # paise
+
+
+def run(
+	events: int = DEFAULT_EVENT_COUNT,
+	endpoints: list | str | None = None,
+	event_types: list | str | None = None,
+	max_queries_per_event: float | None = None,
+	max_http_calls_per_event: float | None = None,
+	cleanup: int = 1,
+) -> dict:
+	"""Benchmark webhook ingestion and return a report per endpoint.
+
+	`events` synthetic events (cycling through `event_types`, all supported
+	events by default) are sent to each endpoint. When a budget is given,
+	endpoints exceeding it are listed under `regressions`.
+	"""
+	endpoints = parse_list(endpoints) or list(WEBHOOK_ENDPOINTS)
+	event_types = parse_list(event_types) or list(BENCHMARK_EVENTS)
+
+	secret = get_webhook_secret()
+	if not secret:
+		frappe.throw(
+			f"Set a Webhook Secret in {frappe.bold('Razorpay Settings')} before running the benchmark"
+		)
+
+	run_id = frappe.generate_hash(length=8)
+	report = {
+		"run_id": run_id,
+		"events_per_endpoint": events,
+		"background_processing": frappe.db.get_single_value(
+			"Razorpay Settings", "process_webhooks_in_background"
+		),
+		"endpoints": {},
+		"regressions": [],
+	}
+
+	try:
+		with serve_razorpay_api() as api:
+			for endpoint in endpoints:
+				factory = SyntheticEventFactory(f"{run_id}{endpoint[:3]}")
+				deliveries = [
+					factory.build(event_type)
+					for event_type in itertools.islice(
+						itertools.cycle(event_types), events
+					)
+				]
+				commit()
+
+				result = benchmark_endpoint(endpoint, deliveries, secret, api)
+				report["endpoints"][endpoint] = result
+				report["regressions"].extend(
+					check_budget(
+						endpoint,
+						result,
+						max_queries_per_event,
+						max_http_calls_per_event,
+					)
+				)
+	finally:
+		if frappe.utils.cint(cleanup):
+			delete_benchmark_records(run_id)
+			commit()
+
+	frappe.logger().info(f"Razorpay webhook benchmark: {report}")
+	return report
+
+
+def benchmark_endpoint(
+	endpoint: str,
+	deliveries: list[tuple[str, str, dict]],
+	secret: str,
+	api: FakeRazorpay,
+) -> dict:
+	latencies, errors = [], 0
+	queries, http_calls = Counter(), Counter()
+
+	started_at = time.perf_counter()
+	for event_type, event_id, payload in deliveries:
+		body = json.dumps(payload).encode()
+		headers = {
+			"Content-Type": "application/json",
+			"X-Razorpay-Signature": sign(body, secret),
+			EVENT_ID_HEADER: event_id,
+		}
+
+		api_calls_before = api.stats["requests"]
+		with count_queries() as query_count:
+			event_started_at = time.perf_counter()
+			status_code = call_endpoint(endpoint, body, headers)
+			commit()
+			latencies.append(time.perf_counter() - event_started_at)
+
+		queries[event_type] += query_count[0]
+		http_calls[event_type] += api.stats["requests"] - api_calls_before
+		if status_code != 200:
+			errors += 1
+
+	elapsed = time.perf_counter() - started_at
+	count = len(deliveries) or 1
+
+	return {
+		"events": len(deliveries),
+		"errors": errors,
+		"p50_ms": to_ms(percentile(latencies, 50)),
+		"p99_ms": to_ms(percentile(latencies, 99)),
+		"max_ms": to_ms(max(latencies, default=0)),
+		"events_per_second": round(len(deliveries) / elapsed, 2)
+		if elapsed
+		else 0,
+		"queries_per_event": round(sum(queries.values()) / count, 2),
+		"http_calls_per_event": round(sum(http_calls.values()) / count, 2),
+		"by_event": {
+			event_type: {
+				"queries": queries[event_type],
+				"http_calls": http_calls[event_type],
+			}
+			for event_type in queries
+		},
+		"http_calls": get_api_calls(api),
+	}
+
+
+def call_endpoint(endpoint: str, body: bytes, headers: dict) -> int:
+	"""Deliver one webhook the way the web server would and return the
+	HTTP status the endpoint responded with."""
+	path = {
+		"webhook_handler": "/api/method/razorpay_frappe.webhook_handler.razorpay_webhook",
+		"renderer": f"/{BASE_API_PATH}{Endpoints.WEBHOOK_HANDLER}",
+	}[endpoint]
+
+	set_request(method="POST", path=path, data=body, headers=headers)
+	frappe.local.form_dict = frappe._dict(json.loads(body))
+	frappe.local.response = frappe._dict({"docs": []})
+
+	try:
+		if endpoint == "webhook_handler":
+			razorpay_webhook()
+			return frappe.local.response.get("http_status_code") or 200
+
+		handler = RazorpayEndpointHandler(path.lstrip("/"))
+		handler.can_render()
+		return handler.render().status_code
+	except Exception:
+		rollback()
+		return 500
+
+
+def check_budget(
+	endpoint: str,
+	result: dict,
+	max_queries_per_event: float | None,
+	max_http_calls_per_event: float | None,
+) -> list[str]:
+	regressions = []
+	for metric, budget in (
+		("queries_per_event", max_queries_per_event),
+		("http_calls_per_event", max_http_calls_per_event),
+	):
+		if budget is not None and result[metric] > float(budget):
+			regressions.append(
+				f"{endpoint}: {metric} {result[metric]} > {budget}"
+			)
+	return regressions
+
+
+class SyntheticEventFactory:
+	"""Builds webhook payloads shaped like Razorpay's, together with the
+	Razorpay Order / Subscription / Payment Link records they refer to."""
+
+	def __init__(self, prefix: str):
+		self.prefix = f"bench{prefix}"
+		self.sequence = itertools.count()
+		self.subscription_id = None
+		self.plan_id = None
+
+	def new_id(self, entity_prefix: str) -> str:
+		return f"{entity_prefix}_{self.prefix}{next(self.sequence):06d}"
+
+	def build(self, event_type: str) -> tuple[str, str, dict]:
+		"""Return (event type, event id, signed body payload) for one delivery."""
+		if event_type in RazorpayPaymentWebhookEvents:
+			payload = self.build_payment_event(event_type)
+		elif event_type in RazorpaySubscriptionWebhookEvents:
+			payload = self.build_subscription_event(event_type)
+		else:
+			payload = self.build_payment_link_event(event_type)
+
+		return (
+			event_type,
+			self.new_id("evt"),
+			{
+				"entity": "event",
+				"account_id": "acc_benchmark",
+				"event": event_type,
+				"contains": list(payload),
+				"payload": payload,
+				"created_at": int(time.time()),
+			},
+		)
+
+	def build_payment_event(self, event_type: str) -> dict:
+		order_id = self.new_id("order")
+		frappe.get_doc(
+			{
+				"doctype": "Razorpay Order",
+				"order_id": order_id,
+				"amount": AMOUNT / 100,
+				"currency": "INR",
+				"status": "Paid"
+				if event_type == RazorpayPaymentWebhookEvents.RefundProcessed
+				else "Pending",
+			}
+		).insert(ignore_permissions=True)
+
+		payment = self.payment_entity(order_id)
+		payload = {"payment": {"entity": payment}}
+		if event_type == RazorpayPaymentWebhookEvents.RefundProcessed:
+			payload["refund"] = {
+				"entity": {
+					"id": self.new_id("rfnd"),
+					"entity": "refund",
+					"amount": AMOUNT,
+					"currency": "INR",
+					"payment_id": payment["id"],
+					"status": "processed",
+				}
+			}
+		return payload
+
+	def build_subscription_event(self, event_type: str) -> dict:
+		if (
+			event_type
+			== RazorpaySubscriptionWebhookEvents.SubscriptionAuthenticated
+		):
+			# start every subscription lifecycle on a fresh record
+			self.subscription_id = None
+
+		if not self.subscription_id:
+			self.subscription_id = self.new_id("sub")
+			# db_insert skips before_insert, which creates the record on Razorpay
+			frappe.get_doc(
+				{
+					"doctype": "Razorpay Subscription",
+					"name": self.subscription_id,
+					"id": self.subscription_id,
+					"plan_id": self.get_plan_id(),
+					"total_count": 12,
+					"status": "Created",
+				}
+			).db_insert()
+
+		payload = {
+			"subscription": {
+				"entity": {
+					"id": self.subscription_id,
+					"entity": "subscription",
+					"plan_id": self.get_plan_id(),
+					"customer_id": "cust_benchmark",
+					"status": "active",
+					"type": 1,
+					"ended_at": int(time.time()),
+				}
+			}
+		}
+		if event_type in (
+			RazorpaySubscriptionWebhookEvents.SubscriptionCharged,
+			RazorpaySubscriptionWebhookEvents.SubscriptionActivated,
+		):
+			payload["payment"] = {
+				"entity": self.payment_entity(self.new_id("order"))
+			}
+		return payload
+
+	def get_plan_id(self) -> str:
+		if not self.plan_id:
+			self.plan_id = self.new_id("plan")
+			frappe.get_doc(
+				{
+					"doctype": "Razorpay Plan",
+					"name": self.plan_id,
+					"id": self.plan_id,
+					"item_name": "Benchmark Plan",
+					"item_amount": AMOUNT / 100,
+					"currency": "INR",
+					"period": "Monthly",
+					"interval": 1,
+				}
+			).db_insert()
+		return self.plan_id
+
+	def build_payment_link_event(self, event_type: str) -> dict:
+		payment_link_id = self.new_id("plink")
+		payment_link = frappe.get_doc(
+			{
+				"doctype": "Razorpay Payment Link",
+				"id": payment_link_id,
+				"short_url": f"https://rzp.io/i/{payment_link_id}",
+				"amount": AMOUNT / 100,
+				"currency": "INR",
+			}
+		)
+		payment_link.flags.link_already_created = True
+		payment_link.insert(ignore_permissions=True)
+
+		status = event_type.split(".")[-1]
+		payload = {
+			"payment_link": {
+				"entity": {
+					"id": payment_link_id,
+					"entity": "payment_link",
+					"amount": AMOUNT,
+					"amount_paid": AMOUNT if status == "paid" else 0,
+					"currency": "INR",
+					"status": status,
+				}
+			}
+		}
+		if event_type == RazorpayPaymentLinkWebhookEvents.PaymentLinkPaid:
+			payload["payment"] = {"entity": self.payment_entity()}
+		return payload
+
+	def payment_entity(self, order_id: str | None = None) -> dict:
+		return {
+			"id": self.new_id("pay"),
+			"entity": "payment",
+			"amount": AMOUNT,
+			"currency": "INR",
+			"status": "captured",
+			"order_id": order_id,
+			"invoice_id": None,
+			"method": "upi",
+			"fee": 1180,
+			"tax": 180,
+			"email": "benchmark@example.com",
+			"contact": "+919999999999",
+			"created_at": int(time.time()),
+		}
+
+
+@contextmanager
+def serve_razorpay_api():
+	"""Answer the site's Razorpay calls from a local `FakeRazorpay`, which
+	counts them."""
+	with (
+		run_fake_razorpay() as (api, base_url),
+		patch.dict(frappe.conf, {"razorpay_api_base_url": base_url}),
+		# chat notifications would leave the machine
+		patch("razorpay_frappe.utils.post_to_zohocliq"),
+	):
+		yield api
+
+
+def get_api_calls(api: FakeRazorpay) -> dict[str, int]:
+	"""Razorpay API calls answered so far, by endpoint."""
+	return {
+		endpoint: count
+		for endpoint, count in api.stats.items()
+		if endpoint not in ("requests", "throttled")
+	}
+
+
+@contextmanager
+def count_queries():
+	"""Count `frappe.db.sql` calls made inside the block."""
+	count = [0]
+	sql = frappe.db.sql
+
+	def counted_sql(*args, **kwargs):
+		count[0] += 1
+		return sql(*args, **kwargs)
+
+	frappe.db.sql = counted_sql
+	try:
+		yield count
+	finally:
+		del frappe.db.sql
+
+
+def delete_benchmark_records(run_id: str):
+	pattern = f"%bench{run_id}%"
+	payment_links = frappe.get_all(
+		"Razorpay Payment Link", {"id": ("like", pattern)}, pluck="name"
+	)
+	if payment_links:
+		frappe.db.delete(
+			"File",
+			{
+				"attached_to_doctype": "Razorpay Payment Link",
+				"attached_to_name": ("in", payment_links),
+			},
+		)
+	frappe.db.delete("Razorpay Webhook Log", {"event_id": ("like", pattern)})
+	frappe.db.delete(
+		"Razorpay Payment Detail", {"payment_id": ("like", pattern)}
+	)
+	frappe.db.delete("Razorpay Payment Link", {"id": ("like", pattern)})
+	frappe.db.delete("Razorpay Order", {"order_id": ("like", pattern)})
+	frappe.db.delete("Razorpay Subscription", {"id": ("like", pattern)})
+	frappe.db.delete("Razorpay Plan", {"id": ("like", pattern)})
+
+
+def sign(body: bytes, secret: str) -> str:
+	return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def percentile(values: list[float], pct: float) -> float:
+	"""Nearest-rank percentile."""
+	if not values:
+		return 0
+	ordered = sorted(values)
+	rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+	return ordered[min(rank, len(ordered) - 1)]
+
+
+def to_ms(seconds: float) -> float:
+	return round(seconds * 1000, 2)
+
+
+def parse_list(value: list | str | None) -> list:
+	if isinstance(value, str):
+		return frappe.parse_json(value) if value.startswith("[") else [value]
+	return value or []
+
+
+def commit():
+	# tests run inside one transaction that is rolled back afterwards
+	if not frappe.flags.in_test:
+		frappe.db.commit()
+
+
+def rollback():
+	if not frappe.flags.in_test:
+		frappe.db.rollback()
@@ -0,0 +1,101 @@
+"""Concurrent fetching of many Razorpay entities.
+
+Fetches run on a bounded pool of threads sharing the process' pooled
+Razorpay client, so every call still goes through the entity cache, the
+cross-worker single-flight and the account's rate limiter. Results are
+yielded as they complete.
+"""
+
+import contextvars
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import frappe
+from frappe.utils import cint
+
+from razorpay_frappe.api_gateway import get_rate_limit
+from razorpay_frappe.api_telemetry import get_api_caller
+from razorpay_frappe.entity_cache import RazorpayEntity, fetch_entity
+from razorpay_frappe.utils import DEFAULT_API_POOL_SIZE, get_razorpay_client
+
+
+def iter_fetch_entities(
+	entity: RazorpayEntity,
+	entity_ids: Iterable[str],
+	refresh: bool = False,
+	concurrency: int | None = None,
+) -> Iterator[tuple[str, dict | None, Exception | None]]:
+	"""Fetch `entity_ids` concurrently, yielding `(entity_id, value, error)`
+	in completion order.
+
+	At most `concurrency` requests (default: the API connection pool size)
+	are in flight at once. A failed fetch yields its exception instead of
+	stopping the others.
+	"""
+	entity_ids = list(dict.fromkeys(filter(None, entity_ids)))
+	if not entity_ids:
+		return
+
+	# resolve the client and rate limit settings here: the fetch threads
+	# share this request's context and must not touch the database
+	client = get_razorpay_client()
+	get_rate_limit()
+	caller = get_api_caller()
+	concurrency = max(cint(concurrency) or get_default_concurrency(), 1)
+
+	executor = ThreadPoolExecutor(
+		max_workers=min(concurrency, len(entity_ids)),
+		thread_name_prefix="razorpay_fetch",
+	)
+	try:
+		futures = {
+			executor.submit(
+				contextvars.copy_context().run,
+				fetch_for_caller,
+				caller,
+				entity,
+				entity_id,
+				client,
+				refresh,
+			): entity_id
+			for entity_id in entity_ids
+		}
+		for future in as_completed(futures):
+			error = future.exception()
+			yield futures[future], None if error else future.result(), error
+	finally:
+		# also reached when the caller stops iterating early
+		executor.shutdown(wait=True, cancel_futures=True)
+
+
+def fetch_entities(
+	entity: RazorpayEntity,
+	entity_ids: Iterable[str],
+	refresh: bool = False,
+	concurrency: int | None = None,
+) -> tuple[dict[str, dict], dict[str, Exception]]:
+	"""Fetch `entity_ids` concurrently; returns `(values, errors)`, both
+	keyed by entity id."""
+	values, errors = {}, {}
+	for entity_id, value, error in iter_fetch_entities(
+		entity, entity_ids, refresh, concurrency
+	):
+		if error:
+			errors[entity_id] = error
+		else:
+			values[entity_id] = value
+
+	return values, errors
+
+
+def fetch_for_caller(caller: str, *args) -> dict:
+	# runs in a copy of the caller's context, see `get_api_caller`
+	frappe.local.razorpay_api_caller = caller
+	return fetch_entity(*args)
+
+
+def get_default_concurrency() -> int:
+	return (
+		cint(frappe.db.get_single_value("Razorpay Settings", "api_pool_size"))
+		or DEFAULT_API_POOL_SIZE
+	)
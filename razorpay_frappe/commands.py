@@ -0,0 +1,75 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("razorpay-fake-server")
+@click.option("--host", default="127.0.0.1", help="Interface to listen on")
+@click.option("--port", default=9600, type=int, help="Port to listen on")
+@click.option(
+	"--latency",
+	default=0.0,
+	type=float,
+	help="Milliseconds added to every call",
+)
+@click.option(
+	"--jitter", default=0.0, type=float, help="Random extra latency, up to ms"
+)
+@click.option(
+	"--rate-limit",
+	default=0.0,
+	type=float,
+	help="Requests per second before answering 429 (0: no limit)",
+)
+@click.option("--burst", type=float, help="Requests allowed in a burst")
+@click.option(
+	"--webhook-url",
+	help="Where to deliver webhooks (default: the site's webhook endpoint)",
+)
+@pass_context
+def razorpay_fake_server(
+	context, host, port, latency, jitter, rate_limit, burst, webhook_url
+):
+	"""Serve a local stand-in for the Razorpay API.
+
+	Webhooks are signed with the site's webhook secret. Point the site at the
+	server with `bench --site <site> set-config razorpay_api_base_url
+	http://<host>:<port>`.
+	"""
+	import frappe
+
+	from razorpay_frappe.fake_razorpay import serve
+	from razorpay_frappe.rzp_renderer import BASE_API_PATH, Endpoints
+	from razorpay_frappe.utils import get_webhook_secret
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		webhook_url = webhook_url or frappe.utils.get_url(
+			f"/{BASE_API_PATH}{Endpoints.WEBHOOK_HANDLER}"
+		)
+		webhook_secret = get_webhook_secret()
+	finally:
+		frappe.destroy()
+
+	click.echo(f"Fake Razorpay API listening on http://{host}:{port}")
+	click.echo(f"Delivering webhooks to {webhook_url}")
+	if not webhook_secret:
+		click.secho(
+			"No webhook secret set in Razorpay Settings, webhooks are unsigned",
+			fg="yellow",
+		)
+
+	serve(
+		host,
+		port,
+		latency=latency,
+		jitter=jitter,
+		rate_limit=rate_limit,
+		burst=burst,
+		webhook_url=webhook_url,
+		webhook_secret=webhook_secret,
+	)
+
+
+commands = [razorpay_fake_server]
@@ -0,0 +1,246 @@
+"""Read-through Redis cache for Razorpay entities.
+
+Entities in a terminal state (a refunded payment, a paid order) rarely or
+never change, so they are kept for long; anything still in flight expires
+quickly. Webhooks invalidate the entities they mention as soon as they
+arrive, so a cached entity is never older than the last event about it.
+
+Fetches are single-flight across workers: while one worker fetches an entity,
+others asking for the same one wait for its result instead of calling
+Razorpay again.
+"""
+
+import time
+from enum import StrEnum
+
+import frappe
+
+from razorpay_frappe.utils import get_razorpay_client
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+PENDING_TTL = 30  # seconds
+
+FLIGHT_LOCK_TTL = 30  # seconds a fetch may run before another worker takes over
+FLIGHT_RESULT_TTL = 10  # seconds a finished fetch is kept for its waiters
+FLIGHT_MAX_WAIT = 30  # seconds a waiter waits before fetching by itself
+FLIGHT_POLL_INTERVAL = 0.02  # seconds, doubled up to FLIGHT_MAX_POLL_INTERVAL
+FLIGHT_MAX_POLL_INTERVAL = 0.25
+
+# KEYS[1]: flight lock; ARGV[1]: token of the worker releasing it
+RELEASE_FLIGHT_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+	return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RazorpayEntity(StrEnum):
+	Payment = "payment"
+	PaymentLink = "payment_link"
+	Order = "order"
+	# the payments of an order, keyed by order id
+	OrderPayments = "order_payments"
+	Settlement = "settlement"
+
+
+# entity -> {status: ttl}; statuses not listed use PENDING_TTL
+ENTITY_TTLS = {
+	RazorpayEntity.Payment: {
+		"captured": DAY,
+		"refunded": 7 * DAY,
+		"failed": 7 * DAY,
+	},
+	RazorpayEntity.PaymentLink: {
+		"paid": DAY,
+		"cancelled": 7 * DAY,
+		"expired": 7 * DAY,
+	},
+	RazorpayEntity.Order: {"paid": DAY},
+	RazorpayEntity.OrderPayments: {},
+	RazorpayEntity.Settlement: {"processed": 7 * DAY, "failed": DAY},
+}
+
+# entity -> how to fetch it, for those not fetched by `client.<entity>.fetch`
+ENTITY_FETCHERS = {
+	RazorpayEntity.OrderPayments: lambda client, order_id: (
+		client.order.payments(order_id)
+	),
+}
+
+
+def fetch_entity(
+	entity: RazorpayEntity,
+	entity_id: str,
+	client=None,
+	refresh: bool = False,
+) -> dict:
+	"""Razorpay `entity` by id, from the cache when possible.
+
+	`refresh` skips the cached copy (e.g. for an explicit sync) and stores
+	the fresh one. A refresh that finds a fetch of the same entity already
+	in flight shares its result.
+	"""
+	key = get_cache_key(entity, entity_id)
+	if not refresh:
+		cached = frappe.cache().get_value(key)
+		if cached is not None:
+			return cached
+
+	def fetch():
+		api = client or get_razorpay_client()
+		if entity in ENTITY_FETCHERS:
+			value = ENTITY_FETCHERS[entity](api, entity_id)
+		else:
+			value = getattr(api, entity).fetch(entity_id)
+		frappe.cache().set_value(
+			key, value, expires_in_sec=get_ttl(entity, value)
+		)
+		return value
+
+	return single_flight(key, fetch)
+
+
+def single_flight(key: str, fetch):
+	"""Run `fetch` once for all workers calling this with the same `key`
+	at the same time; the others get its result.
+
+	Waiters whose leader fails or takes too long fall back to calling
+	`fetch` themselves.
+	"""
+	cache = frappe.cache()
+	lock_key = cache.make_key(f"razorpay_flight:{key}")
+	token = frappe.generate_hash(length=16)
+	deadline = time.monotonic() + FLIGHT_MAX_WAIT
+
+	while time.monotonic() < deadline:
+		if cache.set(lock_key, token, nx=True, ex=FLIGHT_LOCK_TTL):
+			return lead_flight(key, lock_key, token, fetch)
+
+		leader = cache.get(lock_key)
+		if not leader:
+			# finished (or expired) between our two calls
+			continue
+
+		result = wait_for_flight(key, frappe.safe_decode(leader), deadline)
+		if result is not None:
+			if "value" in result:
+				return result["value"]
+			break
+
+	return fetch()
+
+
+def lead_flight(key: str, lock_key: str, token: str, fetch):
+	result_key = get_flight_result_key(key, token)
+	try:
+		value = fetch()
+	except Exception:
+		frappe.cache().set_value(
+			result_key, {"failed": True}, expires_in_sec=FLIGHT_RESULT_TTL
+		)
+		raise
+	else:
+		frappe.cache().set_value(
+			result_key, {"value": value}, expires_in_sec=FLIGHT_RESULT_TTL
+		)
+		return value
+	finally:
+		frappe.cache().eval(RELEASE_FLIGHT_SCRIPT, 1, lock_key, token)
+
+
+def wait_for_flight(key: str, leader: str, deadline: float) -> dict | None:
+	"""Result of the leader's fetch, or None if its lock went away (or the
+	deadline passed) without one."""
+	cache = frappe.cache()
+	lock_key = cache.make_key(f"razorpay_flight:{key}")
+	result_key = get_flight_result_key(key, leader)
+	interval = FLIGHT_POLL_INTERVAL
+
+	while time.monotonic() < deadline:
+		result = cache.get_value(result_key)
+		if result is not None:
+			return result
+
+		if frappe.safe_decode(cache.get(lock_key) or "") != leader:
+			# the leader is gone; its result may have landed just before
+			return cache.get_value(result_key)
+
+		time.sleep(interval)
+		interval = min(interval * 2, FLIGHT_MAX_POLL_INTERVAL)
+
+
+def get_flight_result_key(key: str, token: str) -> str:
+	return f"razorpay_flight_result:{key}:{token}"
+
+
+def fetch_payment(payment_id: str, client=None, refresh: bool = False) -> dict:
+	return fetch_entity(RazorpayEntity.Payment, payment_id, client, refresh)
+
+
+def fetch_payment_link(
+	payment_link_id: str, client=None, refresh: bool = False
+) -> dict:
+	return fetch_entity(
+		RazorpayEntity.PaymentLink, payment_link_id, client, refresh
+	)
+
+
+def fetch_order(order_id: str, client=None, refresh: bool = False) -> dict:
+	return fetch_entity(RazorpayEntity.Order, order_id, client, refresh)
+
+
+def fetch_order_payments(
+	order_id: str, client=None, refresh: bool = False
+) -> dict:
+	"""Collection of the payments made against an order."""
+	return fetch_entity(RazorpayEntity.OrderPayments, order_id, client, refresh)
+
+
+def fetch_settlement(
+	settlement_id: str, client=None, refresh: bool = False
+) -> dict:
+	return fetch_entity(
+		RazorpayEntity.Settlement, settlement_id, client, refresh
+	)
+
+
+def get_ttl(entity: RazorpayEntity, value: dict) -> int:
+	return ENTITY_TTLS[entity].get((value or {}).get("status"), PENDING_TTL)
+
+
+def get_cache_key(entity: RazorpayEntity, entity_id: str) -> str:
+	return f"razorpay_entity:{entity}:{entity_id}"
+
+
+def invalidate_entity(entity: RazorpayEntity, entity_id: str | None):
+	if entity_id:
+		frappe.cache().delete_value(get_cache_key(entity, entity_id))
+
+
+def invalidate_webhook_entities(webhook_payload: dict):
+	"""Drop cached copies of every payment, payment link and order the
+	webhook is about."""
+	payload = webhook_payload.get("payload", webhook_payload)
+
+	def get_entity(name: str) -> dict:
+		return (payload.get(name) or {}).get("entity") or {}
+
+	payment = get_entity("payment")
+	invalidate_entity(RazorpayEntity.Payment, payment.get("id"))
+	invalidate_entity(RazorpayEntity.Order, payment.get("order_id"))
+	invalidate_entity(RazorpayEntity.OrderPayments, payment.get("order_id"))
+	invalidate_entity(
+		RazorpayEntity.Payment, get_entity("refund").get("payment_id")
+	)
+	invalidate_entity(RazorpayEntity.Order, get_entity("order").get("id"))
+	invalidate_entity(
+		RazorpayEntity.OrderPayments, get_entity("order").get("id")
+	)
+	invalidate_entity(
+		RazorpayEntity.PaymentLink, get_entity("payment_link").get("id")
+	)
+	invalidate_entity(
+		RazorpayEntity.Settlement, get_entity("settlement").get("id")
+	)
@@ -0,0 +1,1086 @@
+"""Local stand-in for the Razorpay API, for load tests and offline work.
+
+Implements the orders, payments, refunds, payment links, plans,
+subscriptions and settlements endpoints this app uses, keeping every entity
+in memory. Latency and rate limiting (429s with Retry-After) can be injected
+to see how the app behaves under a slow or throttling Razorpay.
+
+	bench --site <site> razorpay-fake-server --latency 80 --rate-limit 25
+
+and point the site at it in site_config.json:
+
+	"razorpay_api_base_url": "http://127.0.0.1:9600"
+
+Razorpay's side of a payment (a customer paying a link, a subscription
+being charged, a settlement being made) is triggered from the `/_fake/`
+endpoints, which also deliver the signed webhooks Razorpay would send.
+"""
+
+import argparse
+import copy
+import hashlib
+import hmac
+import json
+import math
+import queue
+import random
+import string
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import requests
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import Map, Rule
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 9600
+# used by `get_razorpay_client` when the site has no API keys configured
+DEFAULT_KEY_ID = "rzp_test_fakerazorpay"
+DEFAULT_KEY_SECRET = "fake_razorpay_secret"
+ACCOUNT_ID = "acc_fakerazorpay"
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+FEE_RATE = 0.02  # of the amount, GST comes on top
+GST_RATE = 0.18
+WEBHOOK_TIMEOUT = 10  # seconds
+
+ENTITY_TYPES = (
+	"order",
+	"payment",
+	"refund",
+	"payment_link",
+	"plan",
+	"subscription",
+	"settlement",
+	"settlement.ondemand",
+)
+
+# subscription action (see `fake_subscription_action`) -> (status, event)
+SUBSCRIPTION_ACTIONS = {
+	"authenticate": ("authenticated", "subscription.authenticated"),
+	"activate": ("active", "subscription.activated"),
+	"charge": ("active", "subscription.charged"),
+	"pending": ("pending", "subscription.pending"),
+	"halt": ("halted", "subscription.halted"),
+}
+
+URL_MAP = Map(
+	[
+		Rule("/v1/orders", methods=["POST"], endpoint="create_order"),
+		Rule("/v1/orders", methods=["GET"], endpoint="list_orders"),
+		Rule("/v1/orders/<id>", methods=["GET"], endpoint="get_order"),
+		Rule(
+			"/v1/orders/<id>/payments",
+			methods=["GET"],
+			endpoint="get_order_payments",
+		),
+		Rule("/v1/payments", methods=["GET"], endpoint="list_payments"),
+		Rule("/v1/payments/<id>", methods=["GET"], endpoint="get_payment"),
+		Rule(
+			"/v1/payments/<id>/capture",
+			methods=["POST"],
+			endpoint="capture_payment",
+		),
+		Rule(
+			"/v1/payments/<id>/refund",
+			methods=["POST"],
+			endpoint="refund_payment",
+		),
+		Rule(
+			"/v1/payments/<id>/refunds",
+			methods=["GET"],
+			endpoint="get_payment_refunds",
+		),
+		Rule("/v1/refunds", methods=["GET"], endpoint="list_refunds"),
+		Rule("/v1/refunds/<id>", methods=["GET"], endpoint="get_refund"),
+		Rule(
+			"/v1/payment_links",
+			methods=["POST"],
+			endpoint="create_payment_link",
+		),
+		Rule(
+			"/v1/payment_links", methods=["GET"], endpoint="list_payment_links"
+		),
+		Rule(
+			"/v1/payment_links/<id>",
+			methods=["GET"],
+			endpoint="get_payment_link",
+		),
+		Rule(
+			"/v1/payment_links/<id>/cancel",
+			methods=["POST"],
+			endpoint="cancel_payment_link",
+		),
+		Rule("/v1/plans", methods=["POST"], endpoint="create_plan"),
+		Rule("/v1/plans", methods=["GET"], endpoint="list_plans"),
+		Rule("/v1/plans/<id>", methods=["GET"], endpoint="get_plan"),
+		Rule(
+			"/v1/subscriptions",
+			methods=["POST"],
+			endpoint="create_subscription",
+		),
+		Rule(
+			"/v1/subscriptions", methods=["GET"], endpoint="list_subscriptions"
+		),
+		Rule(
+			"/v1/subscriptions/<id>",
+			methods=["GET"],
+			endpoint="get_subscription",
+		),
+		Rule(
+			"/v1/subscriptions/<id>/<any(cancel, pause, resume):action>",
+			methods=["POST"],
+			endpoint="update_subscription",
+		),
+		Rule("/v1/settlements", methods=["GET"], endpoint="list_settlements"),
+		Rule(
+			"/v1/settlements/ondemand",
+			methods=["POST"],
+			endpoint="create_ondemand_settlement",
+		),
+		Rule(
+			"/v1/settlements/ondemand",
+			methods=["GET"],
+			endpoint="list_ondemand_settlements",
+		),
+		Rule(
+			"/v1/settlements/ondemand/<id>",
+			methods=["GET"],
+			endpoint="get_ondemand_settlement",
+		),
+		Rule(
+			"/v1/settlements/<id>", methods=["GET"], endpoint="get_settlement"
+		),
+		# simulation and control, not part of Razorpay's API
+		Rule(
+			"/_fake/orders/<id>/pay",
+			methods=["POST"],
+			endpoint="fake_pay_order",
+		),
+		Rule(
+			"/_fake/payment_links/<id>/pay",
+			methods=["POST"],
+			endpoint="fake_pay_payment_link",
+		),
+		Rule(
+			"/_fake/payment_links/<id>/expire",
+			methods=["POST"],
+			endpoint="fake_expire_payment_link",
+		),
+		Rule(
+			"/_fake/subscriptions/<id>/<action>",
+			methods=["POST"],
+			endpoint="fake_subscription_action",
+		),
+		Rule("/_fake/settlements", methods=["POST"], endpoint="fake_settle"),
+		Rule("/_fake/config", methods=["GET", "POST"], endpoint="fake_config"),
+		Rule("/_fake/stats", methods=["GET"], endpoint="fake_stats"),
+		Rule("/_fake/reset", methods=["POST"], endpoint="fake_reset"),
+	]
+)
+
+
+class RazorpayAPIError(Exception):
+	"""Answered with Razorpay's error body, which the SDK turns into its
+	own exceptions."""
+
+	def __init__(
+		self,
+		description: str,
+		status_code: int = 400,
+		code: str = "BAD_REQUEST_ERROR",
+		headers: dict | None = None,
+	):
+		super().__init__(description)
+		self.description = description
+		self.status_code = status_code
+		self.code = code
+		self.headers = headers or {}
+
+
+class FakeRazorpay:
+	"""WSGI app answering like the Razorpay API."""
+
+	def __init__(
+		self,
+		latency: float = 0,
+		jitter: float = 0,
+		rate_limit: float = 0,
+		burst: float | None = None,
+		webhook_url: str | None = None,
+		webhook_secret: str | None = None,
+		key_id: str | None = None,
+		key_secret: str | None = None,
+	):
+		self.lock = threading.RLock()
+		self.config = {}
+		self.update_config(
+			latency=latency,
+			jitter=jitter,
+			rate_limit=rate_limit,
+			burst=burst,
+			webhook_url=webhook_url,
+			webhook_secret=webhook_secret,
+			key_id=key_id,
+			key_secret=key_secret,
+		)
+		self.reset()
+
+		self.webhook_queue = queue.Queue()
+		threading.Thread(
+			target=self.deliver_webhooks,
+			name="fake_razorpay_webhooks",
+			daemon=True,
+		).start()
+
+	def __call__(self, environ, start_response):
+		return self.dispatch(Request(environ))(environ, start_response)
+
+	def dispatch(self, request: Request) -> Response:
+		try:
+			endpoint, kwargs = URL_MAP.bind_to_environ(request.environ).match()
+			if not endpoint.startswith("fake_"):
+				self.stats["requests"] += 1
+				self.stats[endpoint] += 1
+				self.simulate_latency()
+				self.check_rate_limit()
+				self.authenticate(request)
+			return json_response(getattr(self, endpoint)(request, **kwargs))
+		except RazorpayAPIError as e:
+			return json_response(
+				{
+					"error": {
+						"code": e.code,
+						"description": e.description,
+						"source": "NA",
+						"step": "NA",
+						"reason": "NA",
+						"metadata": {},
+					}
+				},
+				e.status_code,
+				e.headers,
+			)
+		except HTTPException as e:
+			return json_response(
+				{"error": {"code": "BAD_REQUEST_ERROR", "description": e.name}},
+				e.code,
+			)
+
+	# injected behaviour
+
+	def update_config(self, **config):
+		with self.lock:
+			self.config.update(config)
+			self.config["rate_limit"] = float(self.config["rate_limit"] or 0)
+			self.tokens, self.tokens_at = self.get_burst(), time.monotonic()
+
+	def get_burst(self) -> float:
+		return float(self.config["burst"] or self.config["rate_limit"])
+
+	def simulate_latency(self):
+		latency = self.config["latency"] + random.uniform(
+			0, self.config["jitter"]
+		)
+		if latency > 0:
+			time.sleep(latency / 1000)
+
+	def check_rate_limit(self):
+		rate = self.config["rate_limit"]
+		if not rate:
+			return
+
+		with self.lock:
+			now = time.monotonic()
+			self.tokens = min(
+				self.get_burst(), self.tokens + (now - self.tokens_at) * rate
+			)
+			self.tokens_at = now
+			if self.tokens >= 1:
+				self.tokens -= 1
+				return
+
+			self.stats["throttled"] += 1
+			retry_after = math.ceil((1 - self.tokens) / rate)
+
+		raise RazorpayAPIError(
+			"Too many requests",
+			429,
+			headers={"Retry-After": str(retry_after)},
+		)
+
+	def authenticate(self, request: Request):
+		auth = request.authorization
+		key_id, key_secret = self.config["key_id"], self.config["key_secret"]
+		if (
+			not auth
+			or not auth.username
+			or (key_id and auth.username != key_id)
+			or (key_secret and auth.password != key_secret)
+		):
+			raise RazorpayAPIError(
+				"The api key provided is invalid", 401, "BAD_REQUEST_ERROR"
+			)
+
+	# storage
+
+	def reset(self):
+		with self.lock:
+			self.entities = {entity: {} for entity in ENTITY_TYPES}
+			self.settled_payments = set()
+			self.stats = Counter()
+
+	def store(self, value: dict) -> dict:
+		with self.lock:
+			self.entities[value["entity"]][value["id"]] = value
+			return copy.deepcopy(value)
+
+	def get_entity(self, entity: str, entity_id: str) -> dict:
+		try:
+			return self.entities[entity][entity_id]
+		except KeyError:
+			raise RazorpayAPIError("The id provided does not exist") from None
+
+	def get(self, entity: str, entity_id: str) -> dict:
+		with self.lock:
+			return copy.deepcopy(self.get_entity(entity, entity_id))
+
+	def collection(
+		self, entity: str, request: Request, predicate=None, key="items"
+	) -> dict:
+		args = request.args
+		count = min(int(args.get("count", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+		skip = int(args.get("skip", 0))
+		from_, to = int(args.get("from", 0)), int(args.get("to", 0))
+
+		with self.lock:
+			items = [
+				value
+				for value in self.entities[entity].values()
+				if (not predicate or predicate(value))
+				and value["created_at"] >= from_
+				and (not to or value["created_at"] <= to)
+			]
+			items.sort(key=lambda value: value["created_at"], reverse=True)
+			items = copy.deepcopy(items[skip : skip + count])
+
+		if key != "items":
+			return {key: items}
+		return {"entity": "collection", "count": len(items), "items": items}
+
+	# webhooks
+
+	def emit(self, event: str, **entities):
+		if not self.config["webhook_url"]:
+			return
+
+		self.webhook_queue.put(
+			(
+				new_id("evt"),
+				{
+					"entity": "event",
+					"account_id": ACCOUNT_ID,
+					"event": event,
+					"contains": list(entities),
+					"payload": {
+						name: {"entity": copy.deepcopy(value)}
+						for name, value in entities.items()
+					},
+					"created_at": now(),
+				},
+			)
+		)
+
+	def deliver_webhooks(self):
+		session = requests.Session()
+		while True:
+			event_id, event = self.webhook_queue.get()
+			body = json.dumps(event).encode()
+			headers = {
+				"Content-Type": "application/json",
+				"X-Razorpay-Event-Id": event_id,
+			}
+			if self.config["webhook_secret"]:
+				headers["X-Razorpay-Signature"] = sign(
+					body, self.config["webhook_secret"]
+				)
+
+			try:
+				response = session.post(
+					self.config["webhook_url"],
+					data=body,
+					headers=headers,
+					timeout=WEBHOOK_TIMEOUT,
+				)
+				delivered = response.ok
+			except requests.RequestException:
+				delivered = False
+
+			self.stats[
+				"webhooks_delivered" if delivered else "webhooks_failed"
+			] += 1
+
+	# orders
+
+	def create_order(self, request: Request) -> dict:
+		data = get_data(request)
+		amount = get_amount(data)
+		return self.store(
+			{
+				"id": new_id("order"),
+				"entity": "order",
+				"amount": amount,
+				"amount_paid": 0,
+				"amount_due": amount,
+				"currency": data.get("currency") or "INR",
+				"receipt": data.get("receipt"),
+				"offer_id": None,
+				"status": "created",
+				"attempts": 0,
+				"notes": data.get("notes") or [],
+				"created_at": now(),
+			}
+		)
+
+	def list_orders(self, request: Request) -> dict:
+		return self.collection("order", request)
+
+	def get_order(self, request: Request, id: str) -> dict:
+		return self.get("order", id)
+
+	def get_order_payments(self, request: Request, id: str) -> dict:
+		self.get("order", id)
+		return self.collection(
+			"payment", request, lambda payment: payment["order_id"] == id
+		)
+
+	# payments and refunds
+
+	def new_payment(self, amount: int, currency: str, **values) -> dict:
+		fee = round(amount * FEE_RATE)
+		tax = round(fee * GST_RATE)
+		return {
+			"id": new_id("pay"),
+			"entity": "payment",
+			"amount": amount,
+			"currency": currency,
+			"status": "captured",
+			"order_id": None,
+			"invoice_id": None,
+			"international": False,
+			"method": "upi",
+			"amount_refunded": 0,
+			"refund_status": None,
+			"captured": True,
+			"description": None,
+			"card_id": None,
+			"bank": None,
+			"wallet": None,
+			"vpa": "customer@upi",
+			"email": "customer@example.com",
+			"contact": "+919999999999",
+			"customer_id": None,
+			"notes": [],
+			"fee": fee + tax,
+			"tax": tax,
+			"error_code": None,
+			"error_description": None,
+			"created_at": now(),
+			**values,
+		}
+
+	def list_payments(self, request: Request) -> dict:
+		return self.collection("payment", request)
+
+	def get_payment(self, request: Request, id: str) -> dict:
+		return self.get("payment", id)
+
+	def capture_payment(self, request: Request, id: str) -> dict:
+		with self.lock:
+			payment = self.get_entity("payment", id)
+			if payment["status"] != "authorized":
+				raise RazorpayAPIError("This payment has already been captured")
+
+			payment.update({"status": "captured", "captured": True})
+			self.emit("payment.captured", payment=payment)
+			return copy.deepcopy(payment)
+
+	def refund_payment(self, request: Request, id: str) -> dict:
+		data = get_data(request)
+		with self.lock:
+			payment = self.get_entity("payment", id)
+			refundable = payment["amount"] - payment["amount_refunded"]
+			amount = int(data.get("amount") or refundable)
+			if payment["status"] not in ("captured", "refunded"):
+				raise RazorpayAPIError("Only captured payments can be refunded")
+			if not 0 < amount <= refundable:
+				raise RazorpayAPIError(
+					"The refund amount provided is greater than amount captured"
+				)
+
+			payment["amount_refunded"] += amount
+			fully_refunded = payment["amount_refunded"] == payment["amount"]
+			payment["refund_status"] = "full" if fully_refunded else "partial"
+			if fully_refunded:
+				payment["status"] = "refunded"
+
+			refund = self.store(
+				{
+					"id": new_id("rfnd"),
+					"entity": "refund",
+					"amount": amount,
+					"currency": payment["currency"],
+					"payment_id": id,
+					"notes": data.get("notes") or [],
+					"receipt": data.get("receipt"),
+					"acquirer_data": {"rrn": None},
+					"batch_id": None,
+					"status": "processed",
+					"speed_requested": data.get("speed") or "normal",
+					"speed_processed": "normal",
+					"created_at": now(),
+				}
+			)
+			self.emit("refund.processed", refund=refund, payment=payment)
+			return refund
+
+	def get_payment_refunds(self, request: Request, id: str) -> dict:
+		self.get("payment", id)
+		return self.collection(
+			"refund", request, lambda refund: refund["payment_id"] == id
+		)
+
+	def list_refunds(self, request: Request) -> dict:
+		return self.collection("refund", request)
+
+	def get_refund(self, request: Request, id: str) -> dict:
+		return self.get("refund", id)
+
+	# payment links
+
+	def create_payment_link(self, request: Request) -> dict:
+		data = get_data(request)
+		payment_link_id = new_id("plink")
+		return self.store(
+			{
+				"id": payment_link_id,
+				"entity": "payment_link",
+				"amount": get_amount(data),
+				"amount_paid": 0,
+				"currency": data.get("currency") or "INR",
+				"accept_partial": bool(data.get("accept_partial")),
+				"first_min_partial_amount": data.get(
+					"first_min_partial_amount"
+				),
+				"description": data.get("description"),
+				"customer": data.get("customer") or {},
+				"notify": data.get("notify") or {"sms": False, "email": False},
+				"reminder_enable": bool(data.get("reminder_enable")),
+				"reference_id": data.get("reference_id") or "",
+				"upi_link": bool(data.get("upi_link")),
+				"expire_by": data.get("expire_by") or 0,
+				"expired_at": 0,
+				"cancelled_at": 0,
+				"short_url": f"{request.host_url}i/{payment_link_id[6:]}",
+				"status": "created",
+				"payments": None,
+				"order_id": None,
+				"notes": data.get("notes") or None,
+				"user_id": "",
+				"created_at": now(),
+				"updated_at": now(),
+			}
+		)
+
+	def list_payment_links(self, request: Request) -> dict:
+		return self.collection("payment_link", request, key="payment_links")
+
+	def get_payment_link(self, request: Request, id: str) -> dict:
+		return self.get("payment_link", id)
+
+	def cancel_payment_link(self, request: Request, id: str) -> dict:
+		return self.close_payment_link(id, "cancelled")
+
+	def close_payment_link(self, id: str, status: str) -> dict:
+		with self.lock:
+			payment_link = self.get_entity("payment_link", id)
+			if payment_link["status"] not in ("created", "partially_paid"):
+				raise RazorpayAPIError(
+					f"Payment link can't be {status} in "
+					f"{payment_link['status']} state"
+				)
+
+			payment_link.update(
+				{"status": status, f"{status}_at": now(), "updated_at": now()}
+			)
+			self.emit(f"payment_link.{status}", payment_link=payment_link)
+			return copy.deepcopy(payment_link)
+
+	# plans and subscriptions
+
+	def create_plan(self, request: Request) -> dict:
+		data = get_data(request)
+		item = data.get("item") or {}
+		amount = get_amount(item)
+		return self.store(
+			{
+				"id": new_id("plan"),
+				"entity": "plan",
+				"interval": int(data.get("interval") or 1),
+				"period": data.get("period") or "monthly",
+				"item": {
+					"id": new_id("item"),
+					"active": True,
+					"name": item.get("name"),
+					"description": item.get("description"),
+					"amount": amount,
+					"unit_amount": amount,
+					"currency": item.get("currency") or "INR",
+					"type": "plan",
+					"unit": None,
+					"tax_inclusive": False,
+					"hsn_code": None,
+					"sac_code": None,
+					"tax_rate": None,
+					"tax_id": None,
+					"tax_group_id": None,
+					"created_at": now(),
+					"updated_at": now(),
+				},
+				"notes": data.get("notes") or [],
+				"created_at": now(),
+			}
+		)
+
+	def list_plans(self, request: Request) -> dict:
+		return self.collection("plan", request)
+
+	def get_plan(self, request: Request, id: str) -> dict:
+		return self.get("plan", id)
+
+	def create_subscription(self, request: Request) -> dict:
+		data = get_data(request)
+		self.get("plan", data.get("plan_id"))
+		total_count = int(data.get("total_count") or 0)
+		if total_count < 1:
+			raise RazorpayAPIError("The total count field is required.")
+
+		subscription_id = new_id("sub")
+		return self.store(
+			{
+				"id": subscription_id,
+				"entity": "subscription",
+				"plan_id": data["plan_id"],
+				"customer_id": None,
+				"status": "created",
+				"type": 1,
+				"current_start": None,
+				"current_end": None,
+				"ended_at": None,
+				"quantity": int(data.get("quantity") or 1),
+				"notes": data.get("notes") or [],
+				"charge_at": None,
+				"start_at": data.get("start_at"),
+				"end_at": None,
+				"auth_attempts": 0,
+				"total_count": total_count,
+				"paid_count": 0,
+				"remaining_count": total_count,
+				"customer_notify": bool(data.get("customer_notify", 1)),
+				"short_url": f"{request.host_url}i/{subscription_id[4:]}",
+				"has_scheduled_changes": False,
+				"change_scheduled_at": None,
+				"expire_by": data.get("expire_by"),
+				"created_at": now(),
+			}
+		)
+
+	def list_subscriptions(self, request: Request) -> dict:
+		return self.collection("subscription", request)
+
+	def get_subscription(self, request: Request, id: str) -> dict:
+		return self.get("subscription", id)
+
+	def update_subscription(self, request: Request, id: str, action: str):
+		status, event = {
+			"cancel": ("cancelled", "subscription.cancelled"),
+			"pause": ("paused", "subscription.paused"),
+			"resume": ("active", "subscription.resumed"),
+		}[action]
+
+		with self.lock:
+			subscription = self.get_entity("subscription", id)
+			if subscription["status"] in ("cancelled", "completed", "expired"):
+				raise RazorpayAPIError(
+					f"Subscription is not cancellable in "
+					f"{subscription['status']} status."
+				)
+
+			subscription["status"] = status
+			if status == "cancelled":
+				subscription["ended_at"] = now()
+			self.emit(event, subscription=subscription)
+			return copy.deepcopy(subscription)
+
+	# settlements
+
+	def list_settlements(self, request: Request) -> dict:
+		return self.collection("settlement", request)
+
+	def get_settlement(self, request: Request, id: str) -> dict:
+		return self.get("settlement", id)
+
+	def create_ondemand_settlement(self, request: Request) -> dict:
+		data = get_data(request)
+		amount = get_amount(data)
+		fees = round(amount * 0.0012)
+		tax = round(fees * GST_RATE)
+		return self.store(
+			{
+				"id": new_id("setlod"),
+				"entity": "settlement.ondemand",
+				"amount_requested": amount,
+				"amount_settled": amount - fees - tax,
+				"amount_pending": 0,
+				"amount_reversed": 0,
+				"fees": fees + tax,
+				"tax": tax,
+				"currency": data.get("currency") or "INR",
+				"settle_full_balance": bool(data.get("settle_full_balance")),
+				"status": "processed",
+				"description": data.get("description"),
+				"notes": data.get("notes") or [],
+				"created_at": now(),
+			}
+		)
+
+	def list_ondemand_settlements(self, request: Request) -> dict:
+		return self.collection("settlement.ondemand", request)
+
+	def get_ondemand_settlement(self, request: Request, id: str) -> dict:
+		return self.get("settlement.ondemand", id)
+
+	# simulation
+
+	def fake_pay_order(self, request: Request, id: str) -> dict:
+		"""Pay an order in full; `{"capture": 0}` leaves it authorized."""
+		capture = get_data(request).get("capture", 1)
+		with self.lock:
+			order = self.get_entity("order", id)
+			if order["status"] == "paid":
+				raise RazorpayAPIError("Order is already paid")
+
+			payment = self.store(
+				self.new_payment(
+					order["amount_due"],
+					order["currency"],
+					order_id=id,
+					status="captured" if capture else "authorized",
+					captured=bool(capture),
+				)
+			)
+			order.update(
+				{
+					"status": "paid",
+					"attempts": order["attempts"] + 1,
+					"amount_paid": order["amount"],
+					"amount_due": 0,
+				}
+			)
+			if capture:
+				self.emit("payment.captured", payment=payment)
+			self.emit("order.paid", payment=payment, order=order)
+			return payment
+
+	def fake_pay_payment_link(self, request: Request, id: str) -> dict:
+		"""Pay a payment link, in full unless an `amount` is given."""
+		data = get_data(request)
+		with self.lock:
+			payment_link = self.get_entity("payment_link", id)
+			if payment_link["status"] not in ("created", "partially_paid"):
+				raise RazorpayAPIError(
+					f"Payment link is {payment_link['status']}"
+				)
+
+			due = payment_link["amount"] - payment_link["amount_paid"]
+			amount = int(data.get("amount") or due)
+			if not 0 < amount <= due:
+				raise RazorpayAPIError("Invalid amount")
+
+			if not payment_link["order_id"]:
+				payment_link["order_id"] = self.store(
+					{
+						"id": new_id("order"),
+						"entity": "order",
+						"amount": payment_link["amount"],
+						"amount_paid": 0,
+						"amount_due": payment_link["amount"],
+						"currency": payment_link["currency"],
+						"receipt": None,
+						"offer_id": None,
+						"status": "attempted",
+						"attempts": 0,
+						"notes": [],
+						"created_at": now(),
+					}
+				)["id"]
+			order = self.get_entity("order", payment_link["order_id"])
+
+			payment = self.store(
+				self.new_payment(
+					amount,
+					payment_link["currency"],
+					order_id=order["id"],
+					description=f"#{id[6:]}",
+				)
+			)
+
+			paid = amount == due
+			payment_link["amount_paid"] += amount
+			payment_link["status"] = "paid" if paid else "partially_paid"
+			payment_link["updated_at"] = now()
+			payment_link["payments"] = (payment_link["payments"] or []) + [
+				{
+					"amount": amount,
+					"created_at": payment["created_at"],
+					"method": payment["method"],
+					"payment_id": payment["id"],
+					"plink_id": id,
+					"status": "captured",
+					"updated_at": now(),
+				}
+			]
+			order.update(
+				{
+					"status": "paid" if paid else "attempted",
+					"attempts": order["attempts"] + 1,
+					"amount_paid": payment_link["amount_paid"],
+					"amount_due": payment_link["amount"]
+					- payment_link["amount_paid"],
+				}
+			)
+
+			self.emit(
+				f"payment_link.{payment_link['status']}",
+				payment_link=payment_link,
+				payment=payment,
+				order=order,
+			)
+			return payment
+
+	def fake_expire_payment_link(self, request: Request, id: str) -> dict:
+		return self.close_payment_link(id, "expired")
+
+	def fake_subscription_action(
+		self, request: Request, id: str, action: str
+	) -> dict:
+		"""Move a subscription along: authenticate, activate, charge,
+		pending or halt."""
+		if action not in SUBSCRIPTION_ACTIONS:
+			raise RazorpayAPIError(f"Unknown subscription action: {action}")
+
+		status, event = SUBSCRIPTION_ACTIONS[action]
+		with self.lock:
+			subscription = self.get_entity("subscription", id)
+			entities = {"subscription": subscription}
+
+			if action == "authenticate":
+				subscription["customer_id"] = new_id("cust")
+				subscription["auth_attempts"] += 1
+			elif action == "activate":
+				subscription["current_start"] = now()
+			elif action == "charge":
+				entities["payment"] = self.charge_subscription(subscription)
+
+			subscription["status"] = status
+			self.emit(event, **entities)
+
+			if action == "charge" and not subscription["remaining_count"]:
+				subscription.update({"status": "completed", "ended_at": now()})
+				self.emit("subscription.completed", subscription=subscription)
+			return copy.deepcopy(subscription)
+
+	def charge_subscription(self, subscription: dict) -> dict:
+		if not subscription["remaining_count"]:
+			raise RazorpayAPIError("Subscription has no charges left")
+
+		plan = self.get_entity("plan", subscription["plan_id"])
+		amount = plan["item"]["amount"] * subscription["quantity"]
+		order = self.store(
+			{
+				"id": new_id("order"),
+				"entity": "order",
+				"amount": amount,
+				"amount_paid": amount,
+				"amount_due": 0,
+				"currency": plan["item"]["currency"],
+				"receipt": None,
+				"offer_id": None,
+				"status": "paid",
+				"attempts": 1,
+				"notes": [],
+				"created_at": now(),
+			}
+		)
+
+		subscription["paid_count"] += 1
+		subscription["remaining_count"] -= 1
+		subscription["current_start"] = now()
+		return self.store(
+			self.new_payment(
+				amount,
+				order["currency"],
+				order_id=order["id"],
+				invoice_id=new_id("inv"),
+				customer_id=subscription["customer_id"],
+				description="Subscription charge",
+			)
+		)
+
+	def fake_settle(self, request: Request) -> dict:
+		"""Settle every captured payment not settled yet."""
+		with self.lock:
+			payments = [
+				payment
+				for payment in self.entities["payment"].values()
+				if payment["status"] == "captured"
+				and payment["id"] not in self.settled_payments
+			]
+			if not payments:
+				raise RazorpayAPIError("No captured payments to settle")
+
+			self.settled_payments.update(payment["id"] for payment in payments)
+			fees = sum(payment["fee"] for payment in payments)
+			tax = sum(payment["tax"] for payment in payments)
+			settlement = self.store(
+				{
+					"id": new_id("setl"),
+					"entity": "settlement",
+					"amount": sum(payment["amount"] for payment in payments)
+					- fees,
+					"status": "processed",
+					"fees": fees,
+					"tax": tax,
+					"utr": "".join(random.choices(string.digits, k=16)),
+					"created_at": now(),
+				}
+			)
+			self.emit("settlement.processed", settlement=settlement)
+			return settlement
+
+	def fake_config(self, request: Request) -> dict:
+		if request.method == "POST":
+			self.update_config(
+				**{
+					key: value
+					for key, value in get_data(request).items()
+					if key in self.config
+				}
+			)
+		return {
+			key: value
+			for key, value in self.config.items()
+			if key not in ("key_secret", "webhook_secret")
+		}
+
+	def fake_stats(self, request: Request) -> dict:
+		with self.lock:
+			return {
+				**self.stats,
+				"entities": {
+					entity: len(values)
+					for entity, values in self.entities.items()
+				},
+				"pending_webhooks": self.webhook_queue.qsize(),
+			}
+
+	def fake_reset(self, request: Request) -> dict:
+		self.reset()
+		return {}
+
+
+@contextmanager
+def running(host: str = DEFAULT_HOST, port: int = 0, **config):
+	"""Serve a `FakeRazorpay` from a background thread for the duration of
+	the block, on a free port by default. Yields the app and its base URL."""
+	api = FakeRazorpay(**config)
+	server = make_server(host, port, api, threaded=True)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	try:
+		yield api, f"http://{host}:{server.server_port}"
+	finally:
+		server.shutdown()
+		server.server_close()
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **config):
+	"""Serve a `FakeRazorpay` until interrupted."""
+	server = make_server(host, port, FakeRazorpay(**config), threaded=True)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+
+def json_response(
+	body: dict, status: int = 200, headers: dict | None = None
+) -> Response:
+	return Response(
+		json.dumps(body),
+		status=status,
+		headers=headers,
+		content_type="application/json",
+	)
+
+
+def get_data(request: Request) -> dict:
+	return request.get_json(silent=True) or request.form.to_dict() or {}
+
+
+def get_amount(data: dict) -> int:
+	try:
+		amount = int(data.get("amount"))
+	except (TypeError, ValueError):
+		raise RazorpayAPIError("The amount field is required.") from None
+
+	if amount < 100:
+		raise RazorpayAPIError(
+			"The amount must be atleast INR 1.00 or equivalent"
+		)
+	return amount
+
+
+def new_id(prefix: str) -> str:
+	suffix = "".join(random.choices(string.ascii_letters + string.digits, k=14))
+	return f"{prefix}_{suffix}"
+
+
+def now() -> int:
+	return int(time.time())
+
+
+def sign(body: bytes, secret: str) -> str:
+	return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument("--host", default=DEFAULT_HOST)
+	parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+	parser.add_argument("--latency", type=float, default=0, help="ms")
+	parser.add_argument("--jitter", type=float, default=0, help="ms")
+	parser.add_argument("--rate-limit", type=float, default=0, help="req/s")
+	parser.add_argument("--burst", type=float)
+	parser.add_argument("--webhook-url")
+	parser.add_argument("--webhook-secret")
+	serve(**vars(parser.parse_args()))
+
+
+if __name__ == "__main__":
+	main()
@@ -16,7 +16,22 @@ webhook_endpoints = [
 ]
 
 scheduler_events = {
-	"hourly": ["razorpay_frappe.webhook_handler.sync_payment_link_status"]
+	"all": [
+		"razorpay_frappe.webhook_queue.requeue_pending_webhook_partitions",
+		"razorpay_frappe.webhook_retry.retry_failed_webhook_logs",
+		"razorpay_frappe.webhook_replay.release_stale_replay_claims",
+		"razorpay_frappe.api_circuit.run_deferred_api_calls",
+	],
+	"cron": {
+		"*/5 * * * *": [
+			"razorpay_frappe.payment_link_polling.poll_pending_payment_links",
+		],
+	},
+	"hourly": ["razorpay_frappe.schedule_handlers.sync_payment_link_status"],
+	"daily": [
+		"razorpay_frappe.webhook_storage.archive_webhook_logs",
+		"razorpay_frappe.payment_link_expiry.expire_payment_links",
+	],
 }
 
 # Includes in <head>
@@ -0,0 +1,56 @@
+"""Local expiry of Razorpay Payment Links.
+
+Razorpay expires a link at its `expire_by`, some time during that day
+depending on how the link was created. Once the whole day has passed the
+outcome is known without asking Razorpay, so a daily job marks every open
+link past it Expired in one UPDATE, along with the Payment Status of the
+quotations they were created for. Webhooks and syncs stay authoritative:
+one that reports a late payment still overrides the local status.
+"""
+
+import frappe
+from frappe.query_builder.functions import Count
+from frappe.utils import getdate, now_datetime
+
+from razorpay_frappe.payment_link_sync import OPEN_LINK_STATUSES
+
+
+def expire_payment_links() -> int:
+	"""Mark open links whose `expire_by` day has passed Expired. Scheduled
+	daily; returns the number of links expired."""
+	PaymentLink = frappe.qb.DocType("Razorpay Payment Link")
+	# served by the (status, expire_by) index
+	is_expiring = PaymentLink.status.isin(OPEN_LINK_STATUSES) & (
+		PaymentLink.expire_by < getdate()
+	)
+
+	count = (
+		frappe.qb.from_(PaymentLink).select(Count("*")).where(is_expiring)
+	).run()[0][0]
+	if not count:
+		return 0
+
+	# quotations first, while their links still match
+	if frappe.db.has_column("Quotation", "razorpay_status"):
+		Quotation = frappe.qb.DocType("Quotation")
+		(
+			frappe.qb.update(Quotation)
+			.set(Quotation.razorpay_status, "Expired")
+			.where(
+				Quotation.razorpay_payment_link.isin(
+					frappe.qb.from_(PaymentLink)
+					.select(PaymentLink.name)
+					.where(is_expiring)
+				)
+			)
+		).run()
+
+	(
+		frappe.qb.update(PaymentLink)
+		.set(PaymentLink.status, "Expired")
+		.set(PaymentLink.modified, now_datetime())
+		.where(is_expiring)
+	).run()
+
+	frappe.logger("razorpay").info(f"Expired {count} payment links locally")
+	return count
@@ -0,0 +1,181 @@
+"""Adaptive polling of pending Razorpay Payment Links.
+
+Every few minutes the poller fetches the open links most likely to have
+changed, spending at most `payment_link_poll_budget` API calls per run.
+Links are scored by how close they are to expiring and how recently they
+saw activity; links Razorpay has already sent webhooks for are scored
+lower, since their next change will most likely arrive as a webhook too.
+
+A link that is polled and found unchanged waits twice as long before it is
+due again, up to `MAX_POLL_INTERVAL`; one that changed is due again after
+`BASE_POLL_INTERVAL`. The hourly incremental sync (`payment_link_sync`)
+remains the backstop for links the poller doesn't get to.
+"""
+
+import json
+from datetime import datetime
+
+import frappe
+from frappe.utils import cint, get_datetime, now_datetime
+
+from razorpay_frappe.api_circuit import is_api_available
+from razorpay_frappe.bulk_fetch import iter_fetch_entities
+from razorpay_frappe.entity_cache import RazorpayEntity
+from razorpay_frappe.payment_link_sync import (
+	LINK_SYNC_FIELDS,
+	OPEN_LINK_STATUSES,
+	has_changed,
+	write_changed_links,
+)
+
+DEFAULT_POLL_BUDGET = 50  # links per run
+BASE_POLL_INTERVAL = 5 * 60  # seconds, the poller's schedule
+MAX_POLL_INTERVAL = 24 * 60 * 60  # seconds
+POLL_STATE_KEY = "razorpay_payment_link_poll"
+
+# weight of a link's score when webhooks already arrive for it
+WEBHOOK_CONFIRMED_WEIGHT = 0.25
+
+
+def poll_pending_payment_links() -> dict:
+	"""Fetch the highest scored due links and write the ones that changed.
+
+	Scheduled every 5 minutes. Returns the number of links polled and
+	updated.
+	"""
+	if not is_api_available():
+		return {"due": 0, "polled": 0, "updated": 0}
+
+	now = now_datetime()
+	links = {
+		link.id: link
+		for link in frappe.get_all(
+			"Razorpay Payment Link",
+			filters={"status": ("in", OPEN_LINK_STATUSES), "id": ("is", "set")},
+			fields=[*LINK_SYNC_FIELDS, "expire_by", "modified"],
+		)
+	}
+	poll_state = get_poll_state()
+	last_webhooks = get_last_webhooks(list(links))
+
+	due = [
+		link
+		for link_id, link in links.items()
+		if poll_state.get(link_id, {}).get("next_poll_at", 0) <= now.timestamp()
+	]
+	due.sort(
+		key=lambda link: get_poll_score(link, now, last_webhooks.get(link.id)),
+		reverse=True,
+	)
+
+	counts = {"due": len(due), "polled": 0, "updated": 0}
+	new_state, changes = {}, []
+	for link_id, details, error in iter_fetch_entities(
+		RazorpayEntity.PaymentLink,
+		[link.id for link in due[: get_poll_budget()]],
+		refresh=True,
+	):
+		if error:
+			# retried in the next run
+			continue
+
+		counts["polled"] += 1
+		link = links[link_id]
+		changed = has_changed(link, details)
+		if changed:
+			changes.append((link, details))
+
+		new_state[link_id] = get_next_poll_state(
+			poll_state.get(link_id), changed, now.timestamp()
+		)
+
+	write_changed_links(changes)
+	counts["updated"] = len(changes)
+	save_poll_state(new_state, stale=set(poll_state) - set(links))
+	return counts
+
+
+def get_poll_score(link, now: datetime, last_webhook: datetime | None) -> float:
+	"""Likelihood that `link` changed since it was last seen, between 0 and
+	3: up to 2 for expiring soon, up to 1 for recent activity."""
+	expiry = 0
+	if link.expire_by:
+		days_left = (get_datetime(link.expire_by) - now).total_seconds() / 86400
+		# past expire_by it is expired on Razorpay but not here yet
+		expiry = 1 / (1 + max(days_left, 0))
+
+	last_activity = max(
+		filter(None, (get_datetime(link.modified), last_webhook))
+	)
+	idle_days = max((now - last_activity).total_seconds() / 86400, 0)
+	activity = 1 / (1 + idle_days)
+
+	score = 2 * expiry + activity
+	if last_webhook:
+		score *= WEBHOOK_CONFIRMED_WEIGHT
+	return score
+
+
+def get_next_poll_state(state: dict | None, changed: bool, now: float) -> dict:
+	"""Back off exponentially while a link stays unchanged."""
+	unchanged = 0 if changed else cint((state or {}).get("unchanged")) + 1
+	interval = min(BASE_POLL_INTERVAL * 2**unchanged, MAX_POLL_INTERVAL)
+	return {"unchanged": unchanged, "next_poll_at": now + interval}
+
+
+def get_last_webhooks(link_ids: list[str]) -> dict[str, datetime]:
+	"""When the latest webhook about each of `link_ids` arrived."""
+	if not link_ids:
+		return {}
+
+	return {
+		row.entity_id: get_datetime(row.last_webhook)
+		for row in frappe.get_all(
+			"Razorpay Webhook Log",
+			filters={"entity_id": ("in", link_ids)},
+			fields=["entity_id", "max(creation) as last_webhook"],
+			group_by="entity_id",
+		)
+	}
+
+
+def get_poll_budget() -> int:
+	return (
+		cint(
+			frappe.db.get_single_value(
+				"Razorpay Settings", "payment_link_poll_budget"
+			)
+		)
+		or DEFAULT_POLL_BUDGET
+	)
+
+
+def get_poll_state() -> dict[str, dict]:
+	cache = frappe.cache()
+	pipeline = cache.pipeline()
+	pipeline.hgetall(cache.make_key(POLL_STATE_KEY))
+	(states,) = pipeline.execute()
+	return {
+		frappe.safe_decode(link_id): json.loads(state)
+		for link_id, state in states.items()
+	}
+
+
+def save_poll_state(states: dict[str, dict], stale: set[str]):
+	"""Store the polled links' state and forget links no longer open."""
+	if not (states or stale):
+		return
+
+	cache = frappe.cache()
+	key = cache.make_key(POLL_STATE_KEY)
+	pipeline = cache.pipeline()
+	if states:
+		pipeline.hset(
+			key,
+			mapping={
+				link_id: json.dumps(state) for link_id, state in states.items()
+			},
+		)
+	if stale:
+		pipeline.hdel(key, *stale)
+	pipeline.execute()
@@ -0,0 +1,349 @@
+"""Incremental sync of Razorpay Payment Links.
+
+Razorpay lists payment links newest first. A sync pages through the links
+created since the watermark: the `created_at` of the oldest link that was
+still open at the previous sync. Anything created before it is paid,
+cancelled or expired and can no longer change, so the cost of a sync grows
+with the number of open links rather than with the whole history. Only
+local rows whose status, amount paid or payment differ from Razorpay are
+written, in one bulk UPDATE per chunk.
+
+Every page of links is a chunk: it is committed and checkpointed in Redis
+before the next one is listed, so a sync whose worker died resumes after
+the last finished chunk. Only one sync runs per site at a time; a full
+sync requested meanwhile is run by the running sync once it has finished.
+"""
+
+from collections.abc import Iterator
+
+import frappe
+from frappe.utils import cint, flt, now_datetime
+from redis.exceptions import LockError
+
+from razorpay_frappe.entity_cache import RazorpayEntity, invalidate_entity
+from razorpay_frappe.utils import get_razorpay_client
+
+PAGE_SIZE = 100
+# Razorpay statuses of links that can still be paid
+OPEN_STATUSES = frozenset(("created", "partially_paid"))
+# and the Razorpay Payment Link statuses of such links
+OPEN_LINK_STATUSES = ("Created", "Partially Paid")
+WATERMARK_FIELD = "payment_link_sync_watermark"
+
+SYNC_JOB_ID = "razorpay_payment_link_sync"
+SYNC_LOCK_KEY = "razorpay_payment_link_sync_lock"
+# a sync that hasn't finished a chunk for this long is presumed dead
+SYNC_LOCK_TTL = 10 * 60  # seconds
+SYNC_CHECKPOINT_KEY = "razorpay_payment_link_sync_checkpoint"
+SYNC_CHECKPOINT_TTL = 24 * 60 * 60  # seconds
+# users whose full sync waits for the running one, see `request_full_sync`
+SYNC_FULL_REQUESTS_KEY = "razorpay_payment_link_sync_full_requests"
+SYNC_REALTIME_EVENT = "razorpay_payment_link_sync"
+# what diffing and writing a link's status needs from the local row
+LINK_SYNC_FIELDS = (
+	"name",
+	"id",
+	"status",
+	"amount",
+	"amount_paid",
+	"remaining_amount",
+	"razorpay_payment_id",
+	"customer",
+	"quotation",
+)
+
+# Razorpay status -> Razorpay Payment Link status
+PAYMENT_LINK_STATUSES = {
+	"partially_paid": "Partially Paid",
+	"paid": "Paid",
+	"cancelled": "Cancelled",
+	"expired": "Expired",
+}
+
+
+def enqueue_payment_link_sync(full: bool = False, user: str | None = None):
+	"""Run `sync_payment_links` in the background, unless a sync is already
+	queued. Returns the job, or None; a full sync is then left to the queued
+	one, see `request_full_sync`."""
+	job = frappe.enqueue(
+		"razorpay_frappe.payment_link_sync.sync_payment_links",
+		queue="long",
+		timeout=6 * 60 * 60,
+		job_id=SYNC_JOB_ID,
+		deduplicate=True,
+		full=full,
+		user=user,
+	)
+	if not job and full:
+		request_full_sync(user)
+	return job
+
+
+def sync_payment_links(
+	full: bool = False, user: str | None = None
+) -> dict | None:
+	"""Update local payment links from Razorpay's list of links.
+
+	`full` pages through every link instead of starting at the watermark.
+	An interrupted sync is resumed from its checkpoint. Progress is
+	published to `user` over the `razorpay_payment_link_sync` realtime
+	event. Returns the number of links listed and updated, or None when
+	another sync is running: the running sync does a requested full sync
+	once it has finished its own, see `request_full_sync`.
+	"""
+	cache = frappe.cache()
+	lock = cache.lock(cache.make_key(SYNC_LOCK_KEY), timeout=SYNC_LOCK_TTL)
+	if not lock.acquire(blocking=False):
+		if full:
+			request_full_sync(user)
+		publish_sync_progress(
+			{"full": bool(full), "listed": 0, "updated": 0},
+			[user],
+			done=True,
+			already_running=True,
+		)
+		return None
+
+	users = [user]
+	try:
+		# left over from a sync that had finished before seeing them
+		if requested := pop_full_sync_requests():
+			full, users = True, list(dict.fromkeys([user, *requested]))
+		while True:
+			progress = run_sync(full, users, lock)
+			# full syncs requested during this one
+			if not (requested := pop_full_sync_requests()):
+				break
+			full, users = True, requested
+	finally:
+		try:
+			lock.release()
+		except LockError:
+			# expired meanwhile; another sync may resume from the checkpoint
+			pass
+
+	counts = {key: progress[key] for key in ("listed", "updated")}
+	frappe.logger("razorpay").info(f"Payment link sync: {counts}")
+	return counts
+
+
+def run_sync(full: bool, users: list[str | None], lock) -> dict:
+	"""One pass of `sync_payment_links`, holding `lock`. Returns its
+	progress."""
+	cache = frappe.cache()
+	progress = get_sync_checkpoint()
+	# a full sync covers an interrupted incremental one, not vice versa
+	if not progress or (full and not progress["full"]):
+		progress = {
+			"full": bool(full),
+			"from": 0 if full else get_sync_watermark(),
+			"skip": 0,
+			"listed": 0,
+			"updated": 0,
+			"oldest_open": None,
+			"newest": None,
+		}
+
+	for page in iter_payment_link_pages(progress["from"], progress["skip"]):
+		sync_page(page, progress)
+		progress["skip"] += len(page)
+
+		frappe.db.commit()
+		cache.set_value(
+			SYNC_CHECKPOINT_KEY,
+			progress,
+			expires_in_sec=SYNC_CHECKPOINT_TTL,
+		)
+		lock.reacquire()
+		publish_sync_progress(progress, users)
+
+	# links created in the newest link's second may not have been listed
+	set_sync_watermark(
+		progress["oldest_open"] or progress["newest"] or progress["from"]
+	)
+	frappe.db.commit()
+	cache.delete_value(SYNC_CHECKPOINT_KEY)
+	publish_sync_progress(progress, users, done=True)
+	return progress
+
+
+def request_full_sync(user: str | None):
+	"""Record a full sync requested while another sync is queued or running.
+
+	The sync holding the lock runs it after its own pass; if that had just
+	finished, the next sync, at the latest the hourly one, starts with it.
+	"""
+	cache = frappe.cache()
+	key = cache.make_key(SYNC_FULL_REQUESTS_KEY)
+	pipeline = cache.pipeline()
+	# "": requested without a user to notify
+	pipeline.sadd(key, user or "")
+	pipeline.expire(key, SYNC_CHECKPOINT_TTL)
+	pipeline.execute()
+
+
+def pop_full_sync_requests() -> list[str | None]:
+	"""The users that requested a full sync since the last call."""
+	cache = frappe.cache()
+	key = cache.make_key(SYNC_FULL_REQUESTS_KEY)
+	pipeline = cache.pipeline()
+	pipeline.smembers(key)
+	pipeline.delete(key)
+	users, _ = pipeline.execute()
+	return [frappe.safe_decode(user) or None for user in users]
+
+
+def sync_page(page: list[dict], progress: dict):
+	"""Write the changed links of `page`, counting them in `progress`."""
+	local_links = {
+		link.id: link
+		for link in frappe.get_all(
+			"Razorpay Payment Link",
+			filters={"id": ("in", [link["id"] for link in page])},
+			fields=LINK_SYNC_FIELDS,
+		)
+	}
+
+	changes = []
+	for link in page:
+		progress["listed"] += 1
+		created_at = cint(link.get("created_at"))
+		progress["newest"] = max(progress["newest"] or created_at, created_at)
+		if link.get("status") in OPEN_STATUSES:
+			progress["oldest_open"] = min(
+				progress["oldest_open"] or created_at, created_at
+			)
+
+		local_link = local_links.get(link["id"])
+		if local_link and has_changed(local_link, link):
+			changes.append((local_link, link))
+
+	write_changed_links(changes)
+	progress["updated"] += len(changes)
+
+
+def write_changed_links(changes: list[tuple[dict, dict]]):
+	"""Write the Razorpay state of `(local_link, link)` pairs: the status
+	fields of all links in one bulk UPDATE, then their payments in one bulk
+	upsert.
+
+	Documents are not loaded or saved; Razorpay Payment Link has no hooks
+	that would need to run.
+	"""
+	if not changes:
+		return
+
+	# imported here: webhook_handler uses this module
+	from razorpay_frappe.webhook_handler import (
+		get_payment_details,
+		upsert_payment_details,
+	)
+
+	frappe.db.bulk_update(
+		"Razorpay Payment Link",
+		{
+			local_link.name: get_status_values(local_link, link)
+			for local_link, link in changes
+		},
+		chunk_size=PAGE_SIZE,
+	)
+	payment_details = {}
+	for local_link, link in changes:
+		invalidate_entity(RazorpayEntity.PaymentLink, link["id"])
+		payment_details.update(get_payment_details(local_link, link))
+	upsert_payment_details(payment_details)
+
+
+def iter_payment_link_pages(
+	created_from: int, skip: int = 0
+) -> Iterator[list[dict]]:
+	"""Pages of the links created at or after `created_from`, newest first,
+	starting after the first `skip` links."""
+	client = get_razorpay_client()
+	while True:
+		page = client.payment_link.all(
+			{"from": created_from, "count": PAGE_SIZE, "skip": skip}
+		).get("payment_links", [])
+		if page:
+			yield page
+		if len(page) < PAGE_SIZE:
+			return
+
+		# a link created meanwhile shifts the list: seen again, never skipped
+		skip += len(page)
+
+
+def get_payment_link_status(razorpay_status: str | None) -> str:
+	return PAYMENT_LINK_STATUSES.get(razorpay_status, "Created")
+
+
+def get_status_values(local_link, link: dict) -> dict:
+	"""The fields of `local_link` that mirror Razorpay's `link`."""
+	amount = flt(local_link.amount)
+	# Razorpay reports amounts in paise
+	amount_paid = flt(link.get("amount_paid")) / 100 or flt(
+		local_link.amount_paid
+	)
+	if amount_paid >= amount:
+		payment_status = "Paid"
+	elif amount_paid > 0:
+		payment_status = "Partially Paid"
+	else:
+		payment_status = "Pending"
+
+	return {
+		"status": get_payment_link_status(link.get("status")),
+		"amount_paid": amount_paid,
+		"remaining_amount": max(0, amount - amount_paid),
+		"razorpay_payment_id": link.get("payment_id"),
+		"razorpay_payment_status": payment_status,
+	}
+
+
+def has_changed(local_link, link: dict) -> bool:
+	return (
+		local_link.status != get_payment_link_status(link.get("status"))
+		or flt(local_link.amount_paid) != flt(link.get("amount_paid")) / 100
+		or (local_link.razorpay_payment_id or None)
+		!= (link.get("payment_id") or None)
+	)
+
+
+def get_sync_watermark() -> int:
+	return cint(
+		frappe.db.get_single_value("Razorpay Settings", WATERMARK_FIELD)
+	)
+
+
+def set_sync_watermark(watermark: int):
+	frappe.db.set_single_value("Razorpay Settings", WATERMARK_FIELD, watermark)
+
+
+def get_sync_checkpoint() -> dict | None:
+	return frappe.cache().get_value(SYNC_CHECKPOINT_KEY)
+
+
+def publish_sync_progress(
+	progress: dict,
+	users: list[str | None],
+	done: bool = False,
+	already_running: bool = False,
+):
+	"""Publish `progress` to `users`. `already_running`: the sync did not
+	start because another one holds the lock."""
+	for user in users:
+		if not user:
+			continue
+
+		frappe.publish_realtime(
+			SYNC_REALTIME_EVENT,
+			{
+				"full": progress["full"],
+				"listed": progress["listed"],
+				"updated": progress["updated"],
+				"done": done,
+				"already_running": already_running,
+				"timestamp": str(now_datetime()),
+			},
+			user=user,
+		)
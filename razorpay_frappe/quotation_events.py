@@ -1,5 +1,7 @@
 from __future__ import annotations
 import frappe
+from frappe import _
+from razorpay_frappe.api_circuit import defer_until_api_available, is_api_available
 from razorpay_frappe.utils import (
     create_payment_link_for_quotation,
     post_to_zohocliq,
@@ -10,13 +12,21 @@ from razorpay_frappe.zoho_templates import create_simple_quote_notification
 def handle_quotation_submit(doc, method=None):
     """Generate payment link on quotation submit."""
     try:
+        # Razorpay is down: don't make the submit wait for it to time out
+        if not is_api_available():
+            defer_quotation_submit(doc)
+            return
+
         # Always create a new payment link (Razorpay doesn't allow updating amounts/dates)
         # For revisions, we'll create a new link but track the relationship
         result = create_payment_link_for_quotation(doc.name)
         
         # Check if payment link creation was successful
         if isinstance(result, dict) and result.get("success") == False:
-            # Payment link creation failed
+            # Payment link creation failed; retry later if Razorpay went down meanwhile
+            if not is_api_available():
+                defer_quotation_submit(doc)
+                return
             frappe.log_error(f"Payment link creation failed: {result.get('error')}", "Razorpay Quotation Submit")
             return
         
@@ -92,4 +102,23 @@ def handle_quotation_submit(doc, method=None):
         except:
             pass
 
- 
\ No newline at end of file
+ 
+
+def defer_quotation_submit(doc):
+    """Create the payment link once Razorpay is reachable again."""
+    defer_until_api_available(
+        "razorpay_frappe.quotation_events.handle_deferred_quotation_submit",
+        quotation_name=doc.name,
+    )
+    frappe.msgprint(
+        _("Razorpay is not responding. The payment link will be created once it is back."),
+        indicator="orange",
+        alert=True,
+    )
+
+
+def handle_deferred_quotation_submit(quotation_name: str):
+    """Background job: the on-submit work deferred while Razorpay was down."""
+    doc = frappe.get_doc("Quotation", quotation_name)
+    if doc.docstatus == 1:
+        handle_quotation_submit(doc)
@@ -4,6 +4,15 @@
 import frappe
 from frappe.model.document import Document
 
+from razorpay_frappe.api_gateway import ApiLane, api_lane
+from razorpay_frappe.bulk_fetch import fetch_entities
+from razorpay_frappe.entity_cache import (
+	RazorpayEntity,
+	fetch_order,
+	fetch_order_payments,
+	fetch_payment,
+	invalidate_entity,
+)
 from razorpay_frappe.utils import (
 	RazorpayPaymentWebhookEvents as RazorpayWebhookEvents,
 )
@@ -47,6 +56,7 @@ class RazorpayOrder(Document):
 	# end: auto-generated types
 
 	@staticmethod
+	@api_lane(ApiLane.Interactive)
 	def initiate(
 		amount: int,
 		currency: str = "INR",
@@ -124,8 +134,7 @@ class RazorpayOrder(Document):
 			return
 
 		if payment_entity is None:
-			client = get_razorpay_client()
-			payment_entity = client.payment.fetch(self.payment_id)
+			payment_entity = fetch_payment(self.payment_id)
 
 		self.payment_id = payment_entity.get("id")
 		self.fee = convert_from_razorpay_money(payment_entity.get("fee", 0))
@@ -144,6 +153,8 @@ class RazorpayOrder(Document):
 		client = get_razorpay_client()
 		refund_amount = int(get_in_razorpay_money(self.amount))
 		refund = client.payment.refund(self.payment_id, refund_amount)
+		invalidate_entity(RazorpayEntity.Payment, self.payment_id)
+		invalidate_entity(RazorpayEntity.Order, self.order_id)
 
 		self.refund_id = refund["id"]
 		if refund["status"] == "processed":
@@ -157,16 +168,24 @@ class RazorpayOrder(Document):
 
 	@frappe.whitelist()
 	def sync_status(self):
-		client = get_razorpay_client()
-		order = client.order.fetch(self.order_id)
-		payments = client.order.payments(self.order_id).get("items", [])
+		order = fetch_order(self.order_id, refresh=True)
+		payments = None
+		if order["status"] == "paid":
+			payments = fetch_order_payments(self.order_id, refresh=True)
+		self.apply_order_status(order, payments)
 
+	def apply_order_status(self, order: dict, payments: dict | None = None):
+		"""Update status and payment details from the fetched Razorpay order
+		and, for a paid one, its payments."""
 		if order["status"] == "paid":
-			frappe.errprint(payments)
-			if payments[0]["status"] == "captured" and self.status != "Paid":
+			latest_payment = ((payments or {}).get("items") or [{}])[0]
+			if (
+				latest_payment.get("status") == "captured"
+				and self.status != "Paid"
+			):
 				self.status = "Paid"
-				self.payment_id = payments[0]["id"]
-			elif payments[0]["status"] == "refunded":
+				self.payment_id = latest_payment["id"]
+			elif latest_payment.get("status") == "refunded":
 				self.status = "Refunded"
 		elif order["status"] == "created" and self.status != "Pending":
 			self.status = "Pending"
@@ -203,3 +222,55 @@ class RazorpayOrder(Document):
 	@property
 	def is_refunded(self):
 		return self.status == "Refunded"
+
+
+@frappe.whitelist()
+@api_lane(ApiLane.Background)
+def reconcile_pending_orders() -> dict:
+	"""Sync every Pending order with Razorpay.
+
+	Orders are fetched concurrently, then the payments of those Razorpay
+	reports as paid, also concurrently.
+	"""
+	frappe.only_for("System Manager")
+
+	pending_orders = frappe.get_all(
+		"Razorpay Order",
+		filters={"status": "Pending"},
+		fields=["name", "order_id"],
+	)
+	names_by_order_id = {order.order_id: order.name for order in pending_orders}
+
+	orders, errors = fetch_entities(
+		RazorpayEntity.Order, names_by_order_id, refresh=True
+	)
+	payments, payment_errors = fetch_entities(
+		RazorpayEntity.OrderPayments,
+		[
+			order_id
+			for order_id, order in orders.items()
+			if order["status"] == "paid"
+		],
+		refresh=True,
+	)
+	errors.update(payment_errors)
+
+	report = {"total": len(pending_orders), "updated": 0, "failed": 0}
+	for order_id, name in names_by_order_id.items():
+		try:
+			if order_id in errors:
+				raise errors[order_id]
+
+			doc: RazorpayOrder = frappe.get_doc("Razorpay Order", name)
+			doc.apply_order_status(orders[order_id], payments.get(order_id))
+			if doc.status != "Pending":
+				report["updated"] += 1
+		except Exception:
+			report["failed"] += 1
+			frappe.log_error(
+				title=f"Razorpay Order Reconciliation Failed: {order_id}",
+				reference_doctype="Razorpay Order",
+				reference_name=name,
+			)
+
+	return report
@@ -1,16 +1,20 @@
 # Copyright (c) 2024, Build With Hussain and Contributors
 # See license.txt
 
+from unittest.mock import MagicMock, patch
+
 import frappe
 from frappe.tests.test_api import FrappeAPITestCase
 
 from razorpay_frappe.razorpay_integration.doctype.razorpay_order.razorpay_order import (
 	RazorpayOrder,
+	reconcile_pending_orders,
 )
 from razorpay_frappe.rzp_renderer import Endpoints, RazorpayEndpointHandler
 from razorpay_frappe.utils import (
 	RazorpayPaymentWebhookEvents as RazorpayWebhookEvents,
 )
+from razorpay_frappe.webhook_processor import resolve_order_name
 
 
 class TestRazorpayOrder(FrappeAPITestCase):
@@ -125,6 +129,72 @@ class TestRazorpayOrder(FrappeAPITestCase):
 		self.assertEqual(status, "Refunded")
 		self.assertIsNotNone(refund_id)
 
+	def test_order_resolution_is_cached(self):
+		order_id = f"order_{frappe.generate_hash(length=14)}"
+		order_doc = frappe.get_doc(
+			doctype="Razorpay Order",
+			order_id=order_id,
+			amount=200,
+			currency="INR",
+			status="Pending",
+		).insert()
+
+		self.assertEqual(resolve_order_name(order_id), order_doc.name)
+
+		with patch.object(frappe.db, "get_value") as get_value:
+			self.assertEqual(resolve_order_name(order_id), order_doc.name)
+			get_value.assert_not_called()
+
+		# unknown orders are not cached
+		self.assertIsNone(resolve_order_name("order_does_not_exist"))
+
+	@patch("razorpay_frappe.bulk_fetch.get_razorpay_client")
+	def test_reconciliation_fetches_payments_of_paid_orders(
+		self, get_razorpay_client
+	):
+		captured, without_payments, unpaid = (
+			create_pending_order() for _ in range(3)
+		)
+		client = MagicMock()
+		client.order.fetch.side_effect = lambda order_id: {
+			"id": order_id,
+			"status": "created" if order_id == unpaid.order_id else "paid",
+		}
+		client.order.payments.side_effect = lambda order_id: {
+			"items": [{"id": "pay_29QQoUBi66xm2f", "status": "captured"}]
+			if order_id == captured.order_id
+			else []
+		}
+		get_razorpay_client.return_value = client
+
+		reconcile_pending_orders()
+
+		paid_order_ids = {
+			call.args[0] for call in client.order.payments.call_args_list
+		}
+		self.assertIn(captured.order_id, paid_order_ids)
+		self.assertNotIn(unpaid.order_id, paid_order_ids)
+		captured.reload()
+		self.assertEqual(captured.status, "Paid")
+		self.assertEqual(captured.payment_id, "pay_29QQoUBi66xm2f")
+		# paid on Razorpay, but nothing to apply yet
+		self.assertEqual(
+			frappe.db.get_value(
+				"Razorpay Order", without_payments.name, "status"
+			),
+			"Pending",
+		)
+
+
+def create_pending_order() -> RazorpayOrder:
+	return frappe.get_doc(
+		doctype="Razorpay Order",
+		order_id=f"order_{frappe.generate_hash(length=14)}",
+		amount=200,
+		currency="INR",
+		status="Pending",
+	).insert()
+
 
 def get_test_webhook_payload(
 	order_id: str, event: str = "payment.captured"
@@ -14,7 +14,7 @@ frappe.ui.form.on("Razorpay Payment Link", {
 			frm.add_custom_button("Fetch Status", () => {
 				frm.call("fetch_latest_status").then(() => {
 					frappe.show_alert("Latest status updated");
-					frm.refresh();
+					frm.reload_doc();
 				});
 			});
 		}
@@ -5,6 +5,8 @@ import frappe
 from frappe.model.document import Document
 from frappe.utils.data import get_timestamp
 
+from razorpay_frappe.entity_cache import fetch_payment_link
+from razorpay_frappe.payment_link_sync import has_changed, write_changed_links
 from razorpay_frappe.utils import get_in_razorpay_money, get_razorpay_client
 
 
@@ -100,9 +102,10 @@ class RazorpayPaymentLink(Document):
 
 	@frappe.whitelist()
 	def fetch_latest_status(self):
-		client = get_razorpay_client()
-		payment_link = client.payment_link.fetch(self.id)
-		link_status = frappe.unscrub(payment_link["status"])
-		if link_status != self.status:
-			self.status = link_status
-			self.save()
+		payment_link = fetch_payment_link(self.id, refresh=True)
+		if has_changed(self, payment_link):
+			write_changed_links([(self, payment_link)])
+
+
+def on_doctype_update():
+	frappe.db.add_index("Razorpay Payment Link", ["status", "expire_by"])
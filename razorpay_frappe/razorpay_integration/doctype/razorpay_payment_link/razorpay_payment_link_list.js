@@ -0,0 +1,45 @@
+// Copyright (c) 2024, Build With Hussain and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Razorpay Payment Link"] = {
+	onload(listview) {
+		const sync = (full_resync) =>
+			frappe
+				.xcall("razorpay_frappe.webhook_handler.sync_all_payment_links", { full_resync })
+				.then((result) => {
+					if (result.job_id) {
+						frappe.show_alert(__("Payment link sync started"));
+					} else if (full_resync) {
+						frappe.show_alert(
+							__("A payment link sync is already queued, the full resync will follow it")
+						);
+					} else {
+						frappe.show_alert(__("A payment link sync is already running"));
+					}
+				});
+
+		listview.page.add_menu_item(__("Sync with Razorpay"), () => sync(0));
+		listview.page.add_menu_item(__("Full Resync with Razorpay"), () => {
+			frappe.confirm(
+				__("Go through every payment link on Razorpay instead of the recent ones?"),
+				() => sync(1)
+			);
+		});
+
+		frappe.realtime.on("razorpay_payment_link_sync", (progress) => {
+			if (progress.already_running) {
+				frappe.show_alert(
+					progress.full
+						? __("A payment link sync is already running, the full resync will follow it")
+						: __("A payment link sync is already running")
+				);
+				return;
+			}
+			const message = __("Synced {0} payment links: {1} updated", [progress.listed, progress.updated]);
+			frappe.show_alert({ message, indicator: "green" });
+			if (progress.done) {
+				listview.refresh();
+			}
+		});
+	},
+};
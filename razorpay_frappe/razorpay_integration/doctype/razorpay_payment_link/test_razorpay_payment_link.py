@@ -1,9 +1,586 @@
 # Copyright (c) 2024, Build With Hussain and Contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import MagicMock, patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from razorpay_frappe.bulk_fetch import fetch_entities
+from razorpay_frappe.entity_cache import (
+	PENDING_TTL,
+	RazorpayEntity,
+	fetch_payment_link,
+	get_cache_key,
+	get_flight_result_key,
+	get_ttl,
+	invalidate_webhook_entities,
+)
+from razorpay_frappe.payment_link_expiry import expire_payment_links
+from razorpay_frappe.payment_link_polling import (
+	BASE_POLL_INTERVAL,
+	MAX_POLL_INTERVAL,
+	get_next_poll_state,
+	get_poll_score,
+)
+from razorpay_frappe.payment_link_sync import (
+	SYNC_CHECKPOINT_KEY,
+	get_sync_checkpoint,
+	get_sync_watermark,
+	pop_full_sync_requests,
+	set_sync_watermark,
+	sync_payment_links,
+)
+from razorpay_frappe.webhook_handler import (
+	get_payment_details,
+	get_payment_link_summaries,
+	handle_payment_link_webhook,
+	upsert_payment_details,
+)
+
 
 class TestRazorpayPaymentLink(FrappeTestCase):
-	pass
+	def setUp(self):
+		self.payment_link = create_test_payment_link()
+
+	@patch("razorpay_frappe.webhook_handler.send_payment_notification")
+	@patch("razorpay_frappe.entity_cache.get_razorpay_client")
+	def test_paid_webhook_uses_payload_entities(
+		self, get_razorpay_client, send_payment_notification
+	):
+		payment_id = f"pay_{frappe.generate_hash(length=14)}"
+		handle_payment_link_webhook(
+			"payment_link.paid",
+			get_paid_webhook_payload(self.payment_link.id, payment_id),
+		)
+
+		get_razorpay_client.assert_not_called()
+
+		status, amount_paid = frappe.db.get_value(
+			"Razorpay Payment Link",
+			self.payment_link.name,
+			["status", "amount_paid"],
+		)
+		self.assertEqual(status, "Paid")
+		self.assertEqual(amount_paid, 500)
+
+		detail = frappe.db.get_value(
+			"Razorpay Payment Detail",
+			{"payment_id": payment_id},
+			["amount", "status", "method", "payment_link"],
+			as_dict=True,
+		)
+		self.assertEqual(detail.amount, 500)
+		self.assertEqual(detail.status, "captured")
+		self.assertEqual(detail.method, "upi")
+		self.assertEqual(detail.payment_link, self.payment_link.name)
+
+	@patch("razorpay_frappe.entity_cache.get_razorpay_client")
+	def test_fetched_payment_link_is_cached_until_webhook(
+		self, get_razorpay_client
+	):
+		client = MagicMock()
+		client.payment_link.fetch.return_value = {
+			"id": self.payment_link.id,
+			"status": "created",
+		}
+		get_razorpay_client.return_value = client
+
+		fetch_payment_link(self.payment_link.id)
+		fetch_payment_link(self.payment_link.id)
+		self.assertEqual(client.payment_link.fetch.call_count, 1)
+
+		invalidate_webhook_entities(
+			{
+				"event": "payment_link.paid",
+				"payload": get_paid_webhook_payload(
+					self.payment_link.id, "pay_cache_test"
+				),
+			}
+		)
+		fetch_payment_link(self.payment_link.id)
+		self.assertEqual(client.payment_link.fetch.call_count, 2)
+
+	@patch("razorpay_frappe.entity_cache.get_razorpay_client")
+	def test_concurrent_fetches_share_one_upstream_call(
+		self, get_razorpay_client
+	):
+		key = get_cache_key(RazorpayEntity.PaymentLink, self.payment_link.id)
+		cache = frappe.cache()
+		lock_key = cache.make_key(f"razorpay_flight:{key}")
+		self.addCleanup(cache.delete, lock_key)
+
+		# another worker is fetching the link and has just finished
+		cache.set(lock_key, "leader", ex=5)
+		cache.set_value(
+			get_flight_result_key(key, "leader"),
+			{"value": {"id": self.payment_link.id, "status": "paid"}},
+			expires_in_sec=5,
+		)
+
+		value = fetch_payment_link(self.payment_link.id, refresh=True)
+		self.assertEqual(value["status"], "paid")
+		get_razorpay_client.assert_not_called()
+
+	@patch("razorpay_frappe.entity_cache.FLIGHT_MAX_WAIT", 0.1)
+	@patch("razorpay_frappe.entity_cache.get_razorpay_client")
+	def test_stuck_fetch_does_not_block_waiters(self, get_razorpay_client):
+		client = MagicMock()
+		client.payment_link.fetch.return_value = {
+			"id": self.payment_link.id,
+			"status": "created",
+		}
+		get_razorpay_client.return_value = client
+
+		key = get_cache_key(RazorpayEntity.PaymentLink, self.payment_link.id)
+		cache = frappe.cache()
+		lock_key = cache.make_key(f"razorpay_flight:{key}")
+		self.addCleanup(cache.delete, lock_key)
+		cache.set(lock_key, "stuck", ex=5)
+
+		value = fetch_payment_link(self.payment_link.id, refresh=True)
+		self.assertEqual(value["status"], "created")
+		self.assertEqual(client.payment_link.fetch.call_count, 1)
+
+	@patch("razorpay_frappe.bulk_fetch.get_razorpay_client")
+	def test_bulk_fetch_returns_every_link(self, get_razorpay_client):
+		link_ids = [
+			f"plink_{frappe.generate_hash(length=14)}" for _ in range(5)
+		]
+
+		def fetch(link_id):
+			if link_id == link_ids[0]:
+				raise Exception("not found")
+			return {"id": link_id, "status": "paid"}
+
+		client = MagicMock()
+		client.payment_link.fetch.side_effect = fetch
+		get_razorpay_client.return_value = client
+
+		values, errors = fetch_entities(
+			RazorpayEntity.PaymentLink, link_ids + link_ids, concurrency=3
+		)
+		self.assertEqual(set(values), set(link_ids[1:]))
+		self.assertEqual(list(errors), [link_ids[0]])
+		self.assertEqual(client.payment_link.fetch.call_count, 5)
+
+		# later single fetches are served from the cache
+		self.assertEqual(
+			fetch_payment_link(link_ids[1], client)["status"], "paid"
+		)
+		self.assertEqual(client.payment_link.fetch.call_count, 5)
+
+	@patch("razorpay_frappe.payment_link_sync.get_razorpay_client")
+	def test_incremental_sync_updates_changed_links(self, get_razorpay_client):
+		open_link = create_test_payment_link()
+		frappe.cache().delete_value(SYNC_CHECKPOINT_KEY)
+		set_sync_watermark(1_700_000_000)
+		client = MagicMock()
+		client.payment_link.all.return_value = {
+			"payment_links": [
+				{"id": "plink_not_created_here", "status": "paid"},
+				{
+					"id": self.payment_link.id,
+					"status": "paid",
+					"amount_paid": 50000,
+					"created_at": 1_700_000_300,
+				},
+				{
+					"id": open_link.id,
+					"status": "created",
+					"amount_paid": 0,
+					"created_at": 1_700_000_200,
+				},
+			]
+		}
+		get_razorpay_client.return_value = client
+
+		counts = sync_payment_links()
+
+		client.payment_link.all.assert_called_once_with(
+			{"from": 1_700_000_000, "count": 100, "skip": 0}
+		)
+		self.assertEqual(counts, {"listed": 3, "updated": 1})
+		self.assertEqual(
+			frappe.db.get_value(
+				"Razorpay Payment Link", self.payment_link.name, "status"
+			),
+			"Paid",
+		)
+		# the next sync starts at the oldest link that can still change
+		self.assertEqual(get_sync_watermark(), 1_700_000_200)
+
+		sync_payment_links(full=True)
+		self.assertEqual(client.payment_link.all.call_args.args[0]["from"], 0)
+
+	@patch("razorpay_frappe.payment_link_sync.get_razorpay_client")
+	def test_sync_writes_only_changed_links(self, get_razorpay_client):
+		frappe.cache().delete_value(SYNC_CHECKPOINT_KEY)
+		unchanged = create_test_payment_link()
+		partially_paid = create_test_payment_link()
+		client = MagicMock()
+		client.payment_link.all.return_value = {
+			"payment_links": [
+				{"id": unchanged.id, "status": "created", "amount_paid": 0},
+				{
+					"id": partially_paid.id,
+					"status": "partially_paid",
+					"amount_paid": 20000,
+					"payment_id": "pay_29QQoUBi66xm2f",
+				},
+			]
+		}
+		get_razorpay_client.return_value = client
+
+		with patch.object(
+			frappe.db, "bulk_update", wraps=frappe.db.bulk_update
+		) as bulk_update:
+			counts = sync_payment_links(full=True)
+
+		self.assertEqual(counts["updated"], 1)
+		bulk_update.assert_called_once()
+		self.assertEqual(
+			list(bulk_update.call_args.args[1]), [partially_paid.name]
+		)
+		row = frappe.db.get_value(
+			"Razorpay Payment Link",
+			partially_paid.name,
+			[
+				"status",
+				"amount_paid",
+				"remaining_amount",
+				"razorpay_payment_status",
+			],
+			as_dict=True,
+		)
+		self.assertEqual(row.status, "Partially Paid")
+		self.assertEqual(row.amount_paid, 200)
+		self.assertEqual(row.remaining_amount, 300)
+		self.assertEqual(row.razorpay_payment_status, "Partially Paid")
+
+	@patch("razorpay_frappe.payment_link_sync.PAGE_SIZE", 2)
+	@patch("razorpay_frappe.payment_link_sync.get_razorpay_client")
+	def test_interrupted_sync_resumes_from_checkpoint(
+		self, get_razorpay_client
+	):
+		frappe.cache().delete_value(SYNC_CHECKPOINT_KEY)
+		links = [
+			{
+				"id": f"plink_{frappe.generate_hash(length=14)}",
+				"status": "expired",
+				"created_at": 1_700_000_000 + i,
+			}
+			for i in range(3)
+		]
+		client = MagicMock()
+		client.payment_link.all.side_effect = [
+			{"payment_links": links[:2]},
+			Exception("worker killed"),
+			{"payment_links": links[2:]},
+		]
+		get_razorpay_client.return_value = client
+
+		with self.assertRaises(Exception):
+			sync_payment_links(full=True)
+		self.assertEqual(get_sync_checkpoint()["skip"], 2)
+
+		counts = sync_payment_links()
+		self.assertEqual(
+			client.payment_link.all.call_args.args[0],
+			{"from": 0, "count": 2, "skip": 2},
+		)
+		self.assertEqual(counts["listed"], 3)
+		self.assertIsNone(get_sync_checkpoint())
+
+	@patch("frappe.publish_realtime")
+	@patch("razorpay_frappe.payment_link_sync.get_razorpay_client")
+	def test_full_sync_requested_during_a_sync_runs_after_it(
+		self, get_razorpay_client, publish_realtime
+	):
+		frappe.cache().delete_value(SYNC_CHECKPOINT_KEY)
+		pop_full_sync_requests()
+		set_sync_watermark(1_700_000_000)
+		requested = []
+
+		def list_links(params):
+			if not requested:
+				requested.append(
+					sync_payment_links(full=True, user="Administrator")
+				)
+			return {"payment_links": []}
+
+		client = MagicMock()
+		client.payment_link.all.side_effect = list_links
+		get_razorpay_client.return_value = client
+
+		sync_payment_links()
+
+		# the requested sync only reported the running one...
+		self.assertEqual(requested, [None])
+		self.assertEqual(
+			[
+				call.args[0]["from"]
+				for call in client.payment_link.all.call_args_list
+			],
+			[1_700_000_000, 0],
+		)
+		# ...which then ran it, with progress for its requester
+		first, *_, last = (
+			call.args[1]
+			for call in publish_realtime.call_args_list
+			if call.kwargs["user"] == "Administrator"
+		)
+		self.assertTrue(first["already_running"])
+		self.assertTrue(last["full"] and last["done"])
+		self.assertFalse(last["already_running"])
+		self.assertEqual(pop_full_sync_requests(), [])
+
+	def test_links_past_their_expiry_day_expire_locally(self):
+		today = frappe.utils.getdate()
+		past = create_test_payment_link(
+			expire_by=frappe.utils.add_days(today, -1)
+		)
+		expiring_today = create_test_payment_link(expire_by=today)
+
+		self.assertGreaterEqual(expire_payment_links(), 1)
+		self.assertEqual(
+			frappe.db.get_value("Razorpay Payment Link", past.name, "status"),
+			"Expired",
+		)
+		self.assertEqual(
+			frappe.db.get_value(
+				"Razorpay Payment Link", expiring_today.name, "status"
+			),
+			"Created",
+		)
+
+	def test_poller_favours_links_about_to_change(self):
+		now = frappe.utils.now_datetime()
+		expiring = frappe._dict(
+			expire_by=frappe.utils.add_days(now, 1),
+			modified=frappe.utils.add_days(now, -10),
+		)
+		idle = frappe._dict(
+			expire_by=frappe.utils.add_days(now, 25),
+			modified=frappe.utils.add_days(now, -10),
+		)
+		self.assertGreater(
+			get_poll_score(expiring, now, None), get_poll_score(idle, now, None)
+		)
+		# webhooks already arrive for it
+		self.assertLess(
+			get_poll_score(expiring, now, frappe.utils.add_days(now, -10)),
+			get_poll_score(expiring, now, None),
+		)
+
+	def test_unchanged_links_are_polled_less_often(self):
+		state = get_next_poll_state(None, changed=False, now=0)
+		self.assertEqual(state["next_poll_at"], 2 * BASE_POLL_INTERVAL)
+		state = get_next_poll_state(state, changed=False, now=0)
+		self.assertEqual(state["next_poll_at"], 4 * BASE_POLL_INTERVAL)
+
+		state = get_next_poll_state({"unchanged": 30}, changed=False, now=0)
+		self.assertEqual(state["next_poll_at"], MAX_POLL_INTERVAL)
+		state = get_next_poll_state(state, changed=True, now=0)
+		self.assertEqual(
+			state, {"unchanged": 0, "next_poll_at": BASE_POLL_INTERVAL}
+		)
+
+	def test_payment_details_are_upserted_in_bulk(self):
+		payment_ids = [
+			f"pay_{frappe.generate_hash(length=14)}" for _ in range(3)
+		]
+		payments = [
+			{
+				"payment_id": payment_id,
+				"amount": 10000,
+				"status": "captured",
+				"method": "upi",
+				"created_at": "2025-01-31 12:00:00",
+			}
+			for payment_id in payment_ids
+		]
+		upsert_payment_details(
+			get_payment_details(self.payment_link, {"payments": payments[:2]})
+		)
+		modified = frappe.db.get_value(
+			"Razorpay Payment Detail", payment_ids[0], "modified"
+		)
+
+		bulk_insert = frappe.db.bulk_insert
+
+		def insert_after_concurrent_webhook(*args, **kwargs):
+			# another webhook stores the third payment first
+			frappe.get_doc(
+				{
+					"doctype": "Razorpay Payment Detail",
+					"payment_id": payment_ids[2],
+					"amount": 100,
+					"status": "authorized",
+					"payment_link": self.payment_link.name,
+				}
+			).insert()
+			return bulk_insert(*args, **kwargs)
+
+		payments[1]["status"] = "refunded"
+		with (
+			patch.object(
+				frappe.db,
+				"bulk_insert",
+				side_effect=insert_after_concurrent_webhook,
+			),
+			patch.object(
+				frappe.db, "bulk_update", wraps=frappe.db.bulk_update
+			) as bulk_update,
+		):
+			upsert_payment_details(
+				get_payment_details(self.payment_link, {"payments": payments})
+			)
+
+		bulk_update.assert_called_once()
+		self.assertEqual(
+			sorted(bulk_update.call_args.args[1]), sorted(payment_ids[1:])
+		)
+		statuses = dict(
+			frappe.get_all(
+				"Razorpay Payment Detail",
+				filters={"payment_id": ("in", payment_ids)},
+				fields=["payment_id", "status"],
+				as_list=True,
+			)
+		)
+		self.assertEqual(
+			[statuses[payment_id] for payment_id in payment_ids],
+			["captured", "refunded", "captured"],
+		)
+		self.assertEqual(
+			frappe.db.get_value(
+				"Razorpay Payment Detail", payment_ids[0], "modified"
+			),
+			modified,
+		)
+
+	def test_payment_link_summaries_are_aggregated_per_link(self):
+		unpaid = create_test_payment_link()
+		upsert_payment_details(
+			get_payment_details(
+				self.payment_link,
+				{
+					"payments": [
+						{
+							"payment_id": f"pay_{frappe.generate_hash(length=14)}",
+							"amount": amount,
+							"status": status,
+							"method": "upi",
+							"created_at": "2025-01-31 12:00:00",
+						}
+						for amount, status in (
+							(10000, "captured"),
+							(15000, "captured"),
+							(20000, "failed"),
+						)
+					]
+				},
+			)
+		)
+
+		response = get_payment_link_summaries(
+			[self.payment_link.name, unpaid.name, "does-not-exist"]
+		)
+
+		self.assertTrue(response["success"])
+		summaries = response["summaries"]
+		self.assertEqual(set(summaries), {self.payment_link.name, unpaid.name})
+		summary = summaries[self.payment_link.name]
+		self.assertEqual(summary.total_payments, 3)
+		self.assertEqual(summary.captured_payments, 2)
+		self.assertEqual(summary.total_paid, 250)
+		self.assertEqual(summary.remaining_amount, 250)
+		summary = summaries[unpaid.name]
+		self.assertEqual(summary.total_payments, 0)
+		self.assertEqual(summary.total_paid, 0)
+		self.assertEqual(summary.remaining_amount, 500)
+
+	def test_payment_link_summaries_respect_permissions(self):
+		other = create_test_payment_link()
+		user = frappe.get_doc(
+			{
+				"doctype": "User",
+				"email": f"rzp-{frappe.generate_hash(length=8)}@example.com",
+				"first_name": "Razorpay",
+				"send_welcome_email": 0,
+				"roles": [{"role": "System Manager"}],
+			}
+		).insert()
+		frappe.get_doc(
+			{
+				"doctype": "User Permission",
+				"user": user.name,
+				"allow": "Razorpay Payment Link",
+				"for_value": self.payment_link.name,
+			}
+		).insert()
+		self.addCleanup(frappe.set_user, "Administrator")
+
+		frappe.set_user(user.name)
+		response = get_payment_link_summaries(
+			[self.payment_link.name, other.name]
+		)
+		self.assertEqual(set(response["summaries"]), {self.payment_link.name})
+
+		frappe.set_user("Guest")
+		with self.assertRaises(frappe.PermissionError):
+			get_payment_link_summaries([self.payment_link.name])
+
+	def test_terminal_entities_are_cached_longer(self):
+		self.assertEqual(
+			get_ttl(RazorpayEntity.PaymentLink, {"status": "created"}),
+			PENDING_TTL,
+		)
+		self.assertGreater(
+			get_ttl(RazorpayEntity.PaymentLink, {"status": "paid"}), PENDING_TTL
+		)
+		self.assertGreater(
+			get_ttl(RazorpayEntity.Payment, {"status": "refunded"}), PENDING_TTL
+		)
+
+
+def create_test_payment_link(**kwargs):
+	payment_link = frappe.get_doc(
+		{
+			"doctype": "Razorpay Payment Link",
+			"id": f"plink_{frappe.generate_hash(length=14)}",
+			"short_url": "https://rzp.io/i/test",
+			"amount": 500,
+			"currency": "INR",
+			**kwargs,
+		}
+	)
+	payment_link.flags.link_already_created = True
+	return payment_link.insert()
+
+
+def get_paid_webhook_payload(payment_link_id: str, payment_id: str) -> dict:
+	return {
+		"payment_link": {
+			"entity": {
+				"id": payment_link_id,
+				"entity": "payment_link",
+				"amount": 50000,
+				"amount_paid": 50000,
+				"currency": "INR",
+				"status": "paid",
+			}
+		},
+		"payment": {
+			"entity": {
+				"id": payment_id,
+				"entity": "payment",
+				"amount": 50000,
+				"currency": "INR",
+				"status": "captured",
+				"method": "upi",
+				"created_at": 1715397821,
+			}
+		},
+	}
@@ -11,5 +11,34 @@ frappe.ui.form.on("Razorpay Settings", {
 				const webhookEndpoint = `${baseUrl}/razorpay/webhook-handler`;
 				frappe.utils.copy_to_clipboard(webhookEndpoint, __("Webhook endpoint copied"));
 			});
+
+		frm.trigger("show_api_circuit");
+	},
+
+	show_api_circuit(frm) {
+		if (!frappe.user.has_role("System Manager")) return;
+
+		frappe.xcall("razorpay_frappe.api_circuit.get_api_circuit_status").then((status) => {
+			if (status.state === "closed") return;
+
+			const message =
+				status.state === "open"
+					? __(
+							"Razorpay API circuit is open after {0} failed requests: calls fail fast for another {1} seconds.",
+							[status.failures, Math.ceil(status.open_for)]
+					  )
+					: __("Razorpay API circuit is half open: the next request probes whether Razorpay has recovered.");
+			const deferred = status.deferred_calls
+				? " " + __("{0} deferred calls are waiting.", [status.deferred_calls])
+				: "";
+			frm.dashboard.set_headline_alert(message + deferred, status.state === "open" ? "red" : "orange");
+
+			frm.add_custom_button(__("Reset API Circuit"), () => {
+				frappe.xcall("razorpay_frappe.api_circuit.reset_api_circuit").then(() => {
+					frappe.show_alert({ message: __("Razorpay API circuit closed"), indicator: "green" });
+					frm.reload_doc();
+				});
+			});
+		});
 	},
 });
@@ -1,9 +1,11 @@
 # Copyright (c) 2024, Build With Hussain and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+SETTINGS_VERSION_KEY = "razorpay_settings_version"
+
 
 class RazorpaySettings(Document):
 	# begin: auto-generated types
@@ -15,11 +17,36 @@ class RazorpaySettings(Document):
 		from frappe.types import DF
 
 		allow_guest_checkout: DF.Check
+		api_interactive_reserve: DF.Percent
+		api_pool_size: DF.Int
+		api_requests_per_second: DF.Float
+		circuit_cooldown: DF.Int
+		circuit_failure_threshold: DF.Int
 		key_id: DF.Data | None
 		key_secret: DF.Password | None
+		payment_link_poll_budget: DF.Int
+		payment_link_sync_watermark: DF.Int
+		process_webhooks_in_background: DF.Check
+		webhook_log_retention_days: DF.Int
+		webhook_max_attempts: DF.Int
+		webhook_partitions: DF.Int
+		webhook_payload_storage: DF.Literal["Pretty", "Compact", "Compressed"]
+		webhook_queue: DF.Data | None
+		webhook_retry_base_delay: DF.Int
 		webhook_secret: DF.Password | None
 	# end: auto-generated types
 
-	pass
+	def on_update(self):
+		bump_settings_version()
+
+
+def get_settings_version() -> str | None:
+	"""Token that changes whenever Razorpay Settings is saved. Process-local
+	caches derived from the settings compare against it to stay fresh."""
+	return frappe.cache().get_value(SETTINGS_VERSION_KEY)
 
 
+def bump_settings_version():
+	frappe.cache().set_value(
+		SETTINGS_VERSION_KEY, frappe.generate_hash(length=10)
+	)
@@ -1,9 +1,279 @@
 # Copyright (c) 2024, Build With Hussain and Contributors
 # See license.txt
 
-# import frappe
+import hashlib
+import hmac
+import json
+import os
+import time
+from unittest.mock import patch
+
+import frappe
+import requests
 from frappe.tests.utils import FrappeTestCase
 
+from razorpay_frappe.api_circuit import (
+	DEFERRED_CALLS_KEY,
+	CircuitState,
+	RazorpayCircuitOpenError,
+	check_circuit,
+	defer_until_api_available,
+	get_circuit_status,
+	record_failure,
+	record_success,
+	run_deferred_api_calls,
+)
+from razorpay_frappe.api_gateway import (
+	LANE_MAX_WAIT,
+	ApiLane,
+	RazorpayRateLimitError,
+	acquire_api_token,
+	get_backoff,
+)
+from razorpay_frappe.api_telemetry import (
+	get_api_calls,
+	get_endpoint,
+	record_api_call,
+)
+from razorpay_frappe.fake_razorpay import running as run_fake_razorpay
+from razorpay_frappe.quotation_events import handle_quotation_submit
+from razorpay_frappe.utils import (
+	get_razorpay_client,
+	get_webhook_secret,
+	is_valid_webhook_signature,
+)
+
 
 class TestRazorpaySettings(FrappeTestCase):
-	pass
+	def test_webhook_signature_validation(self):
+		body = b'{"event": "payment.captured"}'
+		signature = hmac.new(b"secret", body, hashlib.sha256).hexdigest()
+
+		self.assertTrue(is_valid_webhook_signature(body, signature, "secret"))
+		self.assertTrue(
+			is_valid_webhook_signature(body.decode(), signature, "secret")
+		)
+		self.assertFalse(is_valid_webhook_signature(body, signature, "other"))
+		self.assertFalse(is_valid_webhook_signature(body, None, "secret"))
+
+	def test_webhook_secret_is_cached_until_settings_are_saved(self):
+		set_webhook_secret(self, "first-secret")
+		self.assertEqual(get_webhook_secret(), "first-secret")
+
+		with patch(
+			"razorpay_frappe.utils.get_decrypted_password"
+		) as get_decrypted_password:
+			self.assertEqual(get_webhook_secret(), "first-secret")
+			get_decrypted_password.assert_not_called()
+
+		set_webhook_secret(self, "second-secret")
+		self.assertEqual(get_webhook_secret(), "second-secret")
+
+	@patch.dict(os.environ, {"CI": ""})
+	def test_razorpay_client_is_reused_until_settings_are_saved(self):
+		update_razorpay_settings(
+			self,
+			{
+				"sandbox_mode": 0,
+				"key_id": "rzp_test_pooled",
+				"key_secret": "first-key-secret",
+				"api_pool_size": 4,
+			},
+		)
+
+		client = get_razorpay_client()
+		self.assertIs(get_razorpay_client(), client)
+		self.assertEqual(client.auth, ("rzp_test_pooled", "first-key-secret"))
+		self.assertEqual(
+			client.session.get_adapter(
+				"https://api.razorpay.com"
+			)._pool_maxsize,
+			4,
+		)
+
+		update_razorpay_settings(self, {"key_secret": "second-key-secret"})
+
+		refreshed = get_razorpay_client()
+		self.assertIsNot(refreshed, client)
+		self.assertEqual(
+			refreshed.auth, ("rzp_test_pooled", "second-key-secret")
+		)
+
+	@patch.dict(LANE_MAX_WAIT, {ApiLane.Background: 0})
+	def test_background_calls_leave_a_reserve_for_interactive_calls(self):
+		# bucket of 2 tokens, half of it reserved for interactive calls
+		update_razorpay_settings(
+			self, {"api_requests_per_second": 1, "api_interactive_reserve": 50}
+		)
+		account = f"rzp_test_{frappe.generate_hash(length=8)}"
+
+		acquire_api_token(account, ApiLane.Background)
+		with self.assertRaises(RazorpayRateLimitError):
+			acquire_api_token(account, ApiLane.Background)
+
+		acquire_api_token(account, ApiLane.Interactive)
+
+	def test_rate_limit_backoff_honours_retry_after(self):
+		response = requests.Response()
+		response.headers["Retry-After"] = "7"
+		self.assertEqual(get_backoff(response, attempt=0), 7)
+
+		del response.headers["Retry-After"]
+		self.assertTrue(2 <= get_backoff(response, attempt=2) <= 4)
+
+	@patch.dict(os.environ, {"CI": ""})
+	def test_client_can_use_the_local_fake_api(self):
+		with (
+			run_fake_razorpay() as (api, base_url),
+			patch.dict(frappe.conf, {"razorpay_api_base_url": base_url}),
+		):
+			client = get_razorpay_client()
+			order = client.order.create({"amount": 50000, "currency": "INR"})
+			self.assertEqual(
+				client.order.fetch(order["id"])["status"], "created"
+			)
+
+			api.update_config(rate_limit=1)
+			client.order.fetch(order["id"])
+			# throttled by the fake API, retried after its Retry-After
+			self.assertEqual(client.order.fetch(order["id"])["id"], order["id"])
+
+		self.assertEqual(api.stats["create_order"], 1)
+		self.assertEqual(api.stats["throttled"], 1)
+
+	def test_circuit_opens_after_consecutive_failures(self):
+		update_razorpay_settings(
+			self, {"circuit_failure_threshold": 2, "circuit_cooldown": 1}
+		)
+		account = f"rzp_test_{frappe.generate_hash(length=8)}"
+
+		self.assertFalse(check_circuit(account))
+		record_failure(account)
+		# a request after a failure reports its success
+		self.assertTrue(check_circuit(account))
+		record_failure(account)
+		with self.assertRaises(RazorpayCircuitOpenError):
+			check_circuit(account)
+		self.assertEqual(
+			get_circuit_status(account)["state"], CircuitState.Open
+		)
+
+		time.sleep(1.1)
+		# a single request probes the half open circuit
+		self.assertTrue(check_circuit(account))
+		with self.assertRaises(RazorpayCircuitOpenError):
+			check_circuit(account)
+
+		record_success(account)
+		self.assertFalse(check_circuit(account))
+		self.assertEqual(
+			get_circuit_status(account)["state"], CircuitState.Closed
+		)
+
+	def test_quotation_submit_is_deferred_while_the_circuit_is_open(self):
+		account = self.open_circuit()
+		with patch(
+			"razorpay_frappe.quotation_events.create_payment_link_for_quotation"
+		) as create_payment_link:
+			handle_quotation_submit(frappe._dict(name="SAL-QTN-TEST-0001"))
+			create_payment_link.assert_not_called()
+
+		self.assertEqual(
+			get_deferred_calls(),
+			[
+				{
+					"method": "razorpay_frappe.quotation_events"
+					".handle_deferred_quotation_submit",
+					"kwargs": {"quotation_name": "SAL-QTN-TEST-0001"},
+				}
+			],
+		)
+		self.assertEqual(get_circuit_status(account)["deferred_calls"], 1)
+
+	@patch("frappe.enqueue")
+	def test_deferred_calls_run_once_the_circuit_closes(self, enqueue):
+		account = self.open_circuit()
+		defer_until_api_available("razorpay_frappe.tests.deferred", name="a")
+
+		run_deferred_api_calls()
+		enqueue.assert_not_called()
+		self.assertEqual(len(get_deferred_calls()), 1)
+
+		record_success(account)
+		run_deferred_api_calls()
+		enqueue.assert_called_once_with(
+			"razorpay_frappe.tests.deferred", queue="long", name="a"
+		)
+		self.assertEqual(get_deferred_calls(), [])
+
+	def open_circuit(self) -> str:
+		"""Open the circuit of a fresh account, used by the site's client
+		for the rest of the test."""
+		update_razorpay_settings(
+			self, {"circuit_failure_threshold": 1, "circuit_cooldown": 60}
+		)
+		account = f"rzp_test_{frappe.generate_hash(length=8)}"
+		get_account = patch(
+			"razorpay_frappe.api_circuit.get_account", return_value=account
+		)
+		get_account.start()
+		self.addCleanup(get_account.stop)
+		frappe.cache().delete_value(DEFERRED_CALLS_KEY)
+		self.addCleanup(frappe.cache().delete_value, DEFERRED_CALLS_KEY)
+
+		record_failure(account)
+		self.assertEqual(
+			get_circuit_status(account)["state"], CircuitState.Open
+		)
+		return account
+
+	def test_api_calls_are_recorded_per_endpoint_and_caller(self):
+		caller = f"razorpay_frappe.tests.{frappe.generate_hash(length=8)}"
+		url = "https://api.razorpay.com/v1/payments/pay_29QQoUBi66xm2f"
+		endpoint = get_endpoint("GET", url)
+		self.assertEqual(endpoint, "GET /v1/payments/:id")
+
+		record_api_call("GET", url, 200, 0.08, caller)
+		record_api_call("GET", url, 429, 0.02, caller)
+		record_api_call("GET", url, None, 12, caller)
+
+		stats, timeline = get_api_calls(minutes=2)
+		row = stats[(endpoint, caller)]
+		self.assertEqual(row["calls"], 3)
+		self.assertEqual(row["throttled"], 1)
+		self.assertEqual(row["errors"], 1)
+		self.assertEqual(row["le_100"], 1)
+		self.assertEqual(row["le_inf"], 1)
+		self.assertGreaterEqual(sum(m["calls"] for m in timeline.values()), 3)
+
+
+def get_deferred_calls() -> list[dict]:
+	return [
+		json.loads(call)
+		for call in frappe.cache().lrange(DEFERRED_CALLS_KEY, 0, -1)
+	]
+
+
+def set_webhook_secret(test_case: FrappeTestCase, secret: str):
+	update_razorpay_settings(test_case, {"webhook_secret": secret})
+
+
+def update_razorpay_settings(test_case: FrappeTestCase, values: dict):
+	"""Save `values` to Razorpay Settings and restore the previous ones
+	after the test, as code under test may commit."""
+	settings = frappe.get_doc("Razorpay Settings")
+	previous = {
+		# the document only holds a mask of passwords
+		fieldname: settings.get_password(fieldname, raise_exception=False)
+		if settings.meta.get_field(fieldname).fieldtype == "Password"
+		else settings.get(fieldname)
+		for fieldname in values
+	}
+	test_case.addCleanup(save_razorpay_settings, previous)
+	save_razorpay_settings(values)
+
+
+def save_razorpay_settings(values: dict):
+	settings = frappe.get_doc("Razorpay Settings")
+	settings.update(values)
+	settings.save()
@@ -1,19 +1,22 @@
 import frappe
 from frappe.model.document import Document
 
+from razorpay_frappe.api_gateway import ApiLane, api_lane
+
 class RazorpaySettlementPaymentEntry(Document):
     def onload(self):
         """Load payment details from Razorpay API"""
         if self.payment_id and not self.amount:
             self.load_payment_details()
     
-    def load_payment_details(self):
-        """Load payment details from Razorpay"""
+    def load_payment_details(self, payment=None):
+        """Load payment details from Razorpay, or from an already fetched
+        `payment` entity. Returns False when loading failed (and was logged)"""
         try:
-            from .utils import get_razorpay_client
+            from razorpay_frappe.entity_cache import fetch_payment
             
-            client = get_razorpay_client()
-            payment = client.payment.fetch(self.payment_id)
+            if payment is None:
+                payment = fetch_payment(self.payment_id)
             
             # Update fields
             self.amount = payment.get("amount") / 100 if payment.get("amount") else 0
@@ -36,9 +39,11 @@ class RazorpaySettlementPaymentEntry(Document):
                     self.customer = notes["customer"]
             
             self.save()
+            return True
             
         except Exception as e:
             frappe.log_error(f"Failed to load payment details: {str(e)}", "Razorpay Payment Load Error")
+            return False
     
     def reconcile_payment(self):
         """Reconcile this payment entry"""
@@ -109,4 +114,41 @@ class RazorpaySettlementPaymentEntry(Document):
             
         except Exception as e:
             frappe.log_error(f"Failed to create payment entry: {str(e)}", "Razorpay Payment Entry Error")
-            frappe.throw(f"Failed to create payment entry: {str(e)}") 
\ No newline at end of file
+            frappe.throw(f"Failed to create payment entry: {str(e)}")
+
+
+@frappe.whitelist()
+@api_lane(ApiLane.Background)
+def load_pending_payment_details():
+    """Load the Razorpay details of every entry that has none yet, fetching
+    the payments concurrently"""
+    from razorpay_frappe.bulk_fetch import iter_fetch_entities
+    from razorpay_frappe.entity_cache import RazorpayEntity
+    
+    frappe.only_for("System Manager")
+    
+    entries = frappe.get_all(
+        "Razorpay Settlement Payment Entry",
+        filters={"payment_id": ("is", "set"), "amount": 0},
+        fields=["name", "payment_id"],
+    )
+    names_by_payment_id = {}
+    for entry in entries:
+        names_by_payment_id.setdefault(entry.payment_id, []).append(entry.name)
+    
+    loaded, failed = 0, 0
+    for payment_id, payment, error in iter_fetch_entities(
+        RazorpayEntity.Payment, names_by_payment_id
+    ):
+        if error:
+            frappe.log_error(f"Failed to load payment details: {str(error)}", "Razorpay Payment Load Error")
+            failed += len(names_by_payment_id[payment_id])
+            continue
+        
+        for name in names_by_payment_id[payment_id]:
+            if frappe.get_doc("Razorpay Settlement Payment Entry", name).load_payment_details(payment):
+                loaded += 1
+            else:
+                failed += 1
+    
+    return {"loaded": loaded, "failed": failed}
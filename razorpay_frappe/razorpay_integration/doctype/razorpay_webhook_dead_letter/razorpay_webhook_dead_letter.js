@@ -0,0 +1,15 @@
+// Copyright (c) 2024, Build With Hussain and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("Razorpay Webhook Dead Letter", {
+	refresh(frm) {
+		if (frm.doc.status !== "Open") return;
+
+		frm.add_custom_button(__("Re-drive"), () => {
+			frm.call("redrive").then(() => {
+				frappe.show_alert(__("Webhook re-driven"));
+				frm.reload_doc();
+			});
+		});
+	},
+});
@@ -0,0 +1,31 @@
+# Copyright (c) 2024, Build With Hussain and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+
+from razorpay_frappe.webhook_retry import redrive_dead_letters
+
+
+class RazorpayWebhookDeadLetter(Document):
+	# begin: auto-generated types
+	# This code is auto-generated. Do not modify anything in this block.
+
+	from typing import TYPE_CHECKING
+
+	if TYPE_CHECKING:
+		from frappe.types import DF
+
+		attempts: DF.Int
+		dead_lettered_at: DF.Datetime | None
+		entity_id: DF.Data | None
+		error: DF.Code | None
+		event: DF.Data | None
+		redriven_at: DF.Datetime | None
+		status: DF.Literal["Open", "Re-driven"]
+		webhook_log: DF.Link | None
+	# end: auto-generated types
+
+	@frappe.whitelist()
+	def redrive(self):
+		return redrive_dead_letters([self.name])
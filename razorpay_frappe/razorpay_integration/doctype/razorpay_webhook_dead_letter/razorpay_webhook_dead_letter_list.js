@@ -0,0 +1,28 @@
+// Copyright (c) 2024, Build With Hussain and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Razorpay Webhook Dead Letter"] = {
+	get_indicator(doc) {
+		return doc.status === "Open"
+			? [__("Open"), "red", "status,=,Open"]
+			: [__("Re-driven"), "green", "status,=,Re-driven"];
+	},
+
+	onload(listview) {
+		const redrive = (names) =>
+			frappe
+				.xcall("razorpay_frappe.webhook_retry.redrive_dead_letters", { names })
+				.then(({ redriven }) => {
+					frappe.show_alert(__("{0} webhooks re-driven", [redriven]));
+					listview.refresh();
+				});
+
+		listview.page.add_actions_menu_item(__("Re-drive"), () => {
+			redrive(listview.get_checked_items(true));
+		});
+
+		listview.page.add_menu_item(__("Re-drive All Open"), () => {
+			frappe.confirm(__("Re-drive every open dead-lettered webhook?"), () => redrive(null));
+		});
+	},
+};
@@ -0,0 +1,96 @@
+# Copyright (c) 2024, Build With Hussain and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from razorpay_frappe.razorpay_integration.doctype.razorpay_webhook_log.razorpay_webhook_log import (
+	RazorpayWebhookLog,
+)
+from razorpay_frappe.razorpay_integration.doctype.razorpay_webhook_log.test_razorpay_webhook_log import (
+	get_unhandled_event_payload,
+)
+from razorpay_frappe.webhook_queue import record_webhook_event
+from razorpay_frappe.webhook_retry import (
+	MAX_RETRY_DELAY,
+	get_retry_delay,
+	redrive_dead_letters,
+	retry_failed_webhook_logs,
+)
+
+
+class TestRazorpayWebhookDeadLetter(FrappeTestCase):
+	def tearDown(self):
+		frappe.db.set_single_value(
+			"Razorpay Settings", "webhook_max_attempts", 5
+		)
+
+	def test_retry_delay_backs_off_with_jitter(self):
+		for attempts in range(1, 6):
+			delay = 60 * 2 ** (attempts - 1)
+			self.assertTrue(
+				delay / 2 <= get_retry_delay(attempts, base_delay=60) <= delay
+			)
+
+		self.assertLessEqual(
+			get_retry_delay(50, base_delay=60), MAX_RETRY_DELAY
+		)
+
+	def test_failed_event_is_kept_and_scheduled_for_retry(self):
+		with patch.object(
+			RazorpayWebhookLog, "process", side_effect=frappe.QueryDeadlockError
+		):
+			log = record_webhook_event(get_unhandled_event_payload())
+
+		log.reload()
+		self.assertEqual(log.status, "Failed")
+		self.assertEqual(log.attempts, 1)
+		self.assertIsNotNone(log.next_retry_at)
+
+	def test_due_retry_processes_event(self):
+		with patch.object(
+			RazorpayWebhookLog, "process", side_effect=frappe.QueryDeadlockError
+		):
+			log = record_webhook_event(get_unhandled_event_payload())
+
+		log.db_set("next_retry_at", frappe.utils.add_days(None, -1))
+		retry_failed_webhook_logs()
+
+		log.reload()
+		self.assertEqual(log.status, "Processed")
+		self.assertIsNone(log.next_retry_at)
+
+	def test_exhausted_event_is_dead_lettered_and_redriven(self):
+		frappe.db.set_single_value(
+			"Razorpay Settings", "webhook_max_attempts", 1
+		)
+
+		with patch.object(
+			RazorpayWebhookLog, "process", side_effect=frappe.QueryDeadlockError
+		):
+			log = record_webhook_event(get_unhandled_event_payload())
+
+		self.assertEqual(
+			get_status("Razorpay Webhook Log", log.name), "Dead Letter"
+		)
+		dead_letter = frappe.db.get_value(
+			"Razorpay Webhook Dead Letter", {"webhook_log": log.name}
+		)
+		self.assertEqual(
+			get_status("Razorpay Webhook Dead Letter", dead_letter), "Open"
+		)
+
+		self.assertEqual(redrive_dead_letters([dead_letter]), {"redriven": 1})
+
+		self.assertEqual(
+			get_status("Razorpay Webhook Log", log.name), "Processed"
+		)
+		self.assertEqual(
+			get_status("Razorpay Webhook Dead Letter", dead_letter), "Re-driven"
+		)
+
+
+def get_status(doctype: str, name: str) -> str:
+	return frappe.db.get_value(doctype, name, "status")
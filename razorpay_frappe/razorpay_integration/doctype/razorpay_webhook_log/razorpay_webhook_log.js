@@ -1,8 +1,18 @@
 // Copyright (c) 2024, Build With Hussain and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("Razorpay Webhook Log", {
-// 	refresh(frm) {
+frappe.ui.form.on("Razorpay Webhook Log", {
+	refresh(frm) {
+		if (frm.is_new() || !frm.doc.payload) return;
 
-// 	},
-// });
+		frm.add_custom_button(__("View Payload"), () => {
+			frm.call("get_formatted_payload").then(({ message }) => {
+				frappe.msgprint({
+					title: __("Payload"),
+					message: `<pre>${frappe.utils.escape_html(message)}</pre>`,
+					wide: true,
+				});
+			});
+		});
+	},
+});
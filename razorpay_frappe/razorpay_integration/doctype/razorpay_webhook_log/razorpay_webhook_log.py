@@ -5,6 +5,16 @@ import frappe
 from frappe.model.document import Document
 
 from razorpay_frappe.webhook_processor import WebhookProcessor
+from razorpay_frappe.webhook_queue import (
+	HOLDING_STATUSES,
+	enqueue_webhook_partition,
+	get_partition,
+	is_background_processing_enabled,
+)
+from razorpay_frappe.webhook_retry import schedule_webhook_retry
+from razorpay_frappe.webhook_storage import decode_payload
+
+PROCESS_SAVEPOINT = "razorpay_webhook_log_process"
 
 
 class RazorpayWebhookLog(Document):
@@ -17,11 +27,79 @@ class RazorpayWebhookLog(Document):
 		from frappe.types import DF
 
 		amended_from: DF.Link | None
+		attempts: DF.Int
+		error: DF.Code | None
+		entity_id: DF.Data | None
 		event: DF.Data | None
+		event_created_at: DF.Datetime | None
+		event_id: DF.Data | None
+		next_retry_at: DF.Datetime | None
 		payload: DF.Code | None
+		status: DF.Literal[
+			"Queued",
+			"Processing",
+			"Replaying",
+			"Processed",
+			"Failed",
+			"Dead Letter",
+		]
+		webhook_partition: DF.Int
 	# end: auto-generated types
 
+	def before_insert(self):
+		self.status = "Queued"
+		self.webhook_partition = get_partition(self.entity_id)
+
 	def on_submit(self):
-		payload = frappe.parse_json(self.payload)
+		if is_background_processing_enabled():
+			enqueue_webhook_partition(self.webhook_partition)
+			return
+
+		if self.is_held_back():
+			# stays Queued; the predecessor's retry or replay drains the
+			# partition
+			return
+
+		# keep the log even if applying it fails; the retry picks it up
+		frappe.db.savepoint(PROCESS_SAVEPOINT)
+		try:
+			self.process()
+		except Exception:
+			frappe.db.rollback(save_point=PROCESS_SAVEPOINT)
+			schedule_webhook_retry(self, frappe.get_traceback())
+			return
+
+		self.db_set("status", "Processed")
+
+	def is_held_back(self) -> bool:
+		"""Whether an earlier event of this entity waits for its retry or is
+		being replayed."""
+		return bool(
+			self.entity_id
+			and frappe.db.exists(
+				"Razorpay Webhook Log",
+				{
+					"entity_id": self.entity_id,
+					"status": ("in", HOLDING_STATUSES),
+					"creation": ("<", self.creation),
+				},
+			)
+		)
+
+	def process(self):
+		payload = self.get_payload()
 		processor = WebhookProcessor(self.event, payload)
 		processor.process()
+
+	def get_payload(self) -> dict:
+		return decode_payload(self.payload)
+
+	@frappe.whitelist()
+	def get_formatted_payload(self) -> str:
+		return frappe.as_json(self.get_payload(), indent=2)
+
+
+def on_doctype_update():
+	frappe.db.add_index(
+		"Razorpay Webhook Log", ["webhook_partition", "status", "creation"]
+	)
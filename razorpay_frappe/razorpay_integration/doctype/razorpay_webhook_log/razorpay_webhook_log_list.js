@@ -0,0 +1,60 @@
+// Copyright (c) 2024, Build With Hussain and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Razorpay Webhook Log"] = {
+	onload(listview) {
+		listview.page.add_menu_item(__("Replay Webhooks"), () => {
+			const dialog = new frappe.ui.Dialog({
+				title: __("Replay Webhooks"),
+				fields: [
+					{ fieldname: "from_date", fieldtype: "Datetime", label: __("From") },
+					{ fieldname: "to_date", fieldtype: "Datetime", label: __("To") },
+					{
+						fieldname: "events",
+						fieldtype: "Small Text",
+						label: __("Events"),
+						description: __("One event per line, e.g. payment.captured. Leave empty for all"),
+					},
+					{
+						fieldname: "include_processed",
+						fieldtype: "Check",
+						label: __("Include Processed Events"),
+					},
+				],
+				primary_action_label: __("Replay"),
+				primary_action(values) {
+					const events = (values.events || "")
+						.split("\n")
+						.map((event) => event.trim())
+						.filter(Boolean);
+
+					frappe
+						.xcall("razorpay_frappe.webhook_replay.replay_webhook_logs", {
+							from_date: values.from_date,
+							to_date: values.to_date,
+							events: events.length ? events : null,
+							include_processed: values.include_processed,
+						})
+						.then(() => {
+							frappe.show_alert(__("Webhook replay started"));
+							dialog.hide();
+						});
+				},
+			});
+			dialog.show();
+		});
+
+		frappe.realtime.on("razorpay_webhook_replay", (report) => {
+			const message = __("Replayed {0} webhooks: {1} processed, {2} failed ({3}/s)", [
+				report.total,
+				report.processed,
+				report.failed,
+				report.events_per_second,
+			]);
+			frappe.show_alert({ message, indicator: report.failed ? "orange" : "green" });
+			if (report.done) {
+				listview.refresh();
+			}
+		});
+	},
+};
@@ -1,9 +1,406 @@
 # Copyright (c) 2024, Build With Hussain and Contributors
 # See license.txt
 
-# import frappe
+import gzip
+import json
+import os
+from unittest.mock import patch
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, getdate, now_datetime
+
+from razorpay_frappe.benchmarks.webhook_ingestion import (
+	BENCHMARK_EVENTS,
+	WEBHOOK_ENDPOINTS,
+)
+from razorpay_frappe.benchmarks.webhook_ingestion import run as run_benchmark
+from razorpay_frappe.razorpay_integration.doctype.razorpay_settings.test_razorpay_settings import (
+	set_webhook_secret,
+)
+from razorpay_frappe.razorpay_integration.doctype.razorpay_webhook_log.razorpay_webhook_log import (
+	RazorpayWebhookLog,
+)
+from razorpay_frappe.webhook_dedup import release_webhook_event
+from razorpay_frappe.webhook_queue import (
+	drain_webhook_partition,
+	get_partition,
+	get_webhook_backlog,
+	record_webhook_event,
+)
+from razorpay_frappe.webhook_replay import (
+	release_stale_replay_claims,
+	run_webhook_replay,
+)
+from razorpay_frappe.webhook_retry import retry_failed_webhook_logs
+from razorpay_frappe.webhook_storage import (
+	archive_webhook_logs,
+	decode_payload,
+	encode_payload,
+	get_archive_dir,
+)
+
+WEBHOOK_LOG_MODULE = (
+	"razorpay_frappe.razorpay_integration.doctype.razorpay_webhook_log"
+	".razorpay_webhook_log"
+)
 
 
 class TestRazorpayWebhookLog(FrappeTestCase):
-	pass
+	def tearDown(self):
+		frappe.db.set_single_value(
+			"Razorpay Settings",
+			{
+				"process_webhooks_in_background": 0,
+				"webhook_payload_storage": "Pretty",
+			},
+		)
+
+	def test_inline_processing_marks_log_processed(self):
+		log = record_webhook_event(get_unhandled_event_payload())
+		self.assertEqual(get_log_status(log.name), "Processed")
+
+	def test_background_processing_marks_log_processed(self):
+		frappe.db.set_single_value(
+			"Razorpay Settings", "process_webhooks_in_background", 1
+		)
+
+		log = record_webhook_event(get_unhandled_event_payload())
+		self.assertEqual(get_log_status(log.name), "Processed")
+
+	def test_backlog_counts_logs_by_status(self):
+		record_webhook_event(get_unhandled_event_payload())
+
+		backlog = get_webhook_backlog()
+		self.assertGreaterEqual(backlog["logs"]["Processed"], 1)
+		self.assertIn("Queued", backlog["logs"])
+
+	def test_redelivered_event_is_dropped(self):
+		payload = get_unhandled_event_payload()
+		event_id = f"evt_{frappe.generate_hash(length=14)}"
+
+		first = record_webhook_event(payload, event_id)
+		second = record_webhook_event(payload, event_id)
+
+		self.assertIsNotNone(first)
+		self.assertIsNone(second)
+		self.assertEqual(
+			frappe.db.count("Razorpay Webhook Log", {"event_id": event_id}), 1
+		)
+
+	def test_unique_index_drops_event_missing_from_seen_set(self):
+		payload = get_unhandled_event_payload()
+		event_id = f"evt_{frappe.generate_hash(length=14)}"
+
+		record_webhook_event(payload, event_id)
+		release_webhook_event(event_id)
+
+		self.assertIsNone(record_webhook_event(payload, event_id))
+
+	def test_rolled_back_event_is_accepted_again(self):
+		payload = get_unhandled_event_payload()
+		event_id = f"evt_{frappe.generate_hash(length=14)}"
+
+		self.assertIsNotNone(record_webhook_event(payload, event_id))
+		frappe.db.rollback()
+
+		self.assertIsNotNone(record_webhook_event(payload, event_id))
+
+	def test_payload_digest_is_used_without_event_id_header(self):
+		payload = get_unhandled_event_payload()
+
+		self.assertIsNotNone(record_webhook_event(payload))
+		self.assertIsNone(record_webhook_event(payload))
+
+	def test_events_of_an_entity_are_applied_in_order(self):
+		partitions = frappe.db.get_single_value(
+			"Razorpay Settings", "webhook_partitions"
+		)
+		self.addCleanup(
+			frappe.db.set_single_value,
+			"Razorpay Settings",
+			"webhook_partitions",
+			partitions,
+		)
+		frappe.db.set_single_value(
+			"Razorpay Settings",
+			{"process_webhooks_in_background": 1, "webhook_partitions": 4},
+		)
+
+		order_id = f"order_{frappe.generate_hash(length=14)}"
+		other_order_id = next(
+			other_order_id
+			for other_order_id in (
+				f"order_{frappe.generate_hash(length=14)}" for _ in range(100)
+			)
+			if get_partition(other_order_id) != get_partition(order_id)
+		)
+
+		# hold the drains back until every log is stored
+		with patch(f"{WEBHOOK_LOG_MODULE}.enqueue_webhook_partition"):
+			logs = {
+				entity_id: [
+					record_webhook_event(
+						get_unhandled_event_payload(entity_id)
+					).name
+					for _ in range(3)
+				]
+				for entity_id in (order_id, other_order_id)
+			}
+		self.assertEqual(
+			frappe.get_all(
+				"Razorpay Webhook Log",
+				filters={"name": ("in", logs[order_id])},
+				distinct=True,
+				pluck="webhook_partition",
+			),
+			[get_partition(order_id)],
+		)
+
+		applied = []
+		with patch.object(
+			RazorpayWebhookLog,
+			"process",
+			autospec=True,
+			side_effect=lambda log: applied.append(log.name),
+		):
+			drain_webhook_partition(get_partition(order_id))
+
+			self.assertEqual(
+				[name for name in applied if name in logs[order_id]],
+				logs[order_id],
+			)
+			# the other entity's partition is drained on its own
+			self.assertEqual(
+				{get_log_status(name) for name in logs[other_order_id]},
+				{"Queued"},
+			)
+
+			drain_webhook_partition(get_partition(other_order_id))
+
+		self.assertEqual(
+			[name for name in applied if name in logs[other_order_id]],
+			logs[other_order_id],
+		)
+		self.assertEqual(
+			{get_log_status(name) for name in sum(logs.values(), [])},
+			{"Processed"},
+		)
+
+	def test_later_logs_wait_for_the_entitys_failed_log(self):
+		frappe.db.set_single_value(
+			"Razorpay Settings", "process_webhooks_in_background", 1
+		)
+		order_id = f"order_{frappe.generate_hash(length=14)}"
+		with patch(f"{WEBHOOK_LOG_MODULE}.enqueue_webhook_partition"):
+			failed, later = (
+				record_webhook_event(get_unhandled_event_payload(order_id)).name
+				for _ in range(2)
+			)
+		frappe.db.set_value(
+			"Razorpay Webhook Log",
+			failed,
+			{
+				"status": "Failed",
+				"attempts": 1,
+				"next_retry_at": add_to_date(now_datetime(), hours=1),
+			},
+		)
+
+		applied = []
+		with patch.object(
+			RazorpayWebhookLog,
+			"process",
+			autospec=True,
+			side_effect=lambda log: applied.append(log.name),
+		):
+			drain_webhook_partition(get_partition(order_id))
+			self.assertNotIn(later, applied)
+			self.assertEqual(get_log_status(later), "Queued")
+
+			# the retry re-drains the partition, failed log first
+			frappe.db.set_value(
+				"Razorpay Webhook Log",
+				failed,
+				"next_retry_at",
+				add_to_date(now_datetime(), hours=-1),
+			)
+			retry_failed_webhook_logs()
+
+		self.assertEqual(
+			[name for name in applied if name in (failed, later)],
+			[failed, later],
+		)
+
+	def test_replay_reapplies_failed_logs(self):
+		log = record_webhook_event(get_unhandled_event_payload())
+		log.db_set({"status": "Failed", "error": "Lock wait timeout"})
+
+		report = run_webhook_replay(events=["payment.authorized"])
+
+		self.assertGreaterEqual(report["processed"], 1)
+		self.assertEqual(get_log_status(log.name), "Processed")
+
+	def test_replay_skips_processed_logs(self):
+		log = record_webhook_event(get_unhandled_event_payload())
+
+		with patch.object(RazorpayWebhookLog, "process") as process:
+			run_webhook_replay(events=["payment.authorized"])
+			process.assert_not_called()
+
+		self.assertEqual(get_log_status(log.name), "Processed")
+
+	def test_replay_leaves_logs_a_drain_is_applying(self):
+		log = record_webhook_event(get_unhandled_event_payload())
+		log.db_set("status", "Processing")
+
+		report = run_webhook_replay(
+			from_date=str(log.creation), events=["payment.authorized"]
+		)
+
+		self.assertGreaterEqual(report["pending"], 1)
+		self.assertEqual(get_log_status(log.name), "Processing")
+
+	def test_drain_holds_an_entity_behind_its_replaying_log(self):
+		order_id = f"order_{frappe.generate_hash(length=14)}"
+		with patch(f"{WEBHOOK_LOG_MODULE}.enqueue_webhook_partition"):
+			replaying, later = (
+				record_webhook_event(get_unhandled_event_payload(order_id)).name
+				for _ in range(2)
+			)
+		frappe.db.set_value(
+			"Razorpay Webhook Log", replaying, "status", "Replaying"
+		)
+
+		with patch.object(RazorpayWebhookLog, "process") as process:
+			drain_webhook_partition(get_partition(order_id))
+			process.assert_not_called()
+
+		self.assertEqual(get_log_status(replaying), "Replaying")
+		self.assertEqual(get_log_status(later), "Queued")
+
+	def test_replay_pages_through_logs_created_in_the_same_instant(self):
+		creation = add_to_date(now_datetime(), days=-400)
+		logs = []
+		for _ in range(3):
+			log = record_webhook_event(get_unhandled_event_payload())
+			log.db_set({"status": "Failed", "creation": creation})
+			logs.append(log.name)
+
+		report = run_webhook_replay(
+			from_date=str(creation), to_date=str(creation), chunk_size=1
+		)
+
+		self.assertEqual(report["total"], 3)
+		self.assertEqual({get_log_status(name) for name in logs}, {"Processed"})
+
+	def test_stale_replay_claims_are_released(self):
+		log = record_webhook_event(get_unhandled_event_payload())
+		frappe.db.set_value(
+			"Razorpay Webhook Log",
+			log.name,
+			{
+				"status": "Replaying",
+				"modified": add_to_date(now_datetime(), hours=-2),
+			},
+			update_modified=False,
+		)
+
+		release_stale_replay_claims()
+
+		self.assertEqual(get_log_status(log.name), "Processed")
+
+	def test_payload_storage_formats_round_trip(self):
+		payload = get_unhandled_event_payload()
+
+		for storage in ("Pretty", "Compact", "Compressed"):
+			self.assertEqual(
+				decode_payload(encode_payload(payload, storage)), payload
+			)
+
+	def test_compressed_log_is_processed(self):
+		frappe.db.set_single_value(
+			"Razorpay Settings", "webhook_payload_storage", "Compressed"
+		)
+
+		log = record_webhook_event(get_unhandled_event_payload())
+		self.assertTrue(
+			frappe.db.get_value(
+				"Razorpay Webhook Log", log.name, "payload"
+			).startswith("zlib:")
+		)
+		self.assertEqual(get_log_status(log.name), "Processed")
+
+	def test_old_processed_logs_are_archived(self):
+		self.addCleanup(
+			frappe.db.set_single_value,
+			"Razorpay Settings",
+			"webhook_log_retention_days",
+			frappe.db.get_single_value(
+				"Razorpay Settings", "webhook_log_retention_days"
+			),
+		)
+		frappe.db.set_single_value(
+			"Razorpay Settings", "webhook_log_retention_days", 30
+		)
+		payload = get_unhandled_event_payload()
+		old, failed, recent = (
+			record_webhook_event(payload),
+			record_webhook_event(get_unhandled_event_payload()),
+			record_webhook_event(get_unhandled_event_payload()),
+		)
+		creation = add_to_date(now_datetime(), days=-1000)
+		old.db_set("creation", creation)
+		failed.db_set({"status": "Failed", "creation": creation})
+
+		archive_webhook_logs()
+
+		archive_path = os.path.join(
+			get_archive_dir(), f"{getdate(creation)}.jsonl.gz"
+		)
+		self.addCleanup(os.remove, archive_path)
+		with gzip.open(archive_path, "rt") as archive:
+			records = {
+				record["name"]: record for record in map(json.loads, archive)
+			}
+		self.assertEqual(records[old.name]["payload"], payload)
+		self.assertNotIn(failed.name, records)
+		self.assertFalse(frappe.db.exists("Razorpay Webhook Log", old.name))
+		self.assertTrue(frappe.db.exists("Razorpay Webhook Log", failed.name))
+		self.assertTrue(frappe.db.exists("Razorpay Webhook Log", recent.name))
+
+	def test_benchmark_events_are_ingested_without_api_calls(self):
+		set_webhook_secret(self, "benchmark-secret")
+
+		report = run_benchmark(events=len(BENCHMARK_EVENTS))
+
+		self.assertEqual(set(report["endpoints"]), set(WEBHOOK_ENDPOINTS))
+		for endpoint, result in report["endpoints"].items():
+			self.assertEqual(result["events"], len(BENCHMARK_EVENTS), endpoint)
+			self.assertEqual(result["errors"], 0, endpoint)
+			self.assertEqual(result["http_calls_per_event"], 0, endpoint)
+
+	def test_partition_is_within_range(self):
+		for i in range(50):
+			self.assertIn(get_partition(f"order_{i}", 4), range(4))
+
+
+def get_log_status(log_name: str) -> str:
+	return frappe.db.get_value("Razorpay Webhook Log", log_name, "status")
+
+
+def get_unhandled_event_payload(order_id: str | None = None) -> dict:
+	return {
+		"entity": "event",
+		"event": "payment.authorized",
+		"contains": ["payment"],
+		"payload": {
+			"payment": {
+				"entity": {
+					"id": f"pay_{frappe.generate_hash(length=14)}",
+					"order_id": order_id,
+				}
+			}
+		},
+		"created_at": 1715397833,
+	}
@@ -0,0 +1,26 @@
+// Copyright (c) 2024, Build With Hussain and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Razorpay API Calls"] = {
+	filters: [
+		{
+			fieldname: "minutes",
+			label: __("Period"),
+			fieldtype: "Select",
+			options: [
+				{ value: "15", label: __("Last 15 Minutes") },
+				{ value: "60", label: __("Last Hour") },
+				{ value: "360", label: __("Last 6 Hours") },
+				{ value: "1440", label: __("Last 24 Hours") },
+			],
+			default: "60",
+		},
+		{
+			fieldname: "group_by",
+			label: __("Group By"),
+			fieldtype: "Select",
+			options: ["Endpoint", "Caller", "Endpoint and Caller"],
+			default: "Endpoint and Caller",
+		},
+	],
+};
@@ -0,0 +1,139 @@
+# Copyright (c) 2024, Build With Hussain and contributors
+# For license information, please see license.txt
+
+from datetime import datetime, timezone
+
+import frappe
+from frappe import _
+from frappe.utils import cint, convert_utc_to_system_timezone, flt
+
+from razorpay_frappe.api_telemetry import (
+	TELEMETRY_RETENTION,
+	get_api_calls,
+	get_latency_percentile,
+)
+
+DEFAULT_MINUTES = 60
+
+
+def execute(filters: dict | None = None):
+	filters = frappe._dict(filters or {})
+	minutes = min(
+		cint(filters.minutes) or DEFAULT_MINUTES, TELEMETRY_RETENTION // 60
+	)
+	group_by = filters.group_by or "Endpoint and Caller"
+
+	stats, timeline = get_api_calls(minutes)
+	return (
+		get_columns(group_by),
+		get_data(stats, group_by),
+		None,
+		get_chart(timeline),
+	)
+
+
+def get_columns(group_by: str) -> list[dict]:
+	columns = []
+	if group_by != "Caller":
+		columns.append(
+			{
+				"fieldname": "endpoint",
+				"label": _("Endpoint"),
+				"fieldtype": "Data",
+				"width": 280,
+			}
+		)
+	if group_by != "Endpoint":
+		columns.append(
+			{
+				"fieldname": "caller",
+				"label": _("Caller"),
+				"fieldtype": "Data",
+				"width": 360,
+			}
+		)
+
+	return [
+		*columns,
+		{"fieldname": "calls", "label": _("Calls"), "fieldtype": "Int"},
+		{"fieldname": "errors", "label": _("Errors"), "fieldtype": "Int"},
+		{
+			"fieldname": "error_rate",
+			"label": _("Error Rate"),
+			"fieldtype": "Percent",
+		},
+		{"fieldname": "throttled", "label": _("429s"), "fieldtype": "Int"},
+		{
+			"fieldname": "throttle_rate",
+			"label": _("429 Rate"),
+			"fieldtype": "Percent",
+		},
+		{
+			"fieldname": "avg_ms",
+			"label": _("Avg (ms)"),
+			"fieldtype": "Float",
+			"precision": 1,
+		},
+		{"fieldname": "p50_ms", "label": _("p50 (ms) ≤"), "fieldtype": "Int"},
+		{"fieldname": "p95_ms", "label": _("p95 (ms) ≤"), "fieldtype": "Int"},
+	]
+
+
+def get_data(stats: dict, group_by: str) -> list[dict]:
+	grouped = {}
+	for (endpoint, caller), row in stats.items():
+		key = {
+			"Endpoint": (endpoint, None),
+			"Caller": (None, caller),
+		}.get(group_by, (endpoint, caller))
+
+		total = grouped.setdefault(key, {})
+		for metric, value in row.items():
+			total[metric] = total.get(metric, 0) + value
+
+	data = []
+	for (endpoint, caller), row in grouped.items():
+		calls = row["calls"]
+		data.append(
+			{
+				"endpoint": endpoint,
+				"caller": caller,
+				"calls": calls,
+				"errors": row["errors"],
+				"error_rate": flt(row["errors"] * 100 / calls, 2),
+				"throttled": row["throttled"],
+				"throttle_rate": flt(row["throttled"] * 100 / calls, 2),
+				"avg_ms": flt(row["ms"] / calls, 1),
+				# None: slower than the last histogram bucket
+				"p50_ms": get_latency_percentile(row, 50),
+				"p95_ms": get_latency_percentile(row, 95),
+			}
+		)
+
+	return sorted(data, key=lambda row: row["calls"], reverse=True)
+
+
+def get_chart(timeline: dict) -> dict:
+	labels, calls, errors, throttled = [], [], [], []
+	for bucket, minute in sorted(timeline.items()):
+		labels.append(
+			convert_utc_to_system_timezone(
+				datetime.fromtimestamp(bucket, tz=timezone.utc)
+			).strftime("%H:%M")
+		)
+		calls.append(minute["calls"])
+		errors.append(minute["errors"])
+		throttled.append(minute["throttled"])
+
+	return {
+		"data": {
+			"labels": labels,
+			"datasets": [
+				{"name": _("Calls"), "values": calls},
+				{"name": _("Errors"), "values": errors},
+				{"name": _("429s"), "values": throttled},
+			],
+		},
+		"type": "line",
+		"axisOptions": {"xIsSeries": 1},
+	}
@@ -4,6 +4,7 @@ import frappe
 from frappe.utils.response import build_response
 from werkzeug.wrappers import Response
 
+from razorpay_frappe.entity_cache import invalidate_webhook_entities
 from razorpay_frappe.razorpay_integration.doctype.razorpay_order.razorpay_order import (
 	RazorpayOrder,
 )
@@ -13,6 +14,8 @@ from razorpay_frappe.razorpay_integration.doctype.razorpay_subscription.razorpay
 from razorpay_frappe.utils import (
 	verify_webhook_signature,
 )
+from razorpay_frappe.webhook_dedup import get_request_event_id
+from razorpay_frappe.webhook_queue import record_webhook_event
 
 BASE_API_PATH = "razorpay-api/"
 
@@ -94,22 +97,11 @@ class RazorpayEndpointHandler:
 		payload = frappe.request.get_data()
 
 		verify_webhook_signature(payload)
-		self.create_webhook_log(form_dict)
-
-	def create_webhook_log(self, payload: dict):
-		current_user = frappe.session.user
-		frappe.set_user("Administrator")
-
-		event = payload.get("event")
-		frappe.get_doc(
-			{
-				"doctype": "Razorpay Webhook Log",
-				"event": event,
-				"payload": frappe.as_json(payload, indent=2),
-			}
-		).insert().submit()
+		invalidate_webhook_entities(form_dict)
+		self.create_webhook_log(form_dict, get_request_event_id())
 
-		frappe.set_user(current_user)
+	def create_webhook_log(self, payload: dict, event_id: str | None = None):
+		return record_webhook_event(payload, event_id)
 
 	def check_permissions(self):
 		settings = frappe.get_cached_doc("Razorpay Settings")
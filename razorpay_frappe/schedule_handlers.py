@@ -1,12 +1,7 @@
-import frappe
+from razorpay_frappe.payment_link_sync import enqueue_payment_link_sync
 
 
 def sync_payment_link_status():
-	pending_payment_links = frappe.db.get_all(
-		"Razorpay Payment Link",
-		filters={"status": ("in", ("Created", "Partially Paid"))},
-		pluck="name",
-	)
-
-	for p_link in pending_payment_links:
-		frappe.get_doc("Razorpay Payment Link", p_link).fetch_latest_status()
+	# as its own job on the long queue: full resyncs requested meanwhile
+	# run as part of it and would outlast this job's timeout
+	enqueue_payment_link_sync()
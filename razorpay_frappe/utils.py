@@ -1,9 +1,19 @@
+import hashlib
+import hmac
 import os
 from enum import StrEnum
+from threading import Lock
 
 import frappe
 import razorpay
+import requests
+from frappe.utils import cint
 from frappe.utils.password import get_decrypted_password
+
+from razorpay_frappe.api_gateway import RazorpayGatewayAdapter
+from razorpay_frappe.razorpay_integration.doctype.razorpay_settings.razorpay_settings import (
+	get_settings_version,
+)
 from .zoho_templates import (
 	create_new_project_template,
 	create_status_update_template,
@@ -32,6 +42,15 @@ class RazorpaySubscriptionWebhookEvents(StrEnum):
 	SubscriptionResumed = "subscription.resumed"
 
 
+# (site, mode, key_id, api base url) -> (settings version, client)
+_client_registry: dict[
+	tuple[str, str, str, str | None], tuple[str | None, razorpay.Client]
+] = {}
+_client_registry_lock = Lock()
+
+DEFAULT_API_POOL_SIZE = 10
+
+
 def get_razorpay_client():
 	"""Return a Razorpay client instance using credentials based on the current
 	Razorpay Settings.
@@ -40,26 +59,96 @@ def get_razorpay_client():
 	1. If running in CI environment, fall back to env vars (maintains existing behaviour)
 	2. If *Sandbox Mode* is enabled in settings use sandbox credentials
 	3. Otherwise use production credentials
+
+	Clients are kept per process and keyed by (mode, key_id), so their
+	keep-alive connection pool is reused across calls. Saving Razorpay
+	Settings replaces them with clients using the new credentials.
+
+	`razorpay_api_base_url` in site config points the client at another
+	API server, e.g. the local stand-in in `razorpay_frappe.fake_razorpay`.
 	"""
 	in_ci = os.environ.get("CI")
+	base_url = frappe.conf.get("razorpay_api_base_url")
+	razorpay_settings = frappe.get_cached_doc("Razorpay Settings")
 	if in_ci:
+		mode = "ci"
 		key_id = os.environ.get("RZP_SANDBOX_KEY_ID")
+	elif getattr(razorpay_settings, "sandbox_mode", 0):
+		mode = "sandbox"
+		key_id = razorpay_settings.sandbox_key_id
+	else:
+		mode = "production"
+		key_id = razorpay_settings.key_id
+
+	registry_key = (frappe.local.site, mode, key_id, base_url)
+	version = get_settings_version()
+
+	registered = _client_registry.get(registry_key)
+	if registered and registered[0] == version:
+		return registered[1]
+
+	if in_ci:
 		key_secret = os.environ.get("RZP_SANDBOX_KEY_SECRET")
+	elif mode == "sandbox":
+		key_secret = razorpay_settings.get_password(
+			"sandbox_key_secret", raise_exception=not base_url
+		)
 	else:
-		razorpay_settings = frappe.get_cached_doc("Razorpay Settings")
-		if getattr(razorpay_settings, "sandbox_mode", 0):
-			key_id = razorpay_settings.sandbox_key_id
-			key_secret = razorpay_settings.get_password("sandbox_key_secret")
-		else:
-			key_id = razorpay_settings.key_id
-			key_secret = razorpay_settings.get_password("key_secret")
+		key_secret = razorpay_settings.get_password(
+			"key_secret", raise_exception=not base_url
+		)
+
+	if base_url and not (key_id and key_secret):
+		from razorpay_frappe.fake_razorpay import (
+			DEFAULT_KEY_ID,
+			DEFAULT_KEY_SECRET,
+		)
+
+		# the local API accepts any credentials unless started with its own
+		key_id = key_id or DEFAULT_KEY_ID
+		key_secret = key_secret or DEFAULT_KEY_SECRET
 
 	if not (key_id or key_secret):
 		frappe.throw(
 			f"Please set API keys in {frappe.bold('Razorpay Settings')} before trying to create a razorpay client!"
 		)
 
-	return razorpay.Client(auth=(key_id, key_secret))
+	client = razorpay.Client(
+		session=get_pooled_session(
+			cint(getattr(razorpay_settings, "api_pool_size", 0))
+			or DEFAULT_API_POOL_SIZE,
+			account=key_id,
+		),
+		auth=(key_id, key_secret),
+		**({"base_url": base_url.rstrip("/")} if base_url else {}),
+	)
+
+	with _client_registry_lock:
+		# forget this site's clients built from older settings; requests still
+		# running on them finish, then their sessions are garbage collected
+		for stale_key in [
+			key
+			for key, (registered_version, _client) in _client_registry.items()
+			if key[0] == registry_key[0] and registered_version != version
+		]:
+			del _client_registry[stale_key]
+
+		_client_registry[registry_key] = (version, client)
+
+	return client
+
+
+def get_pooled_session(
+	pool_size: int, account: str | None = None
+) -> requests.Session:
+	"""Keep-alive session whose requests pass the account's rate limiter."""
+	session = requests.Session()
+	adapter = RazorpayGatewayAdapter(
+		account=account, pool_connections=pool_size, pool_maxsize=pool_size
+	)
+	session.mount("https://", adapter)
+	session.mount("http://", adapter)
+	return session
 
 
 def get_in_razorpay_money(amount: int) -> int:
@@ -70,16 +159,50 @@ def convert_from_razorpay_money(amount: int) -> int:
 	return amount / 100
 
 
-def verify_webhook_signature(payload):
-	signature = frappe.get_request_header("X-Razorpay-Signature")
+# site -> (settings version, decrypted webhook secret)
+_webhook_secret_cache: dict[str, tuple[str | None, str | None]] = {}
+
+
+def get_webhook_secret() -> str | None:
+	"""Decrypted webhook secret, cached per process until Razorpay Settings
+	is saved again."""
+	site = frappe.local.site
+	version = get_settings_version()
+
+	cached = _webhook_secret_cache.get(site)
+	if cached and cached[0] == version:
+		return cached[1]
+
 	webhook_secret = get_decrypted_password(
-		"Razorpay Settings", "Razorpay Settings", "webhook_secret"
+		"Razorpay Settings",
+		"Razorpay Settings",
+		"webhook_secret",
+		raise_exception=False,
 	)
+	_webhook_secret_cache[site] = (version, webhook_secret)
+	return webhook_secret
 
-	client = get_razorpay_client()
-	client.utility.verify_webhook_signature(
-		payload.decode(), signature, webhook_secret
-	)
+
+def is_valid_webhook_signature(
+	payload: bytes | str, signature: str | None, secret: str | None = None
+) -> bool:
+	secret = secret or get_webhook_secret()
+	if not (secret and signature):
+		return False
+
+	if isinstance(payload, str):
+		payload = payload.encode()
+
+	expected = hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+	return hmac.compare_digest(expected, signature)
+
+
+def verify_webhook_signature(payload):
+	signature = frappe.get_request_header("X-Razorpay-Signature")
+	if not is_valid_webhook_signature(payload, signature):
+		raise razorpay.errors.SignatureVerificationError(
+			"Razorpay Signature Verification Failed"
+		)
 
 # ------------- Notification Helpers -----------------
 # Minimal helper to send messages to ZohoCliq channels when a webhook URL is
@@ -497,18 +620,19 @@ def check_razorpay_settings_fields():
 def fetch_payment_link_details(payment_link_id: str):
     """Fetch payment details for a payment link"""
     try:
-        client = get_razorpay_client()
+        from razorpay_frappe.entity_cache import fetch_payment, fetch_payment_link
         
-        # Fetch payment link details from Razorpay
-        payment_link = client.payment_link.fetch(payment_link_id)
+        # Fetch payment link details from Razorpay (cached until a webhook)
+        payment_link = fetch_payment_link(payment_link_id)
         
-        # Get payment details
+        # Get payment details; the link only lists summaries of its payments
         payments = []
         if payment_link.get("payments"):
-            for payment in payment_link["payments"]:
-                payment_details = client.payment.fetch(payment["id"])
+            for payment_summary in payment_link["payments"]:
+                payment_id = payment_summary.get("payment_id") or payment_summary.get("id")
+                payment = fetch_payment(payment_id)
                 payments.append({
-                    "payment_id": payment["id"],
+                    "payment_id": payment_id,
                     "amount": payment["amount"] / 100,  # Convert from paise to rupees
                     "currency": payment["currency"],
                     "status": payment["status"],
@@ -553,9 +677,10 @@ def update_payment_link_status(payment_link_name: str):
         # Get the payment link document
         pl_doc = frappe.get_doc("Razorpay Payment Link", payment_link_name)
         
-        # Fetch latest details from Razorpay
-        client = get_razorpay_client()
-        payment_link = client.payment_link.fetch(pl_doc.id)
+        # Fetch latest details from Razorpay (and refresh the cached copy)
+        from razorpay_frappe.entity_cache import fetch_payment_link
+        
+        payment_link = fetch_payment_link(pl_doc.id, refresh=True)
         
         # Update status
         pl_doc.status = payment_link["status"]
@@ -936,8 +1061,9 @@ def send_task_notification_to_project_thread(task_id, project_id=None):
 def fetch_settlement(settlement_id: str):
     """Fetch settlement details from Razorpay"""
     try:
-        client = get_razorpay_client()
-        settlement = client.settlement.fetch(settlement_id)
+        from razorpay_frappe.entity_cache import RazorpayEntity, fetch_entity
+        
+        settlement = fetch_entity(RazorpayEntity.Settlement, settlement_id)
         
         return {
             "success": True,
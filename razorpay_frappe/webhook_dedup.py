@@ -0,0 +1,52 @@
+import hashlib
+
+import frappe
+
+EVENT_ID_HEADER = "X-Razorpay-Event-Id"
+# Razorpay retries deliveries for up to 24 hours
+SEEN_EVENT_TTL = 3 * 24 * 60 * 60
+SEEN_EVENT_KEY = "razorpay_webhook_seen"
+
+
+def get_event_id(payload: dict, header_value: str | None = None) -> str:
+	"""Return the id Razorpay assigned to this event delivery.
+
+	Falls back to a digest of the payload when the header is not available
+	(e.g. when a payload is recorded directly), so identical redeliveries
+	still collapse onto the same id.
+	"""
+	if header_value:
+		return header_value
+
+	digest = hashlib.sha256(
+		frappe.as_json(payload, indent=None).encode()
+	).hexdigest()
+	return f"sha256:{digest}"
+
+
+def get_request_event_id() -> str | None:
+	return frappe.get_request_header(EVENT_ID_HEADER)
+
+
+def claim_webhook_event(event_id: str) -> bool:
+	"""Atomically mark an event as seen. Returns False for duplicates.
+
+	The claim is released if the transaction that stores the event is
+	rolled back, so that Razorpay's redelivery is accepted.
+	"""
+	cache = frappe.cache()
+	claimed = cache.set(
+		cache.make_key(f"{SEEN_EVENT_KEY}:{event_id}"),
+		1,
+		ex=SEEN_EVENT_TTL,
+		nx=True,
+	)
+	if claimed:
+		frappe.db.after_rollback.add(lambda: release_webhook_event(event_id))
+	return bool(claimed)
+
+
+def release_webhook_event(event_id: str):
+	"""Forget a claimed event so that Razorpay's redelivery is accepted."""
+	cache = frappe.cache()
+	cache.delete(cache.make_key(f"{SEEN_EVENT_KEY}:{event_id}"))
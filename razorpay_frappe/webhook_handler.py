@@ -1,25 +1,50 @@
-import hashlib
-import hmac
 import json
 import frappe
 from frappe import _
-from razorpay_frappe.utils import get_razorpay_client
+from frappe.query_builder import Case
+from frappe.query_builder.functions import Count, IfNull, Sum
+from razorpay_frappe.entity_cache import (
+    fetch_payment,
+    fetch_payment_link,
+    invalidate_webhook_entities,
+)
+from razorpay_frappe.payment_link_sync import (
+    LINK_SYNC_FIELDS,
+    enqueue_payment_link_sync,
+    get_status_values,
+    has_changed,
+    write_changed_links,
+)
+from razorpay_frappe.utils import (
+    get_webhook_secret,
+    is_valid_webhook_signature,
+)
+from razorpay_frappe.webhook_dedup import get_request_event_id
+from razorpay_frappe.webhook_queue import record_webhook_event
+
+# Fields read from a payment link / payment entity; when a webhook entity has
+# all of them there is no need to call the Razorpay API.
+PAYMENT_LINK_WEBHOOK_FIELDS = ('status', 'amount_paid')
+PAYMENT_DETAIL_FIELDS = ('amount', 'status', 'method', 'created_at')
+# Razorpay Payment Detail columns rewritten when a payment changes
+PAYMENT_DETAIL_COLUMNS = (
+    'amount', 'currency', 'status', 'method', 'payment_link', 'customer', 'quotation'
+)
 
 
 @frappe.whitelist(allow_guest=True, methods=['POST'])
 def razorpay_webhook():
     """Handle Razorpay webhook events for payment links"""
     try:
-        # Get Razorpay webhook secret from settings
-        settings = frappe.get_single("Razorpay Settings")
-        secret = settings.get_password("webhook_secret")
+        # Process-local cached secret, refreshed when Razorpay Settings is saved
+        secret = get_webhook_secret()
         
         if not secret:
             frappe.local.response['http_status_code'] = 500
             return 'Webhook secret not configured.'
 
         # Get request data and signature
-        data = frappe.request.get_data(as_text=True)
+        data = frappe.request.get_data()
         signature = frappe.get_request_header('X-Razorpay-Signature')
         
         if not signature:
@@ -27,22 +52,24 @@ def razorpay_webhook():
             return 'Missing signature.'
 
         # Validate signature
-        expected = hmac.new(secret.encode(), data.encode(), hashlib.sha256).hexdigest()
-        if not hmac.compare_digest(expected, signature):
+        if not is_valid_webhook_signature(data, signature, secret):
             frappe.local.response['http_status_code'] = 403
             return 'Invalid signature.'
 
         # Parse webhook data
         event = json.loads(data)
         event_type = event.get('event')
-        payload = event.get('payload', {})
+        
+        # Cached entities this event is about are stale from now on
+        invalidate_webhook_entities(event)
         
         # Log webhook event for debugging
         frappe.logger().info(f"Razorpay webhook received: {event_type}")
         
-        # Handle payment link events
+        # Persist payment link events; the webhook log applies them inline
+        # or from the background queue (see Razorpay Settings)
         if event_type and event_type.startswith('payment_link.'):
-            handle_payment_link_webhook(event_type, payload)
+            record_webhook_event(event, get_request_event_id())
         
         # Set proper response headers
         frappe.local.response['http_status_code'] = 200
@@ -56,103 +83,100 @@ def razorpay_webhook():
 
 
 def handle_payment_link_webhook(event_type: str, payload: dict):
-    """Handle payment link webhook events"""
-    try:
-        payment_link_entity = payload.get('payment_link', {}).get('entity', {})
-        payment_link_id = payment_link_entity.get('id')
-        
-        if not payment_link_id:
-            frappe.log_error("Payment link ID not found in webhook payload")
-            return
-        
-        # Find the payment link document
-        payment_link_doc = frappe.db.get_value("Razorpay Payment Link", {"id": payment_link_id}, "name")
-        if not payment_link_doc:
-            frappe.log_error(f"Payment link document not found for ID: {payment_link_id}")
-            return
-        
-        payment_link_doc = frappe.get_doc("Razorpay Payment Link", payment_link_doc)
-        
-        # Handle different payment link events
-        if event_type == 'payment_link.paid':
-            handle_payment_link_paid(payment_link_doc, payment_link_entity)
-        elif event_type == 'payment_link.cancelled':
-            handle_payment_link_cancelled(payment_link_doc, payment_link_entity)
-        elif event_type == 'payment_link.expired':
-            handle_payment_link_expired(payment_link_doc, payment_link_entity)
-        
-    except Exception as e:
-        frappe.log_error(f"Error handling payment link webhook: {str(e)}")
+    """Handle payment link webhook events.
 
+    Errors are not caught here: the Razorpay Webhook Log applying the event
+    retries it with backoff and dead-letters it once attempts run out.
+    """
+    payment_link_entity = payload.get('payment_link', {}).get('entity', {})
+    payment_link_id = payment_link_entity.get('id')
+    
+    if not payment_link_id:
+        frappe.log_error("Payment link ID not found in webhook payload")
+        return
+    
+    # Find the payment link document
+    payment_link_doc = frappe.db.get_value("Razorpay Payment Link", {"id": payment_link_id}, "name")
+    if not payment_link_doc:
+        frappe.log_error(f"Payment link document not found for ID: {payment_link_id}")
+        return
+    
+    payment_link_doc = frappe.get_doc("Razorpay Payment Link", payment_link_doc)
+    
+    # Handle different payment link events
+    if event_type == 'payment_link.paid':
+        payment_entity = payload.get('payment', {}).get('entity')
+        handle_payment_link_paid(payment_link_doc, payment_link_entity, payment_entity)
+    elif event_type == 'payment_link.cancelled':
+        handle_payment_link_cancelled(payment_link_doc, payment_link_entity)
+    elif event_type == 'payment_link.expired':
+        handle_payment_link_expired(payment_link_doc, payment_link_entity)
 
-def handle_payment_link_paid(payment_link_doc, payment_link_entity):
-    """Handle payment link paid event"""
-    try:
-        # Get payment details from Razorpay
-        client = get_razorpay_client()
-        payment_link_details = client.payment_link.fetch(payment_link_doc.id)
-        
-        # Update payment link document
-        payment_link_doc.status = payment_link_details.get('status', 'Paid')
-        
-        # Update amount paid
-        amount_paid = payment_link_details.get('amount_paid', 0)
-        if amount_paid:
-            payment_link_doc.amount_paid = amount_paid / 100  # Convert from paise to rupees
-        
-        # Update payment details
-        payment_link_doc.razorpay_payment_id = payment_link_details.get('payment_id')
-        payment_link_doc.razorpay_payment_status = 'Paid'
-        
-        # Calculate remaining amount
-        total_amount = payment_link_doc.amount
-        remaining_amount = max(0, total_amount - payment_link_doc.amount_paid)
-        payment_link_doc.remaining_amount = remaining_amount
-        
-        # Update status based on payment amount
-        if payment_link_doc.amount_paid >= total_amount:
-            payment_link_doc.status = 'Paid'
-        elif payment_link_doc.amount_paid > 0:
-            payment_link_doc.status = 'Partially Paid'
-        
-        # Update payment details child table
-        update_payment_details_table(payment_link_doc, payment_link_details)
-        
-        # Save the document
-        payment_link_doc.save()
-        
-        # Log the payment
-        frappe.logger().info(f"Payment link {payment_link_doc.name} updated - Amount Paid: {payment_link_doc.amount_paid}, Status: {payment_link_doc.status}")
-        
-        # Send notification
-        send_payment_notification(payment_link_doc)
-        
-    except Exception as e:
-        frappe.log_error(f"Error handling payment link paid event: {str(e)}")
+
+def handle_payment_link_paid(payment_link_doc, payment_link_entity, payment_entity=None):
+    """Handle payment link paid event.
+
+    The webhook already carries the payment link and payment entities, so
+    Razorpay is only queried when the payload lacks the fields we need.
+    """
+    payment_link_details = payment_link_entity
+    if not has_fields(payment_link_entity, PAYMENT_LINK_WEBHOOK_FIELDS):
+        payment_link_details = fetch_payment_link(payment_link_doc.id)
+    
+    # Update payment link document
+    payment_link_doc.status = payment_link_details.get('status', 'Paid')
+    
+    # Update amount paid
+    amount_paid = payment_link_details.get('amount_paid', 0)
+    if amount_paid:
+        payment_link_doc.amount_paid = amount_paid / 100  # Convert from paise to rupees
+    
+    # Update payment details
+    payment_link_doc.razorpay_payment_id = payment_link_details.get('payment_id') or (payment_entity or {}).get('id')
+    payment_link_doc.razorpay_payment_status = 'Paid'
+    
+    # Calculate remaining amount
+    total_amount = payment_link_doc.amount
+    remaining_amount = max(0, total_amount - payment_link_doc.amount_paid)
+    payment_link_doc.remaining_amount = remaining_amount
+    
+    # Update status based on payment amount
+    if payment_link_doc.amount_paid >= total_amount:
+        payment_link_doc.status = 'Paid'
+    elif payment_link_doc.amount_paid > 0:
+        payment_link_doc.status = 'Partially Paid'
+    
+    # Update payment details child table
+    update_payment_details_table(
+        payment_link_doc,
+        payment_link_details,
+        payment_entities=[payment_entity] if payment_entity else None,
+    )
+    
+    # Save the document
+    payment_link_doc.save()
+    
+    # Log the payment
+    frappe.logger().info(f"Payment link {payment_link_doc.name} updated - Amount Paid: {payment_link_doc.amount_paid}, Status: {payment_link_doc.status}")
+    
+    # Send notification
+    send_payment_notification(payment_link_doc)
 
 
 def handle_payment_link_cancelled(payment_link_doc, payment_link_entity):
     """Handle payment link cancelled event"""
-    try:
-        payment_link_doc.status = 'Cancelled'
-        payment_link_doc.save()
-        
-        frappe.logger().info(f"Payment link {payment_link_doc.name} cancelled")
-        
-    except Exception as e:
-        frappe.log_error(f"Error handling payment link cancelled event: {str(e)}")
+    payment_link_doc.status = 'Cancelled'
+    payment_link_doc.save()
+    
+    frappe.logger().info(f"Payment link {payment_link_doc.name} cancelled")
 
 
 def handle_payment_link_expired(payment_link_doc, payment_link_entity):
     """Handle payment link expired event"""
-    try:
-        payment_link_doc.status = 'Expired'
-        payment_link_doc.save()
-        
-        frappe.logger().info(f"Payment link {payment_link_doc.name} expired")
-        
-    except Exception as e:
-        frappe.log_error(f"Error handling payment link expired event: {str(e)}")
+    payment_link_doc.status = 'Expired'
+    payment_link_doc.save()
+    
+    frappe.logger().info(f"Payment link {payment_link_doc.name} expired")
 
 
 def send_payment_notification(payment_link_doc):
@@ -179,58 +203,26 @@ def send_payment_notification(payment_link_doc):
 def sync_payment_link_status(payment_link_name: str):
     """Manually sync payment link status from Razorpay"""
     try:
-        payment_link_doc = frappe.get_doc("Razorpay Payment Link", payment_link_name)
-        
-        # Fetch latest details from Razorpay
-        client = get_razorpay_client()
-        payment_link_details = client.payment_link.fetch(payment_link_doc.id)
-        
-        # Update status based on Razorpay status
-        razorpay_status = payment_link_details.get('status', 'created')
-        if razorpay_status == 'paid':
-            payment_link_doc.status = 'Paid'
-        elif razorpay_status == 'cancelled':
-            payment_link_doc.status = 'Cancelled'
-        elif razorpay_status == 'expired':
-            payment_link_doc.status = 'Expired'
-        else:
-            payment_link_doc.status = 'Created'
-        
-        # Update amount paid
-        amount_paid = payment_link_details.get('amount_paid', 0)
-        if amount_paid:
-            payment_link_doc.amount_paid = amount_paid / 100
-        
-        # Update payment details
-        payment_link_doc.razorpay_payment_id = payment_link_details.get('payment_id')
-        
-        # Calculate remaining amount
-        total_amount = payment_link_doc.amount
-        remaining_amount = max(0, total_amount - payment_link_doc.amount_paid)
-        payment_link_doc.remaining_amount = remaining_amount
-        
-        # Update payment status
-        if payment_link_doc.amount_paid >= total_amount:
-            payment_link_doc.razorpay_payment_status = 'Paid'
-        elif payment_link_doc.amount_paid > 0:
-            payment_link_doc.razorpay_payment_status = 'Partially Paid'
-        else:
-            payment_link_doc.razorpay_payment_status = 'Pending'
+        local_link = frappe.db.get_value(
+            "Razorpay Payment Link", payment_link_name, LINK_SYNC_FIELDS, as_dict=True
+        )
         
-        # Update payment details child table
-        update_payment_details_table(payment_link_doc, payment_link_details)
+        # Fetch latest details from Razorpay (and refresh the cached copy)
+        payment_link_details = fetch_payment_link(local_link.id, refresh=True)
         
-        # Save the document
-        payment_link_doc.save()
+        # Only write when Razorpay disagrees with the stored status
+        if has_changed(local_link, payment_link_details):
+            write_changed_links([(local_link, payment_link_details)])
+            local_link.update(get_status_values(local_link, payment_link_details))
         
         return {
             "success": True,
-            "status": payment_link_doc.status,
-            "amount_paid": payment_link_doc.amount_paid,
-            "total_amount": payment_link_doc.amount,
-            "remaining_amount": payment_link_doc.remaining_amount,
-            "razorpay_status": razorpay_status,
-            "payment_id": payment_link_doc.razorpay_payment_id
+            "status": local_link.status,
+            "amount_paid": local_link.amount_paid,
+            "total_amount": local_link.amount,
+            "remaining_amount": local_link.remaining_amount,
+            "razorpay_status": payment_link_details.get('status'),
+            "payment_id": local_link.razorpay_payment_id
         }
         
     except Exception as e:
@@ -238,97 +230,152 @@ def sync_payment_link_status(payment_link_name: str):
         return {"success": False, "error": str(e)}
 
 
-def update_payment_details_table(payment_link_doc, payment_link_details):
-    """Update the payment_details by creating separate payment detail documents."""
+def update_payment_details_table(payment_link_doc, payment_link_details, payment_entities=None):
+    """Update the payment_details by creating separate payment detail documents.
+
+    `payment_entities` are full payment entities (e.g. from a webhook) and take
+    precedence over the summaries in `payment_link_details['payments']`. A
+    payment is only fetched from Razorpay when neither has the fields we store.
+    """
     try:
-        # Get payments from Razorpay response
-        payments = payment_link_details.get('payments', [])
-        
-        for payment in payments:
-            try:
-                # Check if payment detail already exists
-                existing_payment = frappe.db.exists("Razorpay Payment Detail", {"payment_id": payment['payment_id']})
-                
-                if existing_payment:
-                    # Update existing payment detail
-                    payment_detail_doc = frappe.get_doc("Razorpay Payment Detail", existing_payment)
-                else:
-                    # Create new payment detail
-                    payment_detail_doc = frappe.new_doc("Razorpay Payment Detail")
-                
-                # Get detailed payment information from Razorpay
-                client = get_razorpay_client()
-                payment_info = client.payment.fetch(payment['payment_id'])
-                
-                # Update payment detail fields
-                payment_detail_doc.payment_id = payment['payment_id']
-                payment_detail_doc.amount = payment_info.get('amount', 0) / 100  # Convert from paise to rupees
-                payment_detail_doc.currency = payment_info.get('currency', 'INR')
-                payment_detail_doc.status = payment_info.get('status', 'created')
-                payment_detail_doc.method = payment_info.get('method', '')
-                payment_detail_doc.created_at = frappe.utils.get_datetime(payment_info.get('created_at'))
-                payment_detail_doc.payment_link = payment_link_doc.name
-                payment_detail_doc.customer = payment_link_doc.customer
-                payment_detail_doc.quotation = payment_link_doc.quotation
-                
-                # Save the payment detail
-                payment_detail_doc.save()
-                
-            except Exception as e:
-                frappe.log_error(f"Error processing payment {payment['payment_id']}: {str(e)}")
-                # Add basic payment info if detailed fetch fails
-                try:
-                    existing_payment = frappe.db.exists("Razorpay Payment Detail", {"payment_id": payment['payment_id']})
-                    
-                    if existing_payment:
-                        payment_detail_doc = frappe.get_doc("Razorpay Payment Detail", existing_payment)
-                    else:
-                        payment_detail_doc = frappe.new_doc("Razorpay Payment Detail")
-                    
-                    payment_detail_doc.payment_id = payment['payment_id']
-                    payment_detail_doc.amount = payment.get('amount', 0) / 100
-                    payment_detail_doc.currency = payment_link_details.get('currency', 'INR')
-                    payment_detail_doc.status = payment.get('status', 'created')
-                    payment_detail_doc.method = payment.get('method', '')
-                    payment_detail_doc.created_at = frappe.utils.get_datetime(payment.get('created_at'))
-                    payment_detail_doc.payment_link = payment_link_doc.name
-                    payment_detail_doc.customer = payment_link_doc.customer
-                    payment_detail_doc.quotation = payment_link_doc.quotation
-                    
-                    payment_detail_doc.save()
-                    
-                except Exception as fallback_error:
-                    frappe.log_error(f"Error in fallback payment processing {payment['payment_id']}: {str(fallback_error)}")
-        
+        upsert_payment_details(
+            get_payment_details(payment_link_doc, payment_link_details, payment_entities)
+        )
     except Exception as e:
         frappe.log_error(f"Error updating payment details: {str(e)}")
 
 
-@frappe.whitelist()
-def sync_all_payment_links():
-    """Sync all payment links from Razorpay"""
-    try:
-        # Get all payment links
-        payment_links = frappe.get_all("Razorpay Payment Link", fields=["name", "id"])
-        
-        results = []
-        for pl in payment_links:
+def get_payment_details(payment_link_doc, payment_link_details, payment_entities=None):
+    """Razorpay Payment Detail values of the link's payments, by payment_id."""
+    # Payments from the webhook first, then the ones listed on the link
+    payments = {}
+    for payment in (payment_entities or []) + (payment_link_details.get('payments') or []):
+        payment_id = payment.get('payment_id') or payment.get('id')
+        if payment_id and payment_id not in payments:
+            payments[payment_id] = payment
+    
+    payment_details = {}
+    for payment_id, payment in payments.items():
+        payment_info = payment
+        if not has_fields(payment, PAYMENT_DETAIL_FIELDS):
             try:
-                result = sync_payment_link_status(pl.name)
-                results.append({
-                    "payment_link": pl.name,
-                    "result": result
-                })
+                # Get detailed payment information (cached) from Razorpay
+                payment_info = fetch_payment(payment_id)
             except Exception as e:
-                results.append({
-                    "payment_link": pl.name,
-                    "result": {"success": False, "error": str(e)}
-                })
-        
+                # Store the basic payment info if the detailed fetch fails
+                frappe.log_error(f"Error fetching payment {payment_id}: {str(e)}")
+        
+        amount = (payment_info.get('amount') or 0) / 100  # Convert from paise to rupees
+        if amount <= 0:
+            frappe.log_error(f"Error processing payment {payment_id}: Amount must be greater than 0")
+            continue
+        
+        payment_details[payment_id] = {
+            "amount": amount,
+            "currency": payment_info.get('currency') or payment_link_details.get('currency') or 'INR',
+            "status": payment_info.get('status', 'created'),
+            "method": payment_info.get('method', ''),
+            "created_at": frappe.utils.get_datetime(payment_info.get('created_at')),
+            "payment_link": payment_link_doc.name,
+            "customer": payment_link_doc.customer,
+            "quotation": payment_link_doc.quotation,
+        }
+    
+    return payment_details
+
+
+def upsert_payment_details(payment_details):
+    """Write Razorpay Payment Details, given as values by payment_id, in bulk.
+
+    The existing rows are read in one query. New payments are inserted with a
+    single multi-row INSERT and changed ones updated with one bulk UPDATE;
+    rows are not loaded or saved as documents.
+    """
+    if not payment_details:
+        return
+    
+    existing = get_existing_payment_details(list(payment_details))
+    new_payment_ids = [payment_id for payment_id in payment_details if payment_id not in existing]
+    if new_payment_ids:
+        insert_payment_details({payment_id: payment_details[payment_id] for payment_id in new_payment_ids})
+        # payment_id is unique: a payment a concurrent webhook inserted first was
+        # skipped as a duplicate, and is updated below if its values differ
+        existing.update(get_existing_payment_details(new_payment_ids))
+    
+    changed = {
+        existing[payment_id].name: {
+            field: value for field, value in values.items() if field != 'created_at'
+        }
+        for payment_id, values in payment_details.items()
+        if is_payment_detail_changed(existing[payment_id], values)
+    }
+    if changed:
+        frappe.db.bulk_update("Razorpay Payment Detail", changed)
+
+
+def get_existing_payment_details(payment_ids):
+    return {
+        row.payment_id: row
+        for row in frappe.get_all(
+            "Razorpay Payment Detail",
+            filters={"payment_id": ("in", payment_ids)},
+            fields=["name", "payment_id", *PAYMENT_DETAIL_COLUMNS],
+        )
+    }
+
+
+def insert_payment_details(payment_details):
+    """Insert new Razorpay Payment Details, skipping payments that exist."""
+    now = frappe.utils.now_datetime()
+    user = frappe.session.user
+    columns = [*PAYMENT_DETAIL_COLUMNS, "created_at"]
+    frappe.db.bulk_insert(
+        "Razorpay Payment Detail",
+        ["name", "owner", "modified_by", "creation", "modified", "payment_id", *columns],
+        [
+            # named after the payment, like RazorpayPaymentDetail.autoname
+            (payment_id, user, user, now, now, payment_id, *(values[column] for column in columns))
+            for payment_id, values in payment_details.items()
+        ],
+        ignore_duplicates=True,
+    )
+
+
+def is_payment_detail_changed(row, values):
+    """Whether a stored Razorpay Payment Detail differs from `values`. The
+    payment's creation time never changes and is only written on insert."""
+    if frappe.utils.flt(row.amount) != frappe.utils.flt(values['amount']):
+        return True
+    return any(
+        (row[field] or None) != (values[field] or None)
+        for field in PAYMENT_DETAIL_COLUMNS
+        if field != 'amount'
+    )
+
+
+def has_fields(entity, fields):
+    """Check that an API/webhook entity carries all of `fields`."""
+    return bool(entity) and all(entity.get(field) is not None for field in fields)
+
+
+@frappe.whitelist()
+def sync_all_payment_links(full_resync: bool = False):
+    """Start a background sync of the payment links that changed on Razorpay.
+
+    Pages through the links created since the last sync's watermark, see
+    `razorpay_frappe.payment_link_sync`; `full_resync` goes through every
+    link. Progress is published to the caller over the
+    `razorpay_payment_link_sync` realtime event. A full resync requested
+    while a sync is queued or running follows it.
+    """
+    try:
+        job = enqueue_payment_link_sync(
+            full=frappe.utils.sbool(full_resync), user=frappe.session.user
+        )
         return {
             "success": True,
-            "results": results,
-            "total": len(payment_links)
+            # None: a sync is already queued
+            "job_id": job.id if job else None
         }
         
     except Exception as e:
@@ -345,16 +392,15 @@ def get_payment_link_details(payment_link_name: str):
         # Use the correct payment link ID
         payment_link_id = payment_link_doc.id
         
-        # Fetch latest details from Razorpay
-        client = get_razorpay_client()
-        payment_link_details = client.payment_link.fetch(payment_link_id)
+        # Fetch details from Razorpay; cached until a webhook changes them
+        payment_link_details = fetch_payment_link(payment_link_id)
         
         # Get payment details if available
         payments = []
         if payment_link_details.get('payments'):
             for payment in payment_link_details['payments']:
                 try:
-                    payment_info = client.payment.fetch(payment['payment_id'])
+                    payment_info = fetch_payment(payment['payment_id'])
                     payments.append({
                         "payment_id": payment['payment_id'],
                         "amount": payment_info.get('amount', 0) / 100,
@@ -396,8 +442,13 @@ def get_payment_link_details(payment_link_name: str):
 def get_payment_details_for_link(payment_link_name: str):
     """Get all payment details for a specific payment link."""
     try:
-        # Get payment link document
-        payment_link_doc = frappe.get_doc("Razorpay Payment Link", payment_link_name)
+        summaries = get_payment_link_summary_rows([payment_link_name])
+        if not summaries:
+            frappe.throw(
+                _("Razorpay Payment Link {0} not found").format(payment_link_name),
+                frappe.DoesNotExistError,
+            )
+        summary = summaries[0]
         
         # Get all payment details for this payment link
         payment_details = frappe.get_all(
@@ -407,30 +458,92 @@ def get_payment_details_for_link(payment_link_name: str):
             order_by="created_at desc"
         )
         
-        # Calculate totals
-        total_paid = sum(pd['amount'] for pd in payment_details if pd['status'] == 'captured')
-        total_payments = len(payment_details)
-        
         return {
             "success": True,
             "payment_link": {
-                "name": payment_link_doc.name,
-                "status": payment_link_doc.status,
-                "amount": payment_link_doc.amount,
-                "amount_paid": payment_link_doc.amount_paid,
-                "remaining_amount": payment_link_doc.amount - total_paid,
-                "currency": payment_link_doc.currency,
-                "customer": payment_link_doc.customer,
-                "quotation": payment_link_doc.quotation
+                "name": summary.name,
+                "status": summary.status,
+                "amount": summary.amount,
+                "amount_paid": summary.amount_paid,
+                "remaining_amount": summary.remaining_amount,
+                "currency": summary.currency,
+                "customer": summary.customer,
+                "quotation": summary.quotation
             },
             "payment_details": payment_details,
             "summary": {
-                "total_payments": total_payments,
-                "total_paid": total_paid,
-                "remaining_amount": payment_link_doc.amount - total_paid
+                "total_payments": summary.total_payments,
+                "captured_payments": summary.captured_payments,
+                "total_paid": summary.total_paid,
+                "remaining_amount": summary.remaining_amount
             }
         }
         
     except Exception as e:
         frappe.log_error(f"Error getting payment details for link: {str(e)}")
-        return {"success": False, "error": str(e)} 
\ No newline at end of file
+        return {"success": False, "error": str(e)}
+
+
+@frappe.whitelist()
+def get_payment_link_summaries(payment_link_names):
+    """Get the payment totals of many payment links at once, e.g. for a page
+    of a list view, keyed by payment link name.
+
+    `payment_link_names` is a list of names or its JSON. Links that don't
+    exist or the user may not read are left out.
+    """
+    frappe.has_permission("Razorpay Payment Link", "read", throw=True)
+    payment_link_names = frappe.parse_json(payment_link_names) or []
+    if payment_link_names:
+        # applies user permissions and permission query conditions
+        payment_link_names = frappe.get_list(
+            "Razorpay Payment Link",
+            filters={"name": ("in", payment_link_names)},
+            pluck="name",
+        )
+
+    try:
+        return {
+            "success": True,
+            "summaries": {
+                summary.name: summary
+                for summary in get_payment_link_summary_rows(payment_link_names)
+            }
+        }
+        
+    except Exception as e:
+        frappe.log_error(f"Error getting payment link summaries: {str(e)}")
+        return {"success": False, "error": str(e)}
+
+
+def get_payment_link_summary_rows(payment_link_names):
+    """Payment links with their payment count, captured count, amount paid
+    and remaining amount, aggregated in one grouped query."""
+    if not payment_link_names:
+        return []
+    
+    PaymentLink = frappe.qb.DocType("Razorpay Payment Link")
+    PaymentDetail = frappe.qb.DocType("Razorpay Payment Detail")
+    is_captured = PaymentDetail.status == 'captured'
+    total_paid = IfNull(Sum(Case().when(is_captured, PaymentDetail.amount)), 0)
+    
+    return (
+        frappe.qb.from_(PaymentLink)
+        .left_join(PaymentDetail)
+        .on(PaymentDetail.payment_link == PaymentLink.name)
+        .select(
+            PaymentLink.name,
+            PaymentLink.status,
+            PaymentLink.amount,
+            PaymentLink.amount_paid,
+            PaymentLink.currency,
+            PaymentLink.customer,
+            PaymentLink.quotation,
+            Count(PaymentDetail.name).as_("total_payments"),
+            Count(Case().when(is_captured, 1)).as_("captured_payments"),
+            total_paid.as_("total_paid"),
+            (PaymentLink.amount - total_paid).as_("remaining_amount"),
+        )
+        .where(PaymentLink.name.isin(payment_link_names))
+        .groupby(PaymentLink.name)
+    ).run(as_dict=True)
@@ -1,4 +1,6 @@
+from collections import OrderedDict
 from enum import StrEnum
+from threading import Lock
 from typing import TYPE_CHECKING
 
 import frappe
@@ -30,10 +32,81 @@ class RazorpaySubscriptionWebhookEvents(StrEnum):
 	SubscriptionResumed = "subscription.resumed"
 
 
-SUPPORTED_WEBHOOK_EVENTS = set(RazorpayPaymentWebhookEvents).union(
-	RazorpaySubscriptionWebhookEvents
+class RazorpayPaymentLinkWebhookEvents(StrEnum):
+	PaymentLinkPaid = "payment_link.paid"
+	PaymentLinkCancelled = "payment_link.cancelled"
+	PaymentLinkExpired = "payment_link.expired"
+
+
+PAYMENT_EVENTS = frozenset(RazorpayPaymentWebhookEvents)
+SUBSCRIPTION_EVENTS = frozenset(RazorpaySubscriptionWebhookEvents)
+PAYMENT_LINK_EVENTS = frozenset(RazorpayPaymentLinkWebhookEvents)
+
+SUPPORTED_WEBHOOK_EVENTS = (
+	PAYMENT_EVENTS | SUBSCRIPTION_EVENTS | PAYMENT_LINK_EVENTS
 )
 
+# event -> WebhookProcessor method applying it
+EVENT_HANDLERS = {
+	**dict.fromkeys(SUBSCRIPTION_EVENTS, "process_subscription_event"),
+	**dict.fromkeys(PAYMENT_LINK_EVENTS, "process_payment_link_event"),
+	**dict.fromkeys(PAYMENT_EVENTS, "process_standalone_order"),
+}
+
+ORDER_NAME_CACHE_SIZE = 1024
+
+
+class OrderNameCache:
+	"""Process-local LRU of (site, Razorpay order_id) -> Razorpay Order name.
+
+	Only hits are cached: an order that is not found yet may be created later.
+	"""
+
+	def __init__(self, maxsize: int = ORDER_NAME_CACHE_SIZE):
+		self.maxsize = maxsize
+		self._names = OrderedDict()
+		self._lock = Lock()
+
+	def get(self, order_id: str) -> str | None:
+		key = (frappe.local.site, order_id)
+		with self._lock:
+			name = self._names.get(key)
+			if name is not None:
+				self._names.move_to_end(key)
+			return name
+
+	def set(self, order_id: str, name: str):
+		key = (frappe.local.site, order_id)
+		with self._lock:
+			self._names[key] = name
+			self._names.move_to_end(key)
+			if len(self._names) > self.maxsize:
+				self._names.popitem(last=False)
+
+	def evict(self, order_id: str):
+		with self._lock:
+			self._names.pop((frappe.local.site, order_id), None)
+
+
+order_name_cache = OrderNameCache()
+
+
+def resolve_order_name(order_id: str | None) -> str | None:
+	"""Name of the Razorpay Order for `order_id`, via one lookup on the
+	unique order_id index (or none on an LRU hit)."""
+	if not order_id:
+		return None
+
+	name = order_name_cache.get(order_id)
+	if name is None:
+		name = frappe.db.get_value(
+			"Razorpay Order", {"order_id": order_id}, "name"
+		)
+		if name is not None:
+			order_name_cache.set(order_id, name)
+
+	return name
+
 
 class WebhookProcessor:
 	def __init__(self, event: str, payload: dict):
@@ -48,10 +121,7 @@ class WebhookProcessor:
 		if not self.should_process():
 			return
 
-		if self.is_subscription_event:
-			self.process_subscription_event()
-		elif self.is_standalone_order:
-			self.process_standalone_order()
+		getattr(self, EVENT_HANDLERS[self.event])()
 
 	def should_process(self) -> bool:
 		return self.is_supported_event
@@ -69,18 +139,54 @@ class WebhookProcessor:
 
 	@property
 	def is_subscription_event(self) -> bool:
-		return self.event in set(RazorpaySubscriptionWebhookEvents)
+		return self.event in SUBSCRIPTION_EVENTS
+
+	def process_payment_link_event(self):
+		from razorpay_frappe.webhook_handler import handle_payment_link_webhook
+
+		handle_payment_link_webhook(self.event, self.payload)
+
+	@property
+	def is_payment_link_event(self) -> bool:
+		return self.event in PAYMENT_LINK_EVENTS
 
 	def process_standalone_order(self):
-		order_doc: "RazorpayOrder" = frappe.get_doc(
-			"Razorpay Order", {"order_id": self.get_payment_order_id()}
-		)
+		order_id = self.get_payment_order_id()
+		order_name = resolve_order_name(order_id)
+		if not order_name:
+			return
+
+		try:
+			order_doc: "RazorpayOrder" = frappe.get_doc(
+				"Razorpay Order", order_name
+			)
+		except frappe.DoesNotExistError:
+			# cached name went stale (order deleted or renamed)
+			order_name_cache.evict(order_id)
+			if not (order_name := resolve_order_name(order_id)):
+				return
+			order_doc = frappe.get_doc("Razorpay Order", order_name)
+
 		order_doc.handle_webhook_event(self.event, self.payload)
 
 	@property
 	def is_standalone_order(self) -> bool:
-		order_id = self.get_payment_order_id()
-		return frappe.db.exists("Razorpay Order", {"order_id": order_id})
+		return bool(resolve_order_name(self.get_payment_order_id()))
+
+	def get_entity_id(self) -> str | None:
+		"""Id of the entity this event mutates; events sharing it must be
+		applied in order."""
+		if self.is_subscription_event:
+			return self.get_subscription_id()
+		if self.is_payment_link_event:
+			return self.get_payment_link_id()
+		if self.payload.get("payment"):
+			payment_entity = self.payload["payment"].get("entity", {})
+			return payment_entity.get("order_id") or payment_entity.get("id")
+
+	def get_payment_link_id(self) -> str:
+		if self.payload.get("payment_link"):
+			return self.payload.get("payment_link").get("entity", {}).get("id")
 
 	def get_payment_order_id(self) -> str:
 		if self.payload.get("payment"):
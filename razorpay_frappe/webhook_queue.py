@@ -0,0 +1,237 @@
+import zlib
+
+import frappe
+from pypika.terms import ExistsCriterion
+
+from razorpay_frappe.webhook_dedup import (
+	claim_webhook_event,
+	get_event_id,
+	release_webhook_event,
+)
+from razorpay_frappe.webhook_processor import WebhookProcessor
+from razorpay_frappe.webhook_storage import encode_payload, get_event_created_at
+
+DEFAULT_WEBHOOK_QUEUE = "long"
+DEFAULT_WEBHOOK_PARTITIONS = 4
+DRAIN_BATCH_SIZE = 100
+WEBHOOK_LOG_STATUSES = (
+	"Queued",
+	"Processing",
+	"Replaying",
+	"Processed",
+	"Failed",
+	"Dead Letter",
+)
+# an entity's logs wait while an earlier one of them is in these statuses
+HOLDING_STATUSES = ("Failed", "Replaying")
+
+
+def record_webhook_event(payload: dict, event_id: str | None = None):
+	"""Persist a verified webhook as a `Razorpay Webhook Log`.
+
+	Submitting the log applies the event, either inline or from the
+	background queue depending on Razorpay Settings. Redelivered events are
+	dropped before anything is loaded and `None` is returned for them.
+	"""
+	event_id = get_event_id(payload, event_id)
+	if not claim_webhook_event(event_id):
+		return None
+
+	current_user = frappe.session.user
+	frappe.set_user("Administrator")
+
+	try:
+		log = frappe.get_doc(
+			{
+				"doctype": "Razorpay Webhook Log",
+				"event": payload.get("event"),
+				"event_id": event_id,
+				"entity_id": WebhookProcessor(
+					payload.get("event"), payload
+				).get_entity_id(),
+				"event_created_at": get_event_created_at(payload),
+				"payload": encode_payload(payload),
+				# inserting as submitted runs on_submit without a second write
+				"docstatus": 1,
+			}
+		)
+		log.insert()
+	except (frappe.UniqueValidationError, frappe.DuplicateEntryError):
+		# seen-set expired but the unique index still knows this event
+		return None
+	except Exception:
+		release_webhook_event(event_id)
+		raise
+	finally:
+		frappe.set_user(current_user)
+
+	return log
+
+
+def is_background_processing_enabled() -> bool:
+	return bool(
+		frappe.db.get_single_value(
+			"Razorpay Settings", "process_webhooks_in_background"
+		)
+	)
+
+
+def get_webhook_queue() -> str:
+	return (
+		frappe.db.get_single_value("Razorpay Settings", "webhook_queue")
+		or DEFAULT_WEBHOOK_QUEUE
+	)
+
+
+def get_webhook_partitions() -> int:
+	return max(
+		frappe.db.get_single_value("Razorpay Settings", "webhook_partitions")
+		or DEFAULT_WEBHOOK_PARTITIONS,
+		1,
+	)
+
+
+def get_partition(entity_id: str | None, partitions: int | None = None) -> int:
+	"""Stable shard for an entity so its events are always applied in order."""
+	if not entity_id:
+		return 0
+
+	partitions = partitions or get_webhook_partitions()
+	return zlib.crc32(entity_id.encode()) % partitions
+
+
+def enqueue_webhook_partition(partition: int):
+	"""Start the drain job of a partition unless it is already queued/running.
+
+	One job per partition at a time is what keeps events of an entity in
+	order; different partitions are drained by the workers in parallel.
+	"""
+	frappe.enqueue(
+		"razorpay_frappe.webhook_queue.drain_webhook_partition",
+		queue=get_webhook_queue(),
+		job_id=f"razorpay_webhook_partition_{partition}",
+		deduplicate=True,
+		partition=partition,
+		enqueue_after_commit=True,
+		now=frappe.flags.in_test,
+	)
+
+
+def drain_webhook_partition(partition: int):
+	"""Background job: apply pending logs of a partition in arrival order.
+
+	Logs of an entity with an earlier Failed log are held back until that
+	log's retry is due; the retry re-drains the partition, applying it
+	first. The same goes for a log being replayed, see `webhook_replay`.
+	"""
+	while True:
+		pending_logs = get_drainable_logs(partition)
+		if not pending_logs:
+			break
+
+		held_back = set()
+		for log in pending_logs:
+			if log.entity_id and log.entity_id in held_back:
+				continue
+			if process_webhook_log(log.name) == "Failed":
+				held_back.add(log.entity_id)
+
+
+def get_drainable_logs(partition: int) -> list[dict]:
+	"""The oldest pending logs of a partition whose entity has no earlier
+	log in `HOLDING_STATUSES`."""
+	WebhookLog = frappe.qb.DocType("Razorpay Webhook Log").as_("webhook_log")
+	HoldingLog = frappe.qb.DocType("Razorpay Webhook Log").as_("holding_log")
+	earlier_holding_log = (
+		frappe.qb.from_(HoldingLog)
+		.select(HoldingLog.name)
+		.where(HoldingLog.webhook_partition == WebhookLog.webhook_partition)
+		.where(HoldingLog.entity_id == WebhookLog.entity_id)
+		.where(HoldingLog.status.isin(HOLDING_STATUSES))
+		.where(HoldingLog.creation < WebhookLog.creation)
+	)
+	return (
+		frappe.qb.from_(WebhookLog)
+		.select(WebhookLog.name, WebhookLog.entity_id)
+		.where(WebhookLog.docstatus == 1)
+		.where(WebhookLog.webhook_partition == partition)
+		# logs left in Processing belong to a worker that died
+		.where(WebhookLog.status.isin(("Queued", "Processing")))
+		.where(ExistsCriterion(earlier_holding_log).negate())
+		.orderby(WebhookLog.creation)
+		.limit(DRAIN_BATCH_SIZE)
+	).run(as_dict=True)
+
+
+def requeue_pending_webhook_partitions():
+	"""Scheduled: restart drains for partitions that still have a backlog,
+	e.g. when a log was committed while its partition's job was finishing."""
+	if not is_background_processing_enabled():
+		return
+
+	partitions = frappe.get_all(
+		"Razorpay Webhook Log",
+		filters={"docstatus": 1, "status": "Queued"},
+		distinct=True,
+		pluck="webhook_partition",
+	)
+	for partition in partitions:
+		enqueue_webhook_partition(partition or 0)
+
+
+def process_webhook_log(log_name: str) -> str:
+	"""Background job: apply a single stored webhook event. Returns the
+	log's new status."""
+	log = frappe.get_doc("Razorpay Webhook Log", log_name)
+	if log.status == "Processed":
+		return log.status
+
+	log.db_set("status", "Processing", commit=True)
+	return apply_webhook_log(log)
+
+
+def apply_webhook_log(log) -> str:
+	"""Apply a log marked Processing and record the outcome, committed."""
+	try:
+		log.process()
+	except Exception:
+		from razorpay_frappe.webhook_retry import schedule_webhook_retry
+
+		error = frappe.get_traceback()
+		frappe.db.rollback()
+		schedule_webhook_retry(log, error)
+		frappe.db.commit()
+		return log.status
+
+	log.db_set(
+		{"status": "Processed", "error": None, "next_retry_at": None},
+		commit=True,
+	)
+	return log.status
+
+
+@frappe.whitelist()
+def get_webhook_backlog() -> dict:
+	"""Webhook logs per status, plus the pending job count of the queue."""
+	frappe.only_for("System Manager")
+
+	counts = dict.fromkeys(WEBHOOK_LOG_STATUSES, 0)
+	for row in frappe.get_all(
+		"Razorpay Webhook Log",
+		filters={"docstatus": 1},
+		fields=["status", "count(name) as count"],
+		group_by="status",
+	):
+		counts[row.status or "Queued"] = row.count
+
+	queue = get_webhook_queue()
+	pending_jobs = None
+	try:
+		from frappe.utils.background_jobs import get_queue
+
+		pending_jobs = get_queue(queue).count
+	except Exception:
+		# queue is not declared on this bench
+		pass
+
+	return {"queue": queue, "pending_jobs": pending_jobs, "logs": counts}
@@ -0,0 +1,272 @@
+import time
+
+import frappe
+from frappe.utils import add_to_date, get_datetime, now_datetime
+
+from razorpay_frappe.webhook_processor import WebhookProcessor
+from razorpay_frappe.webhook_queue import (
+	HOLDING_STATUSES,
+	apply_webhook_log,
+	enqueue_webhook_partition,
+	get_partition,
+	get_webhook_partitions,
+)
+from razorpay_frappe.webhook_storage import decode_payload
+
+REPLAY_CHUNK_SIZE = 500
+# a log Replaying for longer belongs to a replay job that died
+REPLAY_CLAIM_TIMEOUT = 60 * 60  # seconds
+REPLAY_REALTIME_EVENT = "razorpay_webhook_replay"
+MAX_REPORTED_FAILURES = 100
+
+
+@frappe.whitelist()
+def replay_webhook_logs(
+	from_date: str | None = None,
+	to_date: str | None = None,
+	events: list | str | None = None,
+	include_processed: int = 0,
+	chunk_size: int = REPLAY_CHUNK_SIZE,
+) -> dict:
+	"""Re-apply stored webhook logs in the background.
+
+	Progress and the final report are published to the caller over the
+	`razorpay_webhook_replay` realtime event.
+	"""
+	frappe.only_for("System Manager")
+
+	job = frappe.enqueue(
+		"razorpay_frappe.webhook_replay.run_webhook_replay",
+		queue="long",
+		timeout=6 * 60 * 60,
+		from_date=from_date,
+		to_date=to_date,
+		events=events,
+		include_processed=include_processed,
+		chunk_size=chunk_size,
+		user=frappe.session.user,
+	)
+	return {"job_id": job.id if job else None}
+
+
+def run_webhook_replay(
+	from_date: str | None = None,
+	to_date: str | None = None,
+	events: list | str | None = None,
+	include_processed: int = 0,
+	chunk_size: int = REPLAY_CHUNK_SIZE,
+	user: str | None = None,
+) -> dict:
+	"""Stream matching logs in chunks and apply them one by one in creation
+	order, so events of an entity keep their order.
+
+	Logs already marked Processed are skipped unless `include_processed` is
+	set. A log is claimed as Replaying while it is applied: partition
+	drains skip it and hold back the later logs of its entity. Logs a drain
+	owns (Queued or Processing), logs another replay has claimed and logs
+	behind an earlier pending log of their entity are left alone and
+	reported as pending. After each chunk the partitions of the replayed
+	logs are drained, applying the logs held back meanwhile.
+
+	Logs are applied by this job rather than fanned out to the partition
+	drains: the report needs their outcome, and waiting on drains would
+	hold a worker of the queue they run on.
+	"""
+	if isinstance(events, str):
+		events = (
+			frappe.parse_json(events) if events.startswith("[") else [events]
+		)
+
+	WebhookLog = frappe.qb.DocType("Razorpay Webhook Log")
+	query = (
+		frappe.qb.from_(WebhookLog)
+		.select(
+			WebhookLog.name,
+			WebhookLog.creation,
+			WebhookLog.event,
+			WebhookLog.entity_id,
+		)
+		.where(WebhookLog.docstatus == 1)
+		.orderby(WebhookLog.creation)
+		.orderby(WebhookLog.name)
+		.limit(chunk_size)
+	)
+	if from_date:
+		query = query.where(WebhookLog.creation >= get_datetime(from_date))
+	if to_date:
+		query = query.where(WebhookLog.creation <= get_datetime(to_date))
+	if events:
+		query = query.where(WebhookLog.event.isin(events))
+	if not frappe.utils.cint(include_processed):
+		query = query.where(WebhookLog.status != "Processed")
+
+	report = {
+		"total": 0,
+		"processed": 0,
+		"failed": 0,
+		"pending": 0,
+		"failed_logs": [],
+	}
+	started_at = time.monotonic()
+	partitions = get_webhook_partitions()
+
+	chunk_query = query
+	while True:
+		logs = chunk_query.run(as_dict=True)
+		if not logs:
+			break
+
+		replayed_partitions = set()
+		for log in logs:
+			report["total"] += 1
+			status, partition = replay_log(log, partitions)
+			if partition is not None:
+				replayed_partitions.add(partition)
+			if status == "Processed":
+				report["processed"] += 1
+			elif status in ("Failed", "Dead Letter"):
+				report["failed"] += 1
+				if len(report["failed_logs"]) < MAX_REPORTED_FAILURES:
+					report["failed_logs"].append(log.name)
+			else:
+				report["pending"] += 1
+
+		for partition in sorted(replayed_partitions):
+			enqueue_webhook_partition(partition)
+		frappe.db.commit()
+
+		publish_replay_progress(report, started_at, user)
+		if len(logs) < chunk_size:
+			break
+
+		# keyset pagination: stable even while rows change status, and
+		# past any number of logs created in the same instant
+		last = logs[-1]
+		chunk_query = query.where(
+			(WebhookLog.creation > last.creation)
+			| (
+				(WebhookLog.creation == last.creation)
+				& (WebhookLog.name > last.name)
+			)
+		)
+
+	report.update(get_throughput(report["total"], started_at))
+	publish_replay_progress(report, started_at, user, done=True)
+	frappe.logger().info(f"Razorpay webhook replay finished: {report}")
+	return report
+
+
+def replay_log(log: dict, partitions: int) -> tuple[str | None, int | None]:
+	"""Claim a log and apply it. Returns its new status and partition, or
+	None and None when it is left alone."""
+	status = frappe.db.get_value(
+		"Razorpay Webhook Log", log.name, "status", for_update=True
+	)
+	if status in ("Queued", "Processing", "Replaying") or (
+		log.entity_id and has_pending_predecessor(log)
+	):
+		frappe.db.commit()
+		return None, None
+
+	entity_id = log.entity_id
+	if not entity_id:
+		# logs stored before partitioning was introduced
+		payload = frappe.db.get_value(
+			"Razorpay Webhook Log", log.name, "payload"
+		)
+		entity_id = WebhookProcessor(
+			log.event, decode_payload(payload)
+		).get_entity_id()
+
+	partition = get_partition(entity_id, partitions)
+	# `modified` dates the claim, see `release_stale_replay_claims`
+	frappe.db.set_value(
+		"Razorpay Webhook Log",
+		log.name,
+		{
+			"status": "Replaying",
+			"error": None,
+			"entity_id": entity_id,
+			"webhook_partition": partition,
+		},
+	)
+	frappe.db.commit()
+
+	log = frappe.get_doc("Razorpay Webhook Log", log.name)
+	return apply_webhook_log(log), partition
+
+
+def has_pending_predecessor(log: dict) -> bool:
+	"""Whether an earlier log of the entity is still to be applied; it
+	goes first, by its drain or retry."""
+	return bool(
+		frappe.db.exists(
+			"Razorpay Webhook Log",
+			{
+				"entity_id": log.entity_id,
+				"docstatus": 1,
+				"status": ("in", ("Queued", "Processing", *HOLDING_STATUSES)),
+				"creation": ("<", log.creation),
+			},
+		)
+	)
+
+
+def release_stale_replay_claims():
+	"""Scheduled: send logs left Replaying by a replay job that died back
+	through their partition, so their entities are no longer held back."""
+	filters = {
+		"docstatus": 1,
+		"status": "Replaying",
+		"modified": (
+			"<",
+			add_to_date(now_datetime(), seconds=-REPLAY_CLAIM_TIMEOUT),
+		),
+	}
+	partitions = frappe.get_all(
+		"Razorpay Webhook Log",
+		filters=filters,
+		distinct=True,
+		pluck="webhook_partition",
+	)
+	if not partitions:
+		return
+
+	frappe.db.set_value(
+		"Razorpay Webhook Log",
+		filters,
+		"status",
+		"Queued",
+		update_modified=False,
+	)
+	frappe.db.commit()
+
+	for partition in partitions:
+		enqueue_webhook_partition(partition or 0)
+	frappe.db.commit()
+
+
+def get_throughput(total: int, started_at: float) -> dict:
+	elapsed = time.monotonic() - started_at
+	return {
+		"elapsed_seconds": round(elapsed, 2),
+		"events_per_second": round(total / elapsed, 2) if elapsed else total,
+	}
+
+
+def publish_replay_progress(
+	report: dict, started_at: float, user: str | None, done: bool = False
+):
+	if not user:
+		return
+
+	frappe.publish_realtime(
+		REPLAY_REALTIME_EVENT,
+		{
+			**report,
+			**get_throughput(report["total"], started_at),
+			"done": done,
+			"timestamp": str(now_datetime()),
+		},
+		user=user,
+	)
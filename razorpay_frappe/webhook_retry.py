@@ -0,0 +1,195 @@
+import random
+
+import frappe
+from frappe.utils import add_to_date, cint, now_datetime
+
+from razorpay_frappe.webhook_queue import (
+	enqueue_webhook_partition,
+	get_partition,
+)
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_BASE_DELAY = 60  # seconds
+MAX_RETRY_DELAY = 6 * 60 * 60  # seconds
+RETRY_BATCH_SIZE = 500
+
+
+def get_max_attempts() -> int:
+	max_attempts = frappe.db.get_single_value(
+		"Razorpay Settings", "webhook_max_attempts"
+	)
+	return max(cint(max_attempts) or DEFAULT_MAX_ATTEMPTS, 1)
+
+
+def get_retry_delay(attempts: int, base_delay: int | None = None) -> int:
+	"""Seconds to wait before retrying a log that failed `attempts` times.
+
+	Exponential backoff with equal jitter: half of the delay is fixed, the
+	other half random, so failures of a burst do not retry in lockstep.
+	"""
+	if base_delay is None:
+		base_delay = (
+			cint(
+				frappe.db.get_single_value(
+					"Razorpay Settings", "webhook_retry_base_delay"
+				)
+			)
+			or DEFAULT_RETRY_BASE_DELAY
+		)
+
+	delay = min(base_delay * 2 ** max(attempts - 1, 0), MAX_RETRY_DELAY)
+	return int(delay / 2 + random.uniform(0, delay / 2))
+
+
+def schedule_webhook_retry(log, error: str):
+	"""Record a failed attempt of `log`; schedule the next one with backoff,
+	or dead-letter the log once it ran out of attempts."""
+	attempts = cint(log.attempts) + 1
+
+	if attempts >= get_max_attempts():
+		log.db_set(
+			{
+				"status": "Dead Letter",
+				"attempts": attempts,
+				"error": error,
+				"next_retry_at": None,
+			}
+		)
+		dead_letter_webhook_log(log)
+		return
+
+	log.db_set(
+		{
+			"status": "Failed",
+			"attempts": attempts,
+			"error": error,
+			"next_retry_at": add_to_date(
+				now_datetime(), seconds=get_retry_delay(attempts)
+			),
+		}
+	)
+
+
+def dead_letter_webhook_log(log):
+	values = {
+		"event": log.event,
+		"entity_id": log.entity_id,
+		"status": "Open",
+		"attempts": log.attempts,
+		"error": log.error,
+		"dead_lettered_at": now_datetime(),
+	}
+
+	name = frappe.db.get_value(
+		"Razorpay Webhook Dead Letter", {"webhook_log": log.name}
+	)
+	if name:
+		# dead-lettered again after a re-drive
+		frappe.db.set_value("Razorpay Webhook Dead Letter", name, values)
+	else:
+		frappe.get_doc(
+			{
+				"doctype": "Razorpay Webhook Dead Letter",
+				"webhook_log": log.name,
+				**values,
+			}
+		).insert(ignore_permissions=True)
+
+	frappe.log_error(
+		title=f"Razorpay Webhook Dead Lettered: {log.event}",
+		message=log.error,
+		reference_doctype=log.doctype,
+		reference_name=log.name,
+	)
+
+
+def retry_failed_webhook_logs():
+	"""Scheduled: send logs whose retry is due back through their partition."""
+	while True:
+		logs = frappe.get_all(
+			"Razorpay Webhook Log",
+			filters={
+				"docstatus": 1,
+				"status": "Failed",
+				"next_retry_at": ("<=", now_datetime()),
+			},
+			fields=["name", "entity_id"],
+			order_by="next_retry_at asc",
+			limit=RETRY_BATCH_SIZE,
+		)
+		if not logs:
+			break
+
+		requeue_webhook_logs(logs)
+
+
+def requeue_webhook_logs(logs: list[dict], reset_attempts: bool = False):
+	"""Mark logs Queued again and start the drains of their partitions.
+
+	The drain applies them before the later logs of their entities, which
+	it held back meanwhile. Logs a drain is applying or a replay has
+	claimed are left alone.
+	"""
+	values = {"status": "Queued", "next_retry_at": None}
+	if reset_attempts:
+		values.update({"attempts": 0, "error": None})
+
+	partitions = set()
+	for log in logs:
+		partition = get_partition(log.entity_id)
+		partitions.add(partition)
+		frappe.db.set_value(
+			"Razorpay Webhook Log",
+			{
+				"name": log.name,
+				"status": ("not in", ("Processing", "Replaying")),
+			},
+			{**values, "webhook_partition": partition},
+			update_modified=False,
+		)
+
+	frappe.db.commit()
+
+	for partition in sorted(partitions):
+		enqueue_webhook_partition(partition)
+	frappe.db.commit()
+
+
+@frappe.whitelist()
+def redrive_dead_letters(names: list | str | None = None) -> dict:
+	"""Give dead-lettered events a fresh set of attempts.
+
+	Re-drives the given Razorpay Webhook Dead Letters, or every open one
+	when no names are passed.
+	"""
+	frappe.only_for("System Manager")
+
+	filters = {"status": "Open"}
+	if names:
+		filters["name"] = ("in", frappe.parse_json(names))
+
+	dead_letters = frappe.get_all(
+		"Razorpay Webhook Dead Letter",
+		filters=filters,
+		fields=["name", "webhook_log"],
+	)
+	if not dead_letters:
+		return {"redriven": 0}
+
+	logs = frappe.get_all(
+		"Razorpay Webhook Log",
+		filters={
+			"name": ("in", [row.webhook_log for row in dead_letters]),
+			"docstatus": 1,
+		},
+		fields=["name", "entity_id"],
+	)
+
+	frappe.db.set_value(
+		"Razorpay Webhook Dead Letter",
+		{"name": ("in", [row.name for row in dead_letters])},
+		{"status": "Re-driven", "redriven_at": now_datetime()},
+	)
+	requeue_webhook_logs(logs, reset_attempts=True)
+
+	return {"redriven": len(logs)}
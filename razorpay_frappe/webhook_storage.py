@@ -0,0 +1,145 @@
+import base64
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from enum import StrEnum
+
+import frappe
+from frappe.utils import (
+	add_days,
+	cint,
+	convert_utc_to_system_timezone,
+	getdate,
+	now_datetime,
+)
+
+COMPRESSED_PAYLOAD_PREFIX = "zlib:"
+ARCHIVE_CHUNK_SIZE = 1000
+ARCHIVE_FOLDER = "razorpay_webhook_archive"
+
+
+class PayloadStorage(StrEnum):
+	Pretty = "Pretty"
+	Compact = "Compact"
+	Compressed = "Compressed"
+
+
+def get_payload_storage() -> str:
+	return (
+		frappe.db.get_single_value(
+			"Razorpay Settings", "webhook_payload_storage"
+		)
+		or PayloadStorage.Pretty
+	)
+
+
+def encode_payload(payload: dict, storage: str | None = None) -> str:
+	"""Serialize a webhook payload for the `payload` column of a log."""
+	storage = storage or get_payload_storage()
+
+	if storage == PayloadStorage.Pretty:
+		return frappe.as_json(payload, indent=2)
+
+	compact = frappe.as_json(payload, indent=None, separators=(",", ":"))
+	if storage == PayloadStorage.Compact:
+		return compact
+
+	compressed = zlib.compress(compact.encode(), level=6)
+	return COMPRESSED_PAYLOAD_PREFIX + base64.b64encode(compressed).decode()
+
+
+def decode_payload(stored: str | None) -> dict:
+	"""Inverse of `encode_payload`; reads any of the storage formats."""
+	if not stored:
+		return {}
+
+	if stored.startswith(COMPRESSED_PAYLOAD_PREFIX):
+		compressed = base64.b64decode(stored[len(COMPRESSED_PAYLOAD_PREFIX) :])
+		stored = zlib.decompress(compressed).decode()
+
+	return frappe.parse_json(stored)
+
+
+def get_event_created_at(payload: dict) -> datetime | None:
+	"""Event time (Razorpay sends a unix timestamp) in the system timezone."""
+	created_at = cint(payload.get("created_at"))
+	if created_at:
+		return convert_utc_to_system_timezone(
+			datetime.fromtimestamp(created_at, tz=timezone.utc)
+		).replace(tzinfo=None)
+
+
+def archive_webhook_logs():
+	"""Scheduled: move processed logs past the retention window into gzipped
+	JSONL files (one per day of arrival) under the site's private folder."""
+	retention_days = cint(
+		frappe.db.get_single_value(
+			"Razorpay Settings", "webhook_log_retention_days"
+		)
+	)
+	if retention_days <= 0:
+		return
+
+	cutoff = add_days(now_datetime(), -retention_days)
+	archive_dir = get_archive_dir()
+
+	while True:
+		logs = frappe.get_all(
+			"Razorpay Webhook Log",
+			filters={
+				"docstatus": 1,
+				"status": "Processed",
+				"creation": ("<", cutoff),
+			},
+			fields=[
+				"name",
+				"creation",
+				"event",
+				"event_id",
+				"entity_id",
+				"event_created_at",
+				"payload",
+			],
+			order_by="creation asc",
+			limit=ARCHIVE_CHUNK_SIZE,
+		)
+		if not logs:
+			break
+
+		write_archive(archive_dir, logs)
+		frappe.db.delete(
+			"Razorpay Webhook Log", {"name": ("in", [log.name for log in logs])}
+		)
+		frappe.db.commit()
+
+
+def get_archive_dir() -> str:
+	archive_dir = frappe.get_site_path("private", ARCHIVE_FOLDER)
+	os.makedirs(archive_dir, exist_ok=True)
+	return archive_dir
+
+
+def write_archive(archive_dir: str, logs: list[dict]):
+	logs_by_day = {}
+	for log in logs:
+		logs_by_day.setdefault(getdate(log.creation), []).append(log)
+
+	for day, day_logs in logs_by_day.items():
+		# appending adds a new gzip member; readers see one continuous stream
+		path = os.path.join(archive_dir, f"{day}.jsonl.gz")
+		with gzip.open(path, "ab") as archive:
+			for log in day_logs:
+				record = {
+					"name": log.name,
+					"creation": str(log.creation),
+					"event": log.event,
+					"event_id": log.event_id,
+					"entity_id": log.entity_id,
+					"event_created_at": str(log.event_created_at or ""),
+					"payload": decode_payload(log.payload),
+				}
+				archive.write(
+					json.dumps(record, separators=(",", ":")).encode() + b"\n"
+				)